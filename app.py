@@ -1,12 +1,29 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response, stream_with_context
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
-from utils.db_connection import get_db_connection
-from utils.predict import predict_disease
-from utils.langchain_diagnosis import get_advanced_diagnosis, search_medical_condition
+from utils.db_connection import get_db, on_connect, connection_stats
+from utils.predict import predict_disease_with_version, predict_batch, read_csv_batches, get_predict_engine, get_micro_batcher, get_inference_pool
+from utils.model_registry import get_model_registry
+from utils.prediction_cache import prediction_cache
+from utils.langchain_diagnosis import get_advanced_diagnosis, search_medical_condition, diagnosis_systems
+from utils.pubmed_client import get_pubmed_client
+from utils.source_cache import source_cache, configure_source_cache
+from utils.knowledge_store import knowledge_store, start_background_prewarm
+from utils.analysis_cache import analysis_cache
+from utils.job_queue import DiagnosisJobQueue, job_summary
+from utils.llm_router import provider_stats
+from utils.db_indexes import bootstrap_indexes
+from utils.write_behind import get_record_writer
+from utils.patient_stats import ensure_summary, load_summary, record_flush
+from utils.patient_queries import InvalidQueryError, build_patient_filter, count_patients, fetch_patient_page
+from utils.bulk_diagnosis import BulkCheckpoint, patients_for_day, run_bulk_diagnosis
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
 import os
+import json
+import time
 import secrets
+import threading
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -27,8 +44,28 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
-# Get database connection
-db = get_db_connection()
+# MongoDB connects lazily and reconnects after outages, so routes call
+# get_db() per request instead of keeping one database object.
+def init_database(database):
+    """Runs once, the first time MongoDB is reachable"""
+    # Create the indexes behind the hot queries and warn about collection scans
+    bootstrap_indexes(database)
+    
+    # Source lookups can be cached in MongoDB so every app instance shares them
+    if os.getenv('SOURCE_CACHE_BACKEND') == 'mongo':
+        configure_source_cache('mongo', database)
+    
+    # Build the dashboard statistics from the existing records once
+    if os.getenv('PATIENT_STATS_BACKFILL', '1') != '0':
+        ensure_summary(database)
+
+
+# Diagnosis and report records; with DB_WRITE_MODE=async they are written
+# in batches by a background thread after the response has been sent
+record_writer = get_record_writer()
+
+# Every written diagnosis is added to the materialized dashboard statistics
+record_writer.on_flush(record_flush)
 
 
 def allowed_file(filename):
@@ -112,7 +149,7 @@ def predict():
         }
         
         # Make prediction
-        diagnosis = predict_disease(patient_data)
+        diagnosis, model_version = predict_disease_with_version(patient_data)
         
         # Prepare data for MongoDB
         patient_record = {
@@ -124,24 +161,76 @@ def predict():
             'heart_rate': patient_data['heart_rate'],
             'symptoms': patient_data['symptoms'],
             'diagnosis': diagnosis,
+            'model_version': model_version,
             'date': datetime.now(),
             'diagnosed_by': session.get('username')
         }
         
-        # Store in MongoDB
-        if db is not None:
-            db.patients.insert_one(patient_record)
+        # Store in MongoDB (queued when DB_WRITE_MODE=async)
+        record_writer.insert('patients', patient_record)
         
         # Render result page
         return render_template('result.html', 
                              name=patient_data['name'], 
-                             diagnosis=diagnosis)
+                             diagnosis=diagnosis,
+                             model_version=model_version)
     
     except Exception as e:
         flash(f'Error during prediction: Please check your input and try again', 'danger')
         return redirect(url_for('diagnosis'))
 
 
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch_api():
+    """Score many patients from a JSON array or a CSV upload, streamed back as NDJSON"""
+    if 'username' not in session:
+        return jsonify({'error': 'Please login first'}), 401
+    
+    chunk_size = request.args.get('chunk_size', type=int)
+    
+    if 'file' in request.files:
+        upload = request.files['file']
+        if not upload.filename.lower().endswith('.csv'):
+            return jsonify({'error': 'Please upload a CSV file'}), 400
+        source = read_csv_batches(upload.stream, chunk_size)
+    else:
+        source = request.get_json(silent=True)
+        if not isinstance(source, list):
+            return jsonify({'error': 'Expected a JSON array of patient records or a CSV file'}), 400
+    
+    def generate():
+        started = time.perf_counter()
+        rows = 0
+        chunks = 0
+        try:
+            # One model.predict call per chunk; each chunk is flushed as soon as it is scored
+            for frame, predictions, model_version in predict_batch(source, chunk_size):
+                names = frame['name'].tolist() if 'name' in frame.columns else [None] * len(frame)
+                lines = []
+                for name, diagnosis in zip(names, predictions):
+                    lines.append(json.dumps({
+                        'row': rows,
+                        'name': name if isinstance(name, str) else None,
+                        'diagnosis': str(diagnosis),
+                        'model_version': model_version
+                    }))
+                    rows += 1
+                chunks += 1
+                yield '\n'.join(lines) + '\n'
+        except Exception as e:
+            yield json.dumps({'error': f'Batch stopped at row {rows}: {str(e)}'}) + '\n'
+        
+        elapsed = time.perf_counter() - started
+        yield json.dumps({'summary': {
+            'rows': rows,
+            'chunks': chunks,
+            'seconds': round(elapsed, 4),
+            'rows_per_second': round(rows / elapsed, 1) if elapsed > 0 else None
+        }}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
 @app.route('/dashboard')
 def dashboard():
     """Dashboard page showing all patient records - requires login"""
@@ -149,18 +238,35 @@ def dashboard():
         flash('Please login to access the dashboard', 'warning')
         return redirect(url_for('login'))
     
+    filters = {key: request.args.get(key, '').strip()
+               for key in ('diagnosed_by', 'diagnosis', 'date_from', 'date_to')}
+    filters = {key: value for key, value in filters.items() if value}
+    start = request.args.get('start', 0, type=int)
+    page = {'patients': [], 'filters': filters, 'total': None, 'next_cursor': None, 'start': start,
+            'stats': None}
+    
     try:
-        # Retrieve all patient records from MongoDB
+        # One page of patient records, newest first, without the report blobs
+        db = get_db()
         if db is not None:
-            patients = list(db.patients.find())
-        else:
-            patients = []
-        
-        return render_template('dashboard.html', patients=patients)
+            query = build_patient_filter(**filters)
+            page['patients'], page['next_cursor'] = fetch_patient_page(
+                db.patients, query,
+                cursor=request.args.get('cursor'),
+                page_size=request.args.get('page_size', type=int)
+            )
+            page['total'] = count_patients(db.patients, query)
+            # Summary of all records from one precomputed document
+            page['stats'] = load_summary(db)
+        
+        return render_template('dashboard.html', **page)
     
+    except InvalidQueryError as e:
+        flash(str(e), 'warning')
+        return render_template('dashboard.html', **page)
     except Exception as e:
         flash(f'Error retrieving patient data: {str(e)}', 'danger')
-        return render_template('dashboard.html', patients=[])
+        return render_template('dashboard.html', **page)
 
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -176,6 +282,7 @@ def login():
             return render_template('login.html')
         
         # Check credentials in MongoDB
+        db = get_db()
         if db is not None:
             user = db.users.find_one({'username': username})
             
@@ -239,6 +346,7 @@ def register():
             flash('Username can only contain letters, numbers, and underscores', 'danger')
             return render_template('register.html')
         
+        db = get_db()
         if db is not None:
             # Check if user already exists
             existing_user = db.users.find_one({'username': username})
@@ -249,13 +357,17 @@ def register():
                 # Hash the password
                 password_hash = generate_password_hash(password, method='pbkdf2:sha256')
                 
-                # Create new user
-                db.users.insert_one({
-                    'username': username,
-                    'password_hash': password_hash,
-                    'created_at': datetime.now(),
-                    'last_login': None
-                })
+                # Create new user (the unique index catches a concurrent registration)
+                try:
+                    db.users.insert_one({
+                        'username': username,
+                        'password_hash': password_hash,
+                        'created_at': datetime.now(),
+                        'last_login': None
+                    })
+                except DuplicateKeyError:
+                    flash('Username already exists. Please choose another.', 'danger')
+                    return render_template('register.html')
                 flash('Registration successful! Please login.', 'success')
                 return redirect(url_for('login'))
         else:
@@ -312,11 +424,8 @@ def upload_report():
                 'status': 'uploaded'
             }
             
-            if db is not None:
-                result = db.reports.insert_one(report_record)
-                report_id = str(result.inserted_id)
-            else:
-                report_id = None
+            report_id = record_writer.insert('reports', report_record)
+            report_id = str(report_id) if report_id else None
             
             flash(f'Report uploaded successfully: {file.filename}', 'success')
             return render_template('report_uploaded.html', 
@@ -340,6 +449,7 @@ def view_reports():
     
     try:
         # Retrieve all reports from MongoDB
+        db = get_db()
         if db is not None:
             reports = list(db.reports.find().sort('upload_date', -1))
         else:
@@ -361,6 +471,54 @@ def advanced_diagnosis():
     return render_template('advanced_diagnosis.html')
 
 
+def read_advanced_form(form):
+    """
+    Parse the advanced diagnosis form.
+    
+    Returns:
+        tuple: (patient_data, symptoms list, LLM provider, use_cache)
+    """
+    patient_data = {
+        'name': form.get('name'),
+        'age': int(form.get('age')),
+        'gender': form.get('gender'),
+        'bp': int(form.get('bp')),
+        'glucose': int(form.get('glucose')),
+        'heart_rate': int(form.get('heart_rate')),
+        'symptoms': form.get('symptoms', '')
+    }
+    
+    # Get LLM provider preference (default to Groq - fast & free)
+    llm_provider = form.get('llm_provider', 'groq')
+    
+    # "Fresh analysis" skips the cached LLM analysis for similar patients
+    use_cache = form.get('bypass_cache') != 'on'
+    
+    # Parse symptoms into list
+    symptoms_list = [s.strip() for s in patient_data['symptoms'].split(',') if s.strip()]
+    
+    return patient_data, symptoms_list, llm_provider, use_cache
+
+
+def advanced_diagnosis_record(patient_data, ml_diagnosis, model_version, report, username):
+    """Build the db.patients document for an advanced diagnosis"""
+    return {
+        'name': patient_data['name'],
+        'age': patient_data['age'],
+        'gender': patient_data['gender'],
+        'bp': patient_data['bp'],
+        'glucose': patient_data['glucose'],
+        'heart_rate': patient_data['heart_rate'],
+        'symptoms': patient_data['symptoms'],
+        'ml_diagnosis': ml_diagnosis,
+        'model_version': model_version,
+        'comprehensive_report': report,
+        'date': datetime.now(),
+        'diagnosed_by': username,
+        'diagnosis_type': 'advanced'
+    }
+
+
 @app.route('/advanced_predict', methods=['POST'])
 def advanced_predict():
     """Handle advanced diagnosis with LangChain and online sources"""
@@ -369,50 +527,23 @@ def advanced_predict():
     
     try:
         # Get form data
-        patient_data = {
-            'name': request.form.get('name'),
-            'age': int(request.form.get('age')),
-            'gender': request.form.get('gender'),
-            'bp': int(request.form.get('bp')),
-            'glucose': int(request.form.get('glucose')),
-            'heart_rate': int(request.form.get('heart_rate')),
-            'symptoms': request.form.get('symptoms', '')
-        }
-        
-        # Get LLM provider preference (default to Groq - fast & free)
-        llm_provider = request.form.get('llm_provider', 'groq')
-        
-        # Parse symptoms into list
-        symptoms_list = [s.strip() for s in patient_data['symptoms'].split(',') if s.strip()]
+        patient_data, symptoms_list, llm_provider, use_cache = read_advanced_form(request.form)
         
         # First, get ML model prediction
-        ml_diagnosis = predict_disease(patient_data)
+        ml_diagnosis, model_version = predict_disease_with_version(patient_data)
         
         # Get comprehensive diagnosis using LangChain
         comprehensive_report = get_advanced_diagnosis(
             symptoms=symptoms_list,
             patient_data=patient_data,
             ml_prediction=ml_diagnosis,
-            llm_provider=llm_provider
+            llm_provider=llm_provider,
+            use_cache=use_cache
         )
         
-        # Store in MongoDB
-        if db is not None:
-            diagnosis_record = {
-                'name': patient_data['name'],
-                'age': patient_data['age'],
-                'gender': patient_data['gender'],
-                'bp': patient_data['bp'],
-                'glucose': patient_data['glucose'],
-                'heart_rate': patient_data['heart_rate'],
-                'symptoms': patient_data['symptoms'],
-                'ml_diagnosis': ml_diagnosis,
-                'comprehensive_report': comprehensive_report,
-                'date': datetime.now(),
-                'diagnosed_by': session.get('username'),
-                'diagnosis_type': 'advanced'
-            }
-            db.patients.insert_one(diagnosis_record)
+        # Store in MongoDB (queued when DB_WRITE_MODE=async)
+        record_writer.insert('patients', advanced_diagnosis_record(
+            patient_data, ml_diagnosis, model_version, comprehensive_report, session.get('username')))
         
         # Render result page
         return render_template('advanced_result.html',
@@ -429,6 +560,243 @@ def advanced_predict():
         return redirect(url_for('advanced_diagnosis'))
 
 
+@app.route('/advanced_predict_stream', methods=['POST'])
+def advanced_predict_stream():
+    """
+    Advanced diagnosis streamed as Server-Sent Events.
+    
+    Events, in order of arrival: "prediction" (the ML result), "token" (LLM
+    analysis text), "source" (one per medical source), "analysis" (the
+    finished AI analysis), then "done" once the report has been saved,
+    or "error".
+    """
+    if 'username' not in session:
+        return jsonify({'error': 'Please login first'}), 401
+    
+    try:
+        patient_data, symptoms_list, llm_provider, use_cache = read_advanced_form(request.form)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid form data: {str(e)}'}), 400
+    username = session.get('username')
+    
+    def sse(event, data):
+        return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+    
+    def generate():
+        try:
+            ml_diagnosis, model_version = predict_disease_with_version(patient_data)
+            yield sse('prediction', {'ml_diagnosis': ml_diagnosis, 'model_version': model_version})
+            
+            system = diagnosis_systems.get(llm_provider)
+            report = None
+            for event, payload in system.stream_comprehensive_diagnosis(
+                    symptoms_list, patient_data, ml_diagnosis, use_cache=use_cache):
+                if event == 'report':
+                    report = payload
+                elif event == 'token':
+                    yield sse('token', {'text': payload})
+                else:
+                    yield sse(event, payload)
+            
+            record_id = record_writer.insert('patients', advanced_diagnosis_record(
+                patient_data, ml_diagnosis, model_version, report, username))
+            record_id = str(record_id) if record_id else None
+            yield sse('done', {'record_id': record_id, 'partial': report['partial'],
+                               'timed_out_sources': report['timed_out_sources']})
+        except Exception as e:
+            print(f"❌ Error during streamed advanced diagnosis: {str(e)}")
+            yield sse('error', {'error': str(e)})
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def run_advanced_job(job):
+    """Run one queued advanced diagnosis (called by the job queue workers)"""
+    payload = job['payload']
+    patient_data = payload['patient_data']
+    ml_diagnosis, model_version = predict_disease_with_version(patient_data)
+    report = get_advanced_diagnosis(
+        symptoms=payload['symptoms'],
+        patient_data=patient_data,
+        ml_prediction=ml_diagnosis,
+        llm_provider=payload['llm_provider'],
+        use_cache=payload['use_cache']
+    )
+    record_id = record_writer.insert('patients', advanced_diagnosis_record(
+        patient_data, ml_diagnosis, model_version, report, job['username']))
+    if record_id is None:
+        raise RuntimeError('Database not available')
+    return {
+        'ml_diagnosis': ml_diagnosis,
+        'model_version': model_version,
+        'report': report,
+        'record_id': str(record_id)
+    }
+
+
+def run_bulk_job(job):
+    """Run one queued bulk diagnosis; the job ID doubles as the checkpoint name, so a requeued job resumes"""
+    payload = job['payload']
+    db = get_db()
+    if db is None:
+        raise RuntimeError('Database not available')
+    records = patients_for_day(db, datetime.strptime(payload['date'], '%Y-%m-%d'))
+    return run_bulk_diagnosis(
+        records, db,
+        llm_provider=payload['llm_provider'],
+        run_id=str(job['_id']),
+        max_concurrency=payload['max_concurrency'],
+        username=job['username']
+    )
+
+
+# Advanced diagnoses submitted as jobs run in background workers, not in the request
+diagnosis_jobs = None
+bulk_jobs = None
+
+
+def start_job_queues(database):
+    """Start the job workers once MongoDB is reachable"""
+    global diagnosis_jobs, bulk_jobs
+    diagnosis_jobs = DiagnosisJobQueue(database.diagnosis_jobs, run_advanced_job)
+    diagnosis_jobs.start()
+    # Bulk runs are long; one at a time, with a lease long enough for a whole cohort
+    bulk_jobs = DiagnosisJobQueue(database.bulk_jobs, run_bulk_job, workers=1,
+                                  lease_seconds=float(os.getenv('BULK_JOB_LEASE_SECONDS', '3600')))
+    bulk_jobs.start()
+
+
+_services_started = False
+_services_lock = threading.Lock()
+
+
+def start_services():
+    """
+    Start the serving process's background work once: the MongoDB startup
+    tasks and job workers, the diagnostic model and the knowledge store pre-warm.
+    
+    Nothing starts on import, because this module is also imported by
+    processes that must not serve: inference pool workers (spawned processes
+    re-import the main module), benchmarks and scripts. The first request
+    starts the services under any WSGI server.
+    """
+    global _services_started
+    with _services_lock:
+        if _services_started:
+            return
+        _services_started = True
+    
+    on_connect(init_database)
+    on_connect(start_job_queues)
+    
+    # Load the diagnostic model once at startup; it is hot-reloaded when retrained
+    try:
+        get_model_registry().get()
+    except Exception as e:
+        print(f"⚠️  Diagnostic model not loaded at startup: {e}")
+    
+    # Fetch the medical sources for every model class in the background
+    start_background_prewarm()
+    
+    # Connect now so the startup tasks start before requests need them (retried later if MongoDB is down)
+    get_db()
+
+
+@app.before_request
+def ensure_services_started():
+    start_services()
+
+
+@app.route('/advanced_jobs', methods=['POST'])
+def submit_advanced_job():
+    """Queue an advanced diagnosis and return its job ID immediately"""
+    if 'username' not in session:
+        return jsonify({'error': 'Please login first'}), 401
+    if get_db() is None or diagnosis_jobs is None:
+        return jsonify({'error': 'Database not available'}), 503
+    
+    try:
+        patient_data, symptoms_list, llm_provider, use_cache = read_advanced_form(request.form)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid form data: {str(e)}'}), 400
+    
+    job_id, deduplicated = diagnosis_jobs.submit(session.get('username'), {
+        'patient_data': patient_data,
+        'symptoms': symptoms_list,
+        'llm_provider': llm_provider,
+        'use_cache': use_cache
+    })
+    return jsonify({
+        'job_id': job_id,
+        'deduplicated': deduplicated,
+        'status_url': url_for('advanced_job_status', job_id=job_id)
+    }), 202
+
+
+@app.route('/advanced_jobs/<job_id>')
+def advanced_job_status(job_id):
+    """Job status and, once done, its report; ?wait=N blocks up to N seconds (max 30) for the result"""
+    if 'username' not in session:
+        return jsonify({'error': 'Please login first'}), 401
+    if get_db() is None or diagnosis_jobs is None:
+        return jsonify({'error': 'Database not available'}), 503
+    
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0.0), 30.0)
+    except ValueError:
+        return jsonify({'error': 'wait must be a number of seconds'}), 400
+    
+    job = diagnosis_jobs.wait(job_id, wait) if wait else diagnosis_jobs.get(job_id)
+    if job is None or job['username'] != session.get('username'):
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_summary(job))
+
+
+@app.route('/bulk_diagnosis', methods=['POST'])
+def submit_bulk_diagnosis():
+    """Queue an advanced diagnosis of every patient recorded on a day (JSON: date, llm_provider, max_concurrency)"""
+    if 'username' not in session:
+        return jsonify({'error': 'Please login first'}), 401
+    if get_db() is None or bulk_jobs is None:
+        return jsonify({'error': 'Database not available'}), 503
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        date = data.get('date') or datetime.now().strftime('%Y-%m-%d')
+        datetime.strptime(date, '%Y-%m-%d')
+        max_concurrency = int(data.get('max_concurrency', os.getenv('BULK_MAX_CONCURRENCY', '4')))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid request: {str(e)}'}), 400
+    
+    job_id, deduplicated = bulk_jobs.submit(session.get('username'), {
+        'date': date,
+        'llm_provider': data.get('llm_provider', 'groq'),
+        'max_concurrency': max(1, max_concurrency)
+    })
+    return jsonify({
+        'job_id': job_id,
+        'deduplicated': deduplicated,
+        'status_url': url_for('bulk_diagnosis_status', job_id=job_id)
+    }), 202
+
+
+@app.route('/bulk_diagnosis/<job_id>')
+def bulk_diagnosis_status(job_id):
+    """State of a bulk diagnosis job with its checkpointed progress"""
+    if 'username' not in session:
+        return jsonify({'error': 'Please login first'}), 401
+    if get_db() is None or bulk_jobs is None:
+        return jsonify({'error': 'Database not available'}), 503
+    
+    job = bulk_jobs.get(job_id)
+    if job is None or job['username'] != session.get('username'):
+        return jsonify({'error': 'Job not found'}), 404
+    summary = job_summary(job)
+    summary['progress'] = BulkCheckpoint(str(job['_id'])).progress()
+    return jsonify(summary)
+
+
 @app.route('/search_condition', methods=['POST'])
 def search_condition():
     """Search for medical condition information"""
@@ -451,16 +819,56 @@ def search_condition():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/metrics')
+def metrics():
+    """
+    Runtime counters for the prediction path and the advanced diagnosis services
+    
+    Requires a login, or the METRICS_TOKEN bearer token for monitoring scrapers.
+    """
+    token = os.getenv('METRICS_TOKEN')
+    authorized = 'username' in session or (
+        token and secrets.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'))
+    if not authorized:
+        return jsonify({'error': 'Please login first'}), 401
+    batcher = get_micro_batcher()
+    pool = get_inference_pool()
+    return jsonify({
+        'model': get_model_registry().info(),
+        'predict_engine': get_predict_engine(),
+        'prediction_cache': prediction_cache.stats(),
+        'micro_batcher': batcher.stats() if batcher else None,
+        'inference_pool': pool.stats() if pool else None,
+        'diagnosis_systems': diagnosis_systems.stats(),
+        'pubmed_client': get_pubmed_client().stats(),
+        'source_cache': source_cache.stats(),
+        'knowledge_store': knowledge_store.stats(),
+        'analysis_cache': analysis_cache.stats(),
+        'diagnosis_jobs': diagnosis_jobs.stats() if diagnosis_jobs else None,
+        'bulk_jobs': bulk_jobs.stats() if bulk_jobs else None,
+        'llm_providers': provider_stats(),
+        'mongodb': connection_stats(),
+        'record_writer': record_writer.stats()
+    })
+
+
 if __name__ == '__main__':
-    # Create a default user if database is available
-    if db is not None:
-        # Check if users collection exists and is empty
-        if db.users.count_documents({}) == 0:
-            db.users.insert_one({
-                'username': 'admin',
-                'password': 'admin123',  # Change this in production!
-                'created_at': datetime.now()
-            })
-            print("Default user created: username='admin', password='admin123'")
+    # The debug reloader runs this file in a watcher process and again in the
+    # server process it restarts on changes (WERKZEUG_RUN_MAIN=true); only the
+    # server process connects and starts the background services
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_services()
+        
+        # Create a default user if database is available
+        db = get_db()
+        if db is not None:
+            # Check if users collection exists and is empty
+            if db.users.count_documents({}) == 0:
+                db.users.insert_one({
+                    'username': 'admin',
+                    'password': 'admin123',  # Change this in production!
+                    'created_at': datetime.now()
+                })
+                print("Default user created: username='admin', password='admin123'")
     
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,281 @@
+"""
+Benchmark Suite
+Measures the prediction and request hot paths and saves the results as JSON
+so runs from different commits can be compared.
+
+Usage:
+    python benchmark.py                                  # run and save to benchmarks/<commit>.json
+    python benchmark.py --quick                          # fewer iterations
+    python benchmark.py --mongo-uri mongodb://localhost:27017
+    python benchmark.py --compare benchmarks/old.json benchmarks/new.json
+
+The Flask routes are exercised through the test client. By default they
+are backed by an in-memory MongoDB stand-in (pip install mongomock); pass
+--mongo-uri to use a local MongoDB server instead (a throwaway database
+is created and dropped).
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+SAMPLE_PATIENT = {
+    'name': 'Benchmark Patient',
+    'age': 55,
+    'gender': 'Male',
+    'bp': 145,
+    'glucose': 115,
+    'heart_rate': 88,
+    'symptoms': 'Chest Pain'
+}
+
+
+def measure(func, iterations, warmup=5):
+    """
+    Time repeated calls of a function.
+
+    Args:
+        func: Callable with no arguments
+        iterations (int): Timed calls
+        warmup (int): Untimed calls made first
+
+    Returns:
+        dict: Latency statistics in microseconds and calls per second
+    """
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter_ns()
+        func()
+        samples.append((time.perf_counter_ns() - started) / 1000.0)
+
+    samples.sort()
+    mean = statistics.fmean(samples)
+    return {
+        'iterations': iterations,
+        'mean_us': round(mean, 2),
+        'p50_us': round(samples[len(samples) // 2], 2),
+        'p95_us': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+        'min_us': round(samples[0], 2),
+        'ops_per_sec': round(1e6 / mean, 1) if mean else None
+    }
+
+
+def bench_prediction(iterations):
+    """Benchmarks for feature encoding, model loading and predict_disease"""
+    import joblib
+    from utils.preprocess import FEATURE_SCHEMA, preprocess_input
+    from utils.model_registry import ModelRegistry
+    from utils.model_artifact import load_artifact, DEFAULT_ARTIFACT_PATH
+    from utils.prediction_cache import prediction_cache
+    from utils import predict
+
+    results = {
+        'preprocess_input': measure(lambda: preprocess_input(SAMPLE_PATIENT), iterations * 10),
+        'feature_schema_encode_row': measure(lambda: FEATURE_SCHEMA.encode_row(SAMPLE_PATIENT), iterations * 10)
+    }
+
+    model_path = ModelRegistry().model_path
+    load_iterations = max(3, iterations // 50)
+    results['model_load_joblib'] = measure(lambda: joblib.load(model_path), load_iterations, warmup=1)
+    results['model_load_registry_cold'] = measure(
+        lambda: ModelRegistry(model_path=model_path, model_format='pickle').get(), load_iterations, warmup=1)
+    if os.path.exists(DEFAULT_ARTIFACT_PATH):
+        results['model_load_artifact'] = measure(lambda: load_artifact(), load_iterations, warmup=1)
+
+    original_engine = predict.get_predict_engine()
+    original_cache_size = prediction_cache.max_size
+    try:
+        for engine in predict.PREDICT_ENGINES:
+            predict.set_predict_engine(engine)
+            prediction_cache.max_size = 0
+            results[f'predict_disease_{engine}_uncached'] = measure(
+                lambda: predict.predict_disease(SAMPLE_PATIENT), iterations)
+        prediction_cache.max_size = original_cache_size or 4096
+        prediction_cache.clear()
+        results['predict_disease_cached'] = measure(lambda: predict.predict_disease(SAMPLE_PATIENT), iterations * 10)
+    finally:
+        predict.set_predict_engine(original_engine)
+        prediction_cache.max_size = original_cache_size
+        prediction_cache.clear()
+
+    return results
+
+
+def open_database(mongo_uri):
+    """Create the database the Flask routes will use during the run"""
+    if mongo_uri:
+        from pymongo import MongoClient
+        client = MongoClient(mongo_uri, serverSelectionTimeoutMS=3000)
+        client.server_info()
+        name = f"diagnostic_benchmark_{os.getpid()}"
+        return client[name], lambda: client.drop_database(name)
+
+    try:
+        import mongomock
+    except ImportError:
+        print("✗ mongomock is not installed. Run: pip install mongomock (or pass --mongo-uri)")
+        sys.exit(1)
+    return mongomock.MongoClient()['diagnostic_system'], lambda: None
+
+
+def seed_database(db, patients, reports):
+    """Fill the stand-in database with realistic documents"""
+    now = datetime.now()
+    db.patients.insert_many([
+        dict(SAMPLE_PATIENT, diagnosis='Heart Disease', date=now - timedelta(minutes=i),
+             diagnosed_by='bench_user', model_version='benchmark')
+        for i in range(patients)
+    ])
+    db.reports.insert_many([
+        {
+            'filename': f'report_{i}.pdf',
+            'original_filename': f'report_{i}.pdf',
+            'filepath': f'uploads/report_{i}.pdf',
+            'patient_name': SAMPLE_PATIENT['name'],
+            'report_type': 'Lab Report',
+            'notes': '',
+            'uploaded_by': 'bench_user',
+            'upload_date': now - timedelta(minutes=i),
+            'file_size': 1024,
+            'status': 'uploaded'
+        }
+        for i in range(reports)
+    ])
+
+
+def bench_routes(iterations, mongo_uri, patients, reports):
+    """End-to-end benchmarks of Flask routes through the test client"""
+    db, cleanup = open_database(mongo_uri)
+    seed_database(db, patients, reports)
+
+    # Serve the benchmark database to the app instead of connecting, and
+    # keep the knowledge store pre-warm off the network during the run
+    os.environ.setdefault('KNOWLEDGE_PREWARM', '0')
+    from utils.db_connection import use_database, wait_for_startup
+    use_database(db)
+    import app as app_module
+    # Indexes and the patient statistics are set up in the background
+    app_module.start_services()
+    wait_for_startup(60)
+
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session['username'] = 'bench_user'
+
+    form = {key: str(value) for key, value in SAMPLE_PATIENT.items()}
+
+    def post_predict():
+        response = client.post('/predict', data=form)
+        assert response.status_code == 200, response.status_code
+
+    def get_page(path):
+        def run():
+            response = client.get(path)
+            assert response.status_code == 200, response.status_code
+        return run
+
+    route_iterations = max(5, iterations // 10)
+    try:
+        return {
+            'route_predict': measure(post_predict, route_iterations),
+            'route_dashboard': measure(get_page('/dashboard'), route_iterations),
+            'route_reports': measure(get_page('/reports'), route_iterations),
+            'seed': {'patients': patients, 'reports': reports, 'backend': 'mongodb' if mongo_uri else 'mongomock'}
+        }
+    finally:
+        cleanup()
+
+
+def git_commit():
+    """Short hash of the checked-out commit, or None outside a git checkout"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(old_path, new_path, threshold):
+    """
+    Print the change in mean latency for every benchmark present in both files.
+
+    Returns:
+        bool: True if no benchmark slowed down by more than threshold percent
+    """
+    with open(old_path) as f:
+        old = json.load(f)['benchmarks']
+    with open(new_path) as f:
+        new = json.load(f)['benchmarks']
+
+    ok = True
+    print(f"{'benchmark':40s} {'old mean':>12s} {'new mean':>12s} {'change':>9s}")
+    for name in sorted(set(old) & set(new)):
+        if 'mean_us' not in old[name] or 'mean_us' not in new[name]:
+            continue
+        before, after = old[name]['mean_us'], new[name]['mean_us']
+        change = (after - before) / before * 100 if before else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '  ✗ regression'
+            ok = False
+        print(f"{name:40s} {before:10.1f}us {after:10.1f}us {change:+8.1f}%{flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the prediction and request hot paths')
+    parser.add_argument('--iterations', type=int, default=200, help='Base iteration count')
+    parser.add_argument('--quick', action='store_true', help='Run a short smoke benchmark')
+    parser.add_argument('--mongo-uri', help='Use this MongoDB server instead of the in-memory stand-in')
+    parser.add_argument('--patients', type=int, default=1000, help='Patient documents to seed')
+    parser.add_argument('--reports', type=int, default=200, help='Report documents to seed')
+    parser.add_argument('--skip-routes', action='store_true', help='Only run the library benchmarks')
+    parser.add_argument('--output', help='Where to write the JSON results')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='Compare two result files')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='Percent slowdown reported as a regression by --compare')
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(0 if compare(args.compare[0], args.compare[1], args.threshold) else 1)
+
+    iterations = 20 if args.quick else args.iterations
+    commit = git_commit()
+
+    print("=" * 60)
+    print("  Automated Diagnostic System - Benchmarks")
+    print("=" * 60)
+
+    benchmarks = bench_prediction(iterations)
+    if not args.skip_routes:
+        benchmarks.update(bench_routes(iterations, args.mongo_uri, args.patients, args.reports))
+
+    for name, result in benchmarks.items():
+        if 'mean_us' in result:
+            print(f"  {name:40s} mean {result['mean_us']:12.1f} us   p95 {result['p95_us']:12.1f} us")
+
+    output = args.output or os.path.join('benchmarks', f"{commit or 'local'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'commit': commit,
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'iterations': iterations,
+            'benchmarks': benchmarks
+        }, f, indent=2)
+    print(f"\n✓ Results saved to: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+Load Test
+Drives concurrent users against the diagnosis routes and reports throughput
+and p50/p95/p99 latency per route.
+
+By default the app is started in-process on a free port with an in-memory
+MongoDB stand-in (pip install mongomock) and the fake LLM, search,
+Wikipedia and PubMed backends from utils/fake_backends.py, so the test runs
+offline and without API keys. Their latency distributions and error rates
+are set with the FAKE_<NAME>_* variables documented there.
+
+Usage:
+    python load_test.py                                   # 8 users for 30 seconds
+    python load_test.py --concurrency 32 --duration 60 --routes advanced_predict
+    python load_test.py --cold                            # analysis and source caches off
+    python load_test.py --url http://localhost:5000 --username demo --password demo123
+    FAKE_LLM_DISTRIBUTION=lognormal FAKE_LLM_FAILURE_RATE=0.05 python load_test.py --output load.json
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+ROUTES = ('advanced_predict', 'search_condition', 'predict')
+
+SYMPTOMS = ['fever', 'headache', 'fatigue', 'chest pain', 'cough', 'shortness of breath',
+            'nausea', 'dizziness', 'joint pain', 'abdominal pain', 'blurred vision', 'frequent urination']
+
+CONDITIONS = ['Heart Disease', 'Diabetes', 'Hypertension', 'Influenza', 'Migraine', 'Asthma']
+
+LOAD_USER = {'username': 'load_tester', 'password': 'load-test-password'}
+
+
+def random_patient():
+    """Form fields of a random patient"""
+    return {
+        'name': f'Load Patient {random.randint(1, 10000)}',
+        'age': str(random.randint(18, 85)),
+        'gender': random.choice(['Male', 'Female']),
+        'bp': str(random.randint(90, 180)),
+        'glucose': str(random.randint(70, 250)),
+        'heart_rate': str(random.randint(55, 120)),
+        'symptoms': ', '.join(random.sample(SYMPTOMS, random.randint(2, 4)))
+    }
+
+
+def send_request(http, base_url, route):
+    """Send one request to a route; returns True if it succeeded"""
+    if route == 'search_condition':
+        response = http.post(f'{base_url}/search_condition', json={'condition': random.choice(CONDITIONS)})
+        return response.status_code == 200 and 'error' not in response.json()
+    form = random_patient()
+    if route == 'advanced_predict':
+        form['llm_provider'] = random.choice(['groq', 'google', 'openai'])
+    # Both routes redirect on errors, so anything but a rendered page counts as one
+    response = http.post(f'{base_url}/{route}', data=form, allow_redirects=False)
+    return response.status_code == 200
+
+
+def start_local_server(cold):
+    """
+    Start the app in a background thread with offline backends.
+
+    Args:
+        cold (bool): Disable the analysis cache, the source cache and the knowledge store
+
+    Returns:
+        str: Base URL of the server
+    """
+    os.environ['DIAGNOSIS_BACKENDS'] = 'fake'
+    os.environ['KNOWLEDGE_PREWARM'] = '0'
+    # Never mix fake results into the real knowledge store
+    os.environ['KNOWLEDGE_STORE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='load_test_'), 'knowledge_store.json')
+    if cold:
+        os.environ['ANALYSIS_CACHE_SIZE'] = '0'
+        os.environ['SOURCE_CACHE_BACKEND'] = 'none'
+
+    try:
+        import mongomock
+    except ImportError:
+        print("✗ mongomock is not installed. Run: pip install mongomock (or pass --url)")
+        sys.exit(1)
+    from werkzeug.security import generate_password_hash
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    db = mongomock.MongoClient()['diagnostic_system']
+    db.users.insert_one({
+        'username': LOAD_USER['username'],
+        'email': 'load@example.com',
+        'password_hash': generate_password_hash(LOAD_USER['password'])
+    })
+
+    # Serve the stand-in database to the app instead of connecting
+    from utils.db_connection import use_database, wait_for_startup
+    use_database(db)
+    import app as app_module
+    # Indexes and the job workers are set up in the background
+    app_module.start_services()
+    wait_for_startup(60)
+
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}'
+
+
+def run_load(base_url, username, password, routes, concurrency, duration, total_requests):
+    """
+    Run the load test.
+
+    Args:
+        base_url (str): Server to test
+        username (str): Account every simulated user logs in with
+        password (str): Its password
+        routes (list): Route names picked at random for each request
+        concurrency (int): Simulated users, each sending one request at a time
+        duration (float): Seconds to run (ignored if total_requests is set)
+        total_requests (int): Stop after this many requests
+
+    Returns:
+        dict: Samples per route as lists of (seconds, succeeded)
+    """
+    samples = {route: [] for route in routes}
+    lock = threading.Lock()
+    stop = threading.Event()
+    issued = [0]
+
+    def take_ticket():
+        with lock:
+            if total_requests is not None and issued[0] >= total_requests:
+                return False
+            issued[0] += 1
+            return True
+
+    def user():
+        http = requests.Session()
+        response = http.post(f'{base_url}/login', data={'username': username, 'password': password},
+                             allow_redirects=False)
+        if response.status_code != 302:
+            print(f"✗ Login failed for {username} (HTTP {response.status_code})")
+            stop.set()
+            return
+        while not stop.is_set() and take_ticket():
+            route = random.choice(routes)
+            started = time.perf_counter()
+            try:
+                ok = send_request(http, base_url, route)
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                samples[route].append((elapsed, ok))
+
+    threads = [threading.Thread(target=user, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    if total_requests is None:
+        stop.wait(duration)
+        stop.set()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def summarize(samples, elapsed):
+    """
+    Throughput and latency percentiles per route.
+
+    Returns:
+        dict: route -> requests, errors, rps, mean/p50/p95/p99/max in milliseconds
+    """
+    summary = {}
+    for route, route_samples in samples.items():
+        if not route_samples:
+            continue
+        latencies = sorted(seconds * 1000 for seconds, _ in route_samples)
+        summary[route] = {
+            'requests': len(route_samples),
+            'errors': sum(1 for _, ok in route_samples if not ok),
+            'rps': round(len(route_samples) / elapsed, 2),
+            'mean_ms': round(statistics.fmean(latencies), 1),
+            'p50_ms': round(percentile(latencies, 0.50), 1),
+            'p95_ms': round(percentile(latencies, 0.95), 1),
+            'p99_ms': round(percentile(latencies, 0.99), 1),
+            'max_ms': round(latencies[-1], 1)
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the diagnosis routes')
+    parser.add_argument('--url', help='Test a running server instead of an in-process one with fake backends')
+    parser.add_argument('--username', default=LOAD_USER['username'], help='Login for --url')
+    parser.add_argument('--password', default=LOAD_USER['password'], help='Password for --url')
+    parser.add_argument('--routes', default='advanced_predict,search_condition',
+                        help=f"Comma-separated routes to exercise ({', '.join(ROUTES)})")
+    parser.add_argument('--concurrency', type=int, default=8, help='Simulated users')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run')
+    parser.add_argument('--requests', type=int, help='Stop after this many requests instead of a duration')
+    parser.add_argument('--cold', action='store_true',
+                        help='In-process only: disable the analysis cache, source cache and knowledge store')
+    parser.add_argument('--output', help='Write the results as JSON')
+    args = parser.parse_args()
+
+    routes = [route.strip() for route in args.routes.split(',') if route.strip()]
+    unknown = [route for route in routes if route not in ROUTES]
+    if unknown or not routes:
+        parser.error(f"Unknown routes: {', '.join(unknown) or '(none)'}. Choose from: {', '.join(ROUTES)}")
+
+    base_url = args.url.rstrip('/') if args.url else start_local_server(args.cold)
+    mode = 'live' if args.url else ('in-process, cold caches' if args.cold else 'in-process')
+
+    print("=" * 60)
+    print("  Automated Diagnostic System - Load Test")
+    print("=" * 60)
+    limit = f"{args.requests} requests" if args.requests else f"{args.duration:g}s"
+    print(f"  {base_url} ({mode}), {args.concurrency} users, {limit}, routes: {', '.join(routes)}")
+
+    started = time.perf_counter()
+    samples = run_load(base_url, args.username, args.password, routes,
+                       args.concurrency, args.duration, args.requests)
+    elapsed = time.perf_counter() - started
+    summary = summarize(samples, elapsed)
+
+    print(f"\n{'route':20s} {'requests':>9s} {'errors':>7s} {'rps':>8s} {'p50':>9s} {'p95':>9s} {'p99':>9s}")
+    for route, result in summary.items():
+        print(f"{route:20s} {result['requests']:9d} {result['errors']:7d} {result['rps']:8.2f} "
+              f"{result['p50_ms']:7.1f}ms {result['p95_ms']:7.1f}ms {result['p99_ms']:7.1f}ms")
+    total = sum(result['requests'] for result in summary.values())
+    print(f"\n✓ {total} requests in {elapsed:.1f}s ({total / elapsed:.2f} req/s)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'timestamp': datetime.now().isoformat(),
+                'url': base_url,
+                'mode': mode,
+                'concurrency': args.concurrency,
+                'seconds': round(elapsed, 2),
+                'fake_settings': {key: value for key, value in os.environ.items() if key.startswith('FAKE_')},
+                'routes': summary
+            }, f, indent=2)
+        print(f"✓ Results saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score, classification_report
 import joblib
 import os
+from utils.preprocess import FEATURE_SCHEMA
 
 def train_model():
     """Train the diagnostic model and save it"""
@@ -29,13 +30,10 @@ def train_model():
         print(f"✗ Error loading dataset: {e}")
         return False
     
-    # Preprocess the data
+    # Preprocess the data with the same feature schema used for serving
     print("\nPreprocessing data...")
-    df['gender_numeric'] = df['gender'].apply(lambda x: 0 if x == 'Male' else 1)
-    
-    # Select features
-    feature_columns = ['age', 'gender_numeric', 'bp', 'glucose', 'heart_rate']
-    X = df[feature_columns]
+    feature_columns = FEATURE_SCHEMA.model_feature_names
+    X = FEATURE_SCHEMA.to_frame(FEATURE_SCHEMA.encode_frame(df))
     y = df['diagnosis']
     
     print(f"✓ Features prepared: {', '.join(feature_columns)}")
@@ -85,17 +83,37 @@ def train_model():
         os.makedirs(model_dir)
     
     model_path = os.path.join(model_dir, 'diagnostic_model.pkl')
-    joblib.dump(model, model_path)
+    # Write to a temporary file and rename so a running app never reads a partial pickle
+    tmp_path = model_path + '.tmp'
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, model_path)
     print(f"✓ Model saved to: {model_path}")
     
     # Test the saved model
     print("\nTesting saved model...")
     loaded_model = joblib.load(model_path)
     sample_data = [[45, 0, 140, 110, 85]]  # Sample patient
-    sample_df = pd.DataFrame(sample_data, columns=feature_columns)
+    sample_df = FEATURE_SCHEMA.to_frame(sample_data)
     prediction = loaded_model.predict(sample_df)
     print(f"✓ Sample prediction: {prediction[0]}")
     
+    # Verify the array-backed inference engine against scikit-learn
+    from utils.tree_engine import verify_against_sklearn
+    rows, mismatches = verify_against_sklearn(loaded_model)
+    if mismatches:
+        # The artifact holds the compiled forest, so it would serve the same wrong answers
+        print(f"✗ Compiled engine differs on {mismatches}/{rows} rows; keep PREDICT_ENGINE=sklearn")
+        print("✗ Compact artifact NOT exported; keep MODEL_FORMAT=pickle")
+    else:
+        print(f"✓ Compiled engine matches scikit-learn on all {rows} rows")
+        
+        # Export the compact memory-mappable artifact used with MODEL_FORMAT=artifact
+        from utils.model_artifact import export_artifact
+        from utils.model_registry import ModelRegistry
+        loaded = ModelRegistry(model_path=model_path, model_format='pickle').get()
+        artifact_path = export_artifact(loaded.compiled(), loaded.version)
+        print(f"✓ Compact artifact saved to: {artifact_path}")
+    
     # Display feature importance
     print("\nFeature Importance:")
     for feature, importance in zip(feature_columns, model.feature_importances_):
@@ -0,0 +1,165 @@
+"""
+LLM Analysis Cache
+TTL cache of the differential-diagnosis analyses produced by the LLM.
+Patients with the same symptoms and vitals in the same clinical bands get
+the same analysis, so the key combines the provider, the sorted and
+normalized symptom list and the banded vitals instead of the raw values.
+
+Configuration (environment):
+    ANALYSIS_CACHE_SIZE   maximum entries, default 1024 (0 disables the cache)
+    ANALYSIS_CACHE_TTL    seconds an analysis is reused, default 21600 (6 hours)
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+# Upper bounds (exclusive) and labels of the bands vitals are grouped into
+BP_BANDS = ((90, "low"), (120, "normal"), (130, "elevated"), (140, "stage 1 hypertension"),
+            (180, "stage 2 hypertension"), (float("inf"), "hypertensive crisis"))
+GLUCOSE_BANDS = ((70, "hypoglycemia"), (100, "normal"), (126, "prediabetes"),
+                 (200, "diabetes"), (float("inf"), "severe hyperglycemia"))
+HEART_RATE_BANDS = ((60, "bradycardia"), (101, "normal"), (121, "tachycardia"),
+                    (float("inf"), "severe tachycardia"))
+AGE_BANDS = ((13, "child"), (18, "adolescent"), (40, "adult"), (65, "middle-aged"),
+             (float("inf"), "older adult"))
+
+
+def band(value, bands) -> str:
+    """Label of the band a numeric value falls into ("unknown" if it is not a number)"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return "unknown"
+    for upper, label in bands:
+        if value < upper:
+            return label
+    return bands[-1][1]
+
+
+def normalize_symptoms(symptoms: List[str]) -> tuple:
+    """Lowercased, whitespace-collapsed, de-duplicated and sorted symptoms"""
+    cleaned = {re.sub(r"\s+", " ", str(s)).strip().lower() for s in symptoms}
+    return tuple(sorted(s for s in cleaned if s))
+
+
+def analysis_key(llm_provider: str, symptoms: List[str], patient_data: Dict) -> tuple:
+    """
+    Cache key for one analysis request
+
+    Args:
+        llm_provider: Provider that produces the analysis
+        symptoms: Patient symptoms
+        patient_data: Patient information with age, gender, bp, glucose, heart_rate
+
+    Returns:
+        Hashable key
+    """
+    return (
+        llm_provider,
+        normalize_symptoms(symptoms),
+        band(patient_data.get("bp"), BP_BANDS),
+        band(patient_data.get("glucose"), GLUCOSE_BANDS),
+        band(patient_data.get("heart_rate"), HEART_RATE_BANDS),
+        band(patient_data.get("age"), AGE_BANDS),
+        str(patient_data.get("gender") or "unknown").strip().lower()
+    )
+
+
+class AnalysisCache:
+    """
+    Thread-safe LRU cache of LLM analyses with a time-to-live
+
+    Every entry remembers how long its analysis took to generate, so each
+    hit adds that latency to saved_seconds.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[float] = None):
+        if max_size is None:
+            max_size = int(os.getenv("ANALYSIS_CACHE_SIZE", "1024"))
+        if ttl is None:
+            ttl = float(os.getenv("ANALYSIS_CACHE_TTL", str(6 * 3600)))
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.expired = 0
+        self.saved_seconds = 0.0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, key: tuple) -> Optional[Dict]:
+        """
+        Look up a cached analysis
+
+        Args:
+            key: Key from analysis_key
+
+        Returns:
+            Copy of the cached analysis marked "cached": True, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry["stored_at"] >= self.ttl:
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry["latency"]
+        return dict(entry["analysis"], cached=True)
+
+    def put(self, key: tuple, analysis: Dict, latency: float):
+        """
+        Store a successful analysis
+
+        Args:
+            key: Key from analysis_key
+            analysis: Analysis dict returned by analyze_symptoms
+            latency: Seconds the LLM took to produce it
+        """
+        if not self.enabled or not analysis.get("success"):
+            return
+        with self._lock:
+            self._entries[key] = {"analysis": analysis, "latency": latency, "stored_at": time.monotonic()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def record_bypass(self):
+        """Count a request that asked not to use the cache"""
+        self.bypassed += 1
+
+    def clear(self):
+        """Drop every cached analysis"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Cache counters"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "bypassed": self.bypassed,
+            "expired": self.expired,
+            "saved_seconds": round(self.saved_seconds, 2)
+        }
+
+
+analysis_cache = AnalysisCache()
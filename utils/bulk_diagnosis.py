@@ -0,0 +1,319 @@
+"""
+Bulk Advanced Diagnosis
+Runs the advanced diagnosis pipeline over a cohort of patient records, for
+example one day's db.patients entries.
+
+- ML predictions are made for a whole chunk of patients at once
+- Medical sources are looked up once per distinct ML prediction and shared
+- LLM analyses go through the model's batch interface with a concurrency
+  limit (per-provider rate limits come from LLM_RATE_LIMITS, see llm_router)
+- Each finished chunk is written with insert_many and recorded in a
+  checkpoint file, so an interrupted run resumes where it stopped
+- A record with an unusable value is stored as an error result (with the
+  reason) instead of stopping the run
+
+Usage:
+    python -m utils.bulk_diagnosis --date 2026-10-16
+    python -m utils.bulk_diagnosis --input patients.csv --provider groq --max-concurrency 8
+    python -m utils.bulk_diagnosis --run-id bulk-20261016-080000      # resume a run
+
+Configuration (environment):
+    BULK_CHECKPOINT_DIR      checkpoint directory, default data/bulk_checkpoints
+    BULK_CHUNK_SIZE          patients per chunk, default 50
+    BULK_MAX_CONCURRENCY     LLM requests in flight, default 4
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+from utils.langchain_diagnosis import diagnosis_systems, search_medical_condition
+from utils.predict import predict_rows
+from utils.preprocess import FEATURE_SCHEMA
+
+DEFAULT_CHECKPOINT_DIR = os.path.join("data", "bulk_checkpoints")
+
+RESULTS_COLLECTION = "bulk_diagnoses"
+
+NUMERIC_FIELDS = ("age", "bp", "glucose", "heart_rate")
+
+# Error messages kept in the run summary; every error is stored in RESULTS_COLLECTION
+MAX_REPORTED_ERRORS = 20
+
+
+class InvalidRecordError(ValueError):
+    """A patient record with a value the model cannot use"""
+
+
+class BulkCheckpoint:
+    """Progress of one bulk run, saved atomically as JSON after every chunk"""
+
+    def __init__(self, run_id: str, directory: Optional[str] = None):
+        self.run_id = run_id
+        directory = directory or os.getenv("BULK_CHECKPOINT_DIR", DEFAULT_CHECKPOINT_DIR)
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{run_id}.json")
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+        except FileNotFoundError:
+            self.state = {
+                "run_id": run_id,
+                "created_at": datetime.now().isoformat(),
+                "total": None,
+                "completed": [],
+                "written": 0,
+                "errors": {},
+                "finished": False
+            }
+        self.state.setdefault("errors", {})
+        self._completed = set(self.state["completed"])
+
+    def is_done(self, key: str) -> bool:
+        return key in self._completed
+
+    def record(self, keys: List[str], written: int, errors: Optional[Dict[str, str]] = None):
+        """Mark patients as finished (including the ones that failed, with their errors) and save"""
+        self._completed.update(keys)
+        self.state["errors"].update(errors or {})
+        self.state["completed"] = sorted(self._completed)
+        self.state["written"] += written
+        self.save()
+
+    def save(self):
+        self.state["updated_at"] = datetime.now().isoformat()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+    def progress(self) -> Dict:
+        """Summary without the list of completed patients"""
+        return {
+            "run_id": self.run_id,
+            "total": self.state["total"],
+            "completed": len(self._completed),
+            "written": self.state["written"],
+            "invalid": len(self.state["errors"]),
+            "finished": self.state["finished"],
+            "updated_at": self.state.get("updated_at")
+        }
+
+
+def patients_for_day(db, day: datetime) -> List[Dict]:
+    """All db.patients records dated on the given day, oldest first"""
+    start = datetime(day.year, day.month, day.day)
+    return list(db.patients.find(
+        {"date": {"$gte": start, "$lt": start + timedelta(days=1)}},
+        {"comprehensive_report": 0}
+    ).sort([("date", 1), ("_id", 1)]))
+
+
+def load_patient_file(path: str) -> List[Dict]:
+    """Patient records from a CSV file or a JSON array"""
+    if path.lower().endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    import pandas as pd
+    return pd.read_csv(path).to_dict(orient="records")
+
+
+def patient_key(record: Dict, index: int) -> str:
+    """Stable identifier of a record within its cohort"""
+    return str(record["_id"]) if record.get("_id") is not None else f"row-{index}"
+
+
+def _patient_data(record: Dict) -> Dict:
+    """
+    Model input fields of a patient record
+
+    Raises:
+        InvalidRecordError: If a numeric field is not a finite number
+    """
+    patient = {
+        "name": record.get("name"),
+        "gender": record.get("gender"),
+        "symptoms": str(record.get("symptoms") or "")
+    }
+    for field in NUMERIC_FIELDS:
+        value = record.get(field, 0)
+        try:
+            # int(float(...)) also accepts "72.0" from CSV files; NaN and infinity raise
+            patient[field] = int(float(value))
+        except (TypeError, ValueError, OverflowError):
+            raise InvalidRecordError(f"{field} is not a number: {value!r}")
+    return {key: patient[key] for key in ("name", "age", "gender", "bp", "glucose", "heart_rate", "symptoms")}
+
+
+def _error_result(run_id: str, key: str, record: Dict, error: str, username: str) -> Dict:
+    """Result document for a record that could not be diagnosed"""
+    return {
+        "_id": f"{run_id}:{key}",
+        "run_id": run_id,
+        "patient_id": key,
+        "name": record.get("name"),
+        "input": {field: record.get(field) for field in NUMERIC_FIELDS + ("gender", "symptoms")},
+        "error": error,
+        "date": datetime.now(),
+        "diagnosed_by": username,
+        "diagnosis_type": "bulk"
+    }
+
+
+def _chunks(items: List, size: int) -> Iterable[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def run_bulk_diagnosis(records: List[Dict], db, llm_provider: str = "groq", run_id: Optional[str] = None,
+                       max_concurrency: Optional[int] = None, chunk_size: Optional[int] = None,
+                       use_cache: bool = True, username: str = "bulk",
+                       progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    Run the advanced diagnosis for every record not yet finished in the checkpoint
+
+    Args:
+        records: Patient records (name, age, gender, bp, glucose, heart_rate, symptoms)
+        db: MongoDB database receiving the results in bulk_diagnoses
+        llm_provider: Preferred LLM provider
+        run_id: Checkpoint name; reuse it to resume (default: a new timestamped ID)
+        max_concurrency: LLM requests in flight (default BULK_MAX_CONCURRENCY)
+        chunk_size: Patients per chunk and per insert_many (default BULK_CHUNK_SIZE)
+        use_cache: False to bypass the LLM analysis cache
+        username: Recorded as diagnosed_by on the results
+        progress: Optional callback receiving the checkpoint progress after every chunk
+
+    Returns:
+        Progress summary with the run's timing
+    """
+    run_id = run_id or datetime.now().strftime("bulk-%Y%m%d-%H%M%S")
+    if max_concurrency is None:
+        max_concurrency = int(os.getenv("BULK_MAX_CONCURRENCY", "4"))
+    if chunk_size is None:
+        chunk_size = int(os.getenv("BULK_CHUNK_SIZE", "50"))
+
+    checkpoint = BulkCheckpoint(run_id)
+    checkpoint.state["total"] = len(records)
+    checkpoint.save()
+    pending = [(patient_key(record, index), record) for index, record in enumerate(records)]
+    pending = [(key, record) for key, record in pending if not checkpoint.is_done(key)]
+
+    system = diagnosis_systems.get(llm_provider)
+    sources_by_prediction = {}
+    started = time.perf_counter()
+
+    for chunk in _chunks(pending, max(1, chunk_size)):
+        keys, patients, errors, error_documents = [], [], {}, []
+        for key, record in chunk:
+            try:
+                patients.append(_patient_data(record))
+                keys.append(key)
+            except InvalidRecordError as e:
+                print(f"⚠️  Patient {key} skipped: {e}")
+                errors[key] = str(e)
+                error_documents.append(_error_result(run_id, key, record, str(e), username))
+        documents = []
+        if patients:
+            symptom_lists = [[s.strip() for s in p["symptoms"].split(",") if s.strip()] for p in patients]
+
+            predictions, model_version = predict_rows(FEATURE_SCHEMA.encode_rows(patients))
+            predictions = [str(p) for p in predictions]
+
+            # One source lookup per distinct prediction, shared by every patient with it
+            new_conditions = sorted(set(predictions) - set(sources_by_prediction))
+            if new_conditions:
+                with ThreadPoolExecutor(max_workers=min(max_concurrency, len(new_conditions))) as executor:
+                    for condition, sources in zip(new_conditions, executor.map(search_medical_condition, new_conditions)):
+                        sources_by_prediction[condition] = sources
+
+            analyses = system.analyze_symptoms_batch(symptom_lists, patients, max_concurrency, use_cache)
+
+            now = datetime.now()
+            for key, patient_data, symptoms, prediction, analysis in zip(keys, patients, symptom_lists,
+                                                                         predictions, analyses):
+                sources = sources_by_prediction[prediction]
+                results = {"ai_analysis": analysis}
+                status = {"ai_analysis": "ok"}
+                for source in ("web_search", "wikipedia", "pubmed_articles"):
+                    results[source] = sources[source]
+                    status[source] = sources["source_status"][source]
+                report = system.build_report(symptoms, patient_data, prediction, results, status)
+                documents.append(dict(
+                    patient_data,
+                    _id=f"{run_id}:{key}",
+                    run_id=run_id,
+                    patient_id=key,
+                    ml_diagnosis=prediction,
+                    model_version=model_version,
+                    comprehensive_report=report,
+                    date=now,
+                    diagnosed_by=username,
+                    diagnosis_type="bulk"
+                ))
+
+        checkpoint.record(keys + list(errors), _insert_results(db, documents + error_documents), errors)
+        if progress is not None:
+            progress(checkpoint.progress())
+
+    checkpoint.state["finished"] = True
+    checkpoint.save()
+    summary = checkpoint.progress()
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+    summary["distinct_predictions"] = len(sources_by_prediction)
+    summary["errors"] = [{"patient_id": key, "error": error}
+                         for key, error in list(checkpoint.state["errors"].items())[:MAX_REPORTED_ERRORS]]
+    return summary
+
+
+def _insert_results(db, documents: List[Dict]) -> int:
+    """insert_many that tolerates results already written before a crash"""
+    if not documents:
+        return 0
+    try:
+        return len(db[RESULTS_COLLECTION].insert_many(documents, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        # Duplicate _ids come from a chunk written before the checkpoint was saved
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+        return e.details.get("nInserted", 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the advanced diagnosis over a cohort of patients")
+    parser.add_argument("--date", help="Diagnose db.patients records of this day (YYYY-MM-DD, default today)")
+    parser.add_argument("--input", help="Read patients from a CSV or JSON file instead of the database")
+    parser.add_argument("--provider", default="groq", help="Preferred LLM provider")
+    parser.add_argument("--max-concurrency", type=int, help="LLM requests in flight")
+    parser.add_argument("--chunk-size", type=int, help="Patients per chunk")
+    parser.add_argument("--run-id", help="Checkpoint name; pass an earlier run's ID to resume it")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the LLM analysis cache")
+    args = parser.parse_args()
+
+    from utils.db_connection import get_db_connection
+
+    database = get_db_connection()
+    if database is None:
+        raise SystemExit("✗ MongoDB is required to store the results")
+
+    if args.input:
+        cohort = load_patient_file(args.input)
+    else:
+        day = datetime.strptime(args.date, "%Y-%m-%d") if args.date else datetime.now()
+        cohort = patients_for_day(database, day)
+    print(f"Diagnosing {len(cohort)} patients...")
+
+    result = run_bulk_diagnosis(
+        cohort, database, llm_provider=args.provider, run_id=args.run_id,
+        max_concurrency=args.max_concurrency, chunk_size=args.chunk_size, use_cache=not args.no_cache,
+        progress=lambda p: print(f"  {p['completed']}/{p['total']} patients done")
+    )
+    print(f"✓ Run {result['run_id']}: {result['written']} results written in {result['seconds']}s "
+          f"({result['distinct_predictions']} distinct predictions, {result['invalid']} invalid records)")
+    for failure in result["errors"]:
+        print(f"  ✗ {failure['patient_id']}: {failure['error']}")
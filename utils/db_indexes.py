@@ -0,0 +1,199 @@
+"""
+Database Indexes
+Creates the MongoDB indexes behind the app's hot queries and verifies with
+explain() that none of those queries falls back to a collection scan.
+
+Both steps run at app startup; creating an index that already exists is a
+no-op. Run them by hand after restoring a database or changing a query:
+
+    python -m utils.db_indexes            # create the indexes, then check the query plans
+    python -m utils.db_indexes check      # only check the query plans (exit code 1 on a scan)
+
+Configuration (environment):
+    DB_CHECK_QUERY_PLANS   0 skips the query plan check at startup
+"""
+
+import argparse
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from utils.patient_queries import DASHBOARD_PROJECTION, SORT_ORDER, build_patient_filter
+
+INDEXES = {
+    "users": [
+        # Login and registration look users up by name; names must stay unique
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True)
+    ],
+    "patients": [
+        # Dashboard pages and day cohorts; _id breaks ties between equal dates
+        IndexModel([("date", DESCENDING), ("_id", DESCENDING)], name="date_desc"),
+        # Dashboard filtered by the user who made the diagnosis
+        IndexModel([("diagnosed_by", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)],
+                   name="diagnosed_by_date_desc"),
+        # Dashboard filtered by diagnosis: the $or over both fields uses one index per
+        # branch and merges them in (date, _id) order, so rare diagnoses stay cheap
+        IndexModel([("diagnosis", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)],
+                   name="diagnosis_date_desc"),
+        IndexModel([("ml_diagnosis", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)],
+                   name="ml_diagnosis_date_desc")
+    ],
+    "reports": [
+        IndexModel([("upload_date", DESCENDING)], name="upload_date_desc")
+    ]
+}
+
+
+def hot_queries() -> List[Dict]:
+    """The app's frequent queries, as find() arguments for explain()"""
+    yesterday = datetime.now() - timedelta(days=1)
+    return [
+        {"name": "login", "collection": "users", "filter": {"username": "admin"}, "limit": 1},
+        {"name": "reports_list", "collection": "reports", "filter": {},
+         "sort": [("upload_date", DESCENDING)]},
+        {"name": "dashboard_page", "collection": "patients", "filter": {},
+         "projection": DASHBOARD_PROJECTION, "sort": SORT_ORDER, "limit": 51},
+        {"name": "dashboard_by_user", "collection": "patients",
+         "filter": build_patient_filter(diagnosed_by="admin"),
+         "projection": DASHBOARD_PROJECTION, "sort": SORT_ORDER, "limit": 51},
+        {"name": "dashboard_by_diagnosis", "collection": "patients",
+         "filter": build_patient_filter(diagnosis="Diabetes"),
+         "projection": DASHBOARD_PROJECTION, "sort": SORT_ORDER, "limit": 51},
+        {"name": "dashboard_by_date", "collection": "patients",
+         "filter": build_patient_filter(date_from=yesterday.strftime("%Y-%m-%d")),
+         "projection": DASHBOARD_PROJECTION, "sort": SORT_ORDER, "limit": 51},
+        {"name": "bulk_cohort_day", "collection": "patients",
+         "filter": {"date": {"$gte": yesterday, "$lt": datetime.now()}},
+         "sort": [("date", ASCENDING), ("_id", ASCENDING)]}
+    ]
+
+
+def ensure_indexes(db) -> Dict[str, List[str]]:
+    """
+    Create every index in INDEXES
+
+    Args:
+        db: MongoDB database
+
+    Returns:
+        Dict of collection name -> index names that exist after the call
+    """
+    ensured = {}
+    for collection, models in INDEXES.items():
+        ensured[collection] = []
+        for model in models:
+            # One at a time, so one conflict does not block the other indexes
+            try:
+                ensured[collection].extend(db[collection].create_indexes([model]))
+            except OperationFailure as e:
+                # e.g. duplicate usernames, or an index with the same keys and other options
+                print(f"⚠️  Could not create index {model.document['name']} on {collection}: "
+                      f"{e.details.get('errmsg', e) if e.details else e}")
+    return ensured
+
+
+def _plan_stages(plan) -> List[str]:
+    """Every stage name in a query plan tree"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+
+def check_query_plans(db) -> List[Dict]:
+    """
+    Explain every hot query and flag collection scans and in-memory sorts
+
+    Args:
+        db: MongoDB database
+
+    Returns:
+        One dict per query with name, collection, stages and status
+        ("ok", "collection_scan", "in_memory_sort" or "unavailable")
+    """
+    results = []
+    for query in hot_queries():
+        result = {"name": query["name"], "collection": query["collection"], "stages": []}
+        try:
+            cursor = db[query["collection"]].find(query["filter"], query.get("projection"))
+            if query.get("sort"):
+                cursor = cursor.sort(query["sort"])
+            if query.get("limit"):
+                cursor = cursor.limit(query["limit"])
+            result["stages"] = _plan_stages(cursor.explain()["queryPlanner"]["winningPlan"])
+        except Exception as e:
+            # In-memory stand-ins and restricted users cannot explain
+            result["status"] = "unavailable"
+            result["error"] = str(e)
+            results.append(result)
+            continue
+
+        if "COLLSCAN" in result["stages"]:
+            result["status"] = "collection_scan"
+        elif "SORT" in result["stages"]:
+            result["status"] = "in_memory_sort"
+        else:
+            result["status"] = "ok"
+        results.append(result)
+    return results
+
+
+def bootstrap_indexes(db, check_plans: Optional[bool] = None) -> List[Dict]:
+    """
+    Create the indexes and report hot queries that do not use them (app startup)
+
+    Args:
+        db: MongoDB database
+        check_plans: Run the explain() check (default DB_CHECK_QUERY_PLANS, on)
+
+    Returns:
+        Query plan results (empty when the check is skipped)
+    """
+    ensure_indexes(db)
+    if check_plans is None:
+        check_plans = os.getenv("DB_CHECK_QUERY_PLANS", "1") != "0"
+    if not check_plans:
+        return []
+
+    results = check_query_plans(db)
+    for result in results:
+        if result["status"] == "collection_scan":
+            print(f"⚠️  Query '{result['name']}' scans the whole {result['collection']} collection")
+        elif result["status"] == "in_memory_sort":
+            print(f"⚠️  Query '{result['name']}' sorts {result['collection']} in memory")
+    if results and all(result["status"] == "unavailable" for result in results):
+        print("⚠️  Query plans could not be checked (explain is not supported)")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the MongoDB indexes and check the hot query plans")
+    parser.add_argument("command", nargs="?", choices=["ensure", "check"], default="ensure",
+                        help="ensure: create the indexes, then check (default); check: only check")
+    args = parser.parse_args()
+
+    from utils.db_connection import get_db_connection
+
+    database = get_db_connection()
+    if database is None:
+        raise SystemExit("✗ MongoDB is not reachable")
+
+    if args.command == "ensure":
+        for name, indexes in ensure_indexes(database).items():
+            print(f"✓ {name}: {', '.join(indexes) or 'no indexes created'}")
+
+    plans = check_query_plans(database)
+    for plan in plans:
+        mark = "✓" if plan["status"] == "ok" else "✗"
+        print(f"{mark} {plan['name']:18s} {plan['collection']:10s} {plan['status']:16s} "
+              f"{' > '.join(plan['stages']) or plan.get('error', '')}")
+    raise SystemExit(1 if any(plan["status"] == "collection_scan" for plan in plans) else 0)
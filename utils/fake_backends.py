@@ -0,0 +1,199 @@
+"""
+Fake Backends
+Local stand-ins for the external services of the advanced diagnosis (LLM,
+DuckDuckGo, Wikipedia and NCBI), with configurable latency distributions and
+error rates, so routing, caching and load behaviour can be exercised without
+API keys or network access.
+
+Set DIAGNOSIS_BACKENDS=fake to use all of them in the app: every LLM provider
+is answered by FakeLLM, the search and Wikipedia tools are replaced, and the
+PubMed client talks to a local utils/pubmed_stub.py server.
+
+Configuration (environment), for each backend NAME in LLM, SEARCH, WIKIPEDIA, PUBMED:
+    FAKE_<NAME>_LATENCY        mean seconds per call (LLM 0.5, SEARCH 0.3, WIKIPEDIA 0.2, PUBMED 0.1)
+    FAKE_<NAME>_JITTER         spread in seconds for the uniform and normal distributions, default 0
+    FAKE_<NAME>_DISTRIBUTION   fixed, uniform, normal, exponential or lognormal, default uniform
+    FAKE_<NAME>_FAILURE_RATE   fraction of calls that fail, default 0
+"""
+
+import math
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "exponential", "lognormal")
+
+DEFAULT_LATENCIES = {"LLM": 0.5, "SEARCH": 0.3, "WIKIPEDIA": 0.2, "PUBMED": 0.1}
+
+
+class FakeBackendError(Exception):
+    """Injected failure of a fake backend call"""
+
+
+def use_fake_backends() -> bool:
+    """True if DIAGNOSIS_BACKENDS=fake"""
+    return os.getenv("DIAGNOSIS_BACKENDS", "live").lower() == "fake"
+
+
+class LatencyModel:
+    """Samples call latencies and injected failures for one fake backend"""
+
+    def __init__(self, mean: float, jitter: float = 0.0, distribution: str = "uniform",
+                 failure_rate: float = 0.0):
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution '{distribution}'. "
+                             f"Choose from: {', '.join(LATENCY_DISTRIBUTIONS)}")
+        self.mean = mean
+        self.jitter = jitter
+        self.distribution = distribution
+        self.failure_rate = failure_rate
+
+    @classmethod
+    def from_env(cls, name: str, **overrides) -> "LatencyModel":
+        """Settings from FAKE_<NAME>_* variables; keyword arguments that are not None win"""
+        settings = {
+            "mean": float(os.getenv(f"FAKE_{name}_LATENCY", str(DEFAULT_LATENCIES.get(name, 0.1)))),
+            "jitter": float(os.getenv(f"FAKE_{name}_JITTER", "0")),
+            "distribution": os.getenv(f"FAKE_{name}_DISTRIBUTION", "uniform"),
+            "failure_rate": float(os.getenv(f"FAKE_{name}_FAILURE_RATE", "0"))
+        }
+        settings.update({key: value for key, value in overrides.items() if value is not None})
+        return cls(**settings)
+
+    def sample(self) -> float:
+        """One latency in seconds"""
+        if self.distribution == "fixed" or self.mean <= 0:
+            value = self.mean
+        elif self.distribution == "uniform":
+            value = random.uniform(self.mean - self.jitter, self.mean + self.jitter)
+        elif self.distribution == "normal":
+            value = random.gauss(self.mean, self.jitter)
+        elif self.distribution == "exponential":
+            value = random.expovariate(1.0 / self.mean)
+        else:
+            # Long right tail with the requested mean (sigma 0.75)
+            sigma = 0.75
+            value = random.lognormvariate(math.log(self.mean) - sigma ** 2 / 2, sigma)
+        return max(0.0, value)
+
+    def should_fail(self) -> bool:
+        return random.random() < self.failure_rate
+
+
+class FakeLLM:
+    """
+    Chat-model stand-in supporting invoke, stream and batch like a LangChain model
+    """
+
+    def __init__(self, latency: Optional[float] = None, jitter: Optional[float] = None,
+                 failure_rate: Optional[float] = None, name: str = "fake",
+                 distribution: Optional[str] = None):
+        self.model = LatencyModel.from_env("LLM", mean=latency, jitter=jitter,
+                                           failure_rate=failure_rate, distribution=distribution)
+        self.name = name
+        self.calls = 0
+
+    def invoke(self, prompt, config: Optional[Dict] = None) -> AIMessage:
+        self._begin()
+        time.sleep(self.model.sample())
+        return AIMessage(content=self._answer(prompt))
+
+    def stream(self, prompt, config: Optional[Dict] = None) -> Iterator[AIMessageChunk]:
+        self._begin()
+        words = re.findall(r"\S+\s*", self._answer(prompt))
+        delay = self.model.sample() / max(1, len(words))
+        for word in words:
+            time.sleep(delay)
+            yield AIMessageChunk(content=word)
+
+    def batch(self, prompts: List, config: Optional[Dict] = None,
+              return_exceptions: bool = False) -> List:
+        max_concurrency = (config or {}).get("max_concurrency") or len(prompts) or 1
+
+        def run(prompt):
+            try:
+                return self.invoke(prompt)
+            except Exception as e:
+                if return_exceptions:
+                    return e
+                raise
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            return list(executor.map(run, prompts))
+
+    def _begin(self):
+        self.calls += 1
+        if self.model.should_fail():
+            raise FakeBackendError(f"{self.name} failed (injected)")
+
+    def _answer(self, prompt) -> str:
+        prompt = str(prompt)
+        match = re.search(r"Symptoms:\s*(.+)", prompt)
+        symptoms = match.group(1).strip() if match else "the reported symptoms"
+        return (
+            f"**Differential Diagnosis** (offline answer from {self.name})\n"
+            f"1. Condition consistent with {symptoms}\n"
+            "2. Viral infection\n"
+            "3. Stress-related disorder\n\n"
+            "**Primary Diagnosis**: Condition consistent with the reported symptoms\n\n"
+            "**Reasoning**: Generated by the fake LLM backend for testing.\n\n"
+            "**Recommended Tests**: Complete blood count, basic metabolic panel\n\n"
+            "**Warning Signs**: Chest pain, difficulty breathing, confusion\n\n"
+            "**General Recommendations**: Rest, hydration, follow up with a physician"
+        )
+
+
+class FakeSearchTool:
+    """Stand-in for DuckDuckGoSearchRun (same run(query) -> str interface)"""
+
+    def __init__(self, **settings):
+        self.model = LatencyModel.from_env("SEARCH", **settings)
+        self.calls = 0
+
+    def run(self, query: str) -> str:
+        self.calls += 1
+        time.sleep(self.model.sample())
+        if self.model.should_fail():
+            raise FakeBackendError("search failed (injected)")
+        return (f"Offline search results for '{query}': overview of causes, common symptoms, "
+                "diagnostic criteria and first-line treatment options from trusted medical sites.")
+
+
+class FakeWikipedia:
+    """Stand-in for WikipediaAPIWrapper (same run(query) -> str interface)"""
+
+    def __init__(self, **settings):
+        self.model = LatencyModel.from_env("WIKIPEDIA", **settings)
+        self.calls = 0
+
+    def run(self, query: str) -> str:
+        self.calls += 1
+        time.sleep(self.model.sample())
+        if self.model.should_fail():
+            raise FakeBackendError("Wikipedia failed (injected)")
+        topic = query.replace(" medical condition", "")
+        return (f"Page: {topic}\nSummary: {topic} is a medical condition described here by the "
+                "offline Wikipedia stand-in. It covers signs and symptoms, causes, diagnosis, "
+                "treatment and epidemiology.")
+
+
+_pubmed_stub = None
+_pubmed_stub_lock = threading.Lock()
+
+
+def fake_pubmed_url() -> str:
+    """Base URL of a local NCBI stub, started on first use with the FAKE_PUBMED_* settings"""
+    global _pubmed_stub
+    if _pubmed_stub is None:
+        with _pubmed_stub_lock:
+            if _pubmed_stub is None:
+                from utils.pubmed_stub import start_stub_server
+                model = LatencyModel.from_env("PUBMED")
+                _pubmed_stub = start_stub_server(latency_sampler=model.sample, failure_rate=model.failure_rate)
+    return _pubmed_stub[1]
@@ -0,0 +1,166 @@
+"""
+Process-pool Inference Service
+Runs model prediction in a pool of worker processes so CPU-bound tree
+evaluation does not compete for the GIL with Flask request threads,
+template rendering, pymongo and the LangChain calls.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+
+def _init_worker():
+    """Load the model once when a worker process starts"""
+    from utils.model_registry import get_model_registry
+    from utils.predict import get_predict_engine
+
+    loaded = get_model_registry().get()
+    if get_predict_engine() == 'compiled':
+        loaded.compiled()
+
+
+def _worker_predict(rows, engine=None):
+    """Predict a batch of encoded rows inside a worker process with the caller's engine"""
+    from utils.predict import predict_matrix
+
+    predictions, version = predict_matrix(rows, engine)
+    return [str(p) for p in predictions], version
+
+
+class InferencePool:
+    """
+    Pool of preloaded worker processes serving predictions.
+
+    Each call waits at most `timeout` seconds for a worker. On a timeout or
+    a crashed pool the caller's fallback is used instead, so a request is
+    always answered; a broken pool is replaced on the next call. A call that
+    timed out is cancelled if no worker has taken it yet; if every worker is
+    held by a call running for longer than `restart_after` seconds, the
+    workers are terminated and the pool is rebuilt.
+    """
+
+    def __init__(self, size=None, timeout=None, restart_after=None):
+        if size is None:
+            size = int(os.getenv('PREDICT_POOL_SIZE', str(os.cpu_count() or 2)))
+        if timeout is None:
+            timeout = float(os.getenv('PREDICT_POOL_TIMEOUT', '2.0'))
+        if restart_after is None:
+            # Well above a worker's start-up time, so a pool that is still starting is not restarted
+            restart_after = float(os.getenv('PREDICT_POOL_RESTART_AFTER', '30'))
+        self.size = size
+        self.timeout = timeout
+        self.restart_after = restart_after
+        self.completed = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.fallbacks = 0
+        self.restarts = 0
+        self._executor = None
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def predict(self, rows, fallback, engine=None):
+        """
+        Predict rows in a worker process.
+
+        Args:
+            rows: Encoded feature rows
+            fallback: Callable used in-process if the pool cannot answer in time
+            engine (str): Inference engine the workers use (default: their PREDICT_ENGINE)
+
+        Returns:
+            tuple: (sequence of predictions, model version)
+        """
+        executor = self._get_executor()
+        try:
+            future = executor.submit(_worker_predict, rows, engine)
+            self._track(future)
+            result = future.result(timeout=self.timeout)
+            self.completed += 1
+            return result
+        except TimeoutError:
+            self.timeouts += 1
+            # Running calls cannot be cancelled; they still hold a worker
+            future.cancel()
+            if self._saturated():
+                print(f"⚠️  Every inference worker is stuck for over {self.restart_after:g}s, restarting the pool")
+                self._discard(executor, terminate=True)
+        except BrokenProcessPool as e:
+            self.failures += 1
+            print(f"⚠️  Inference pool crashed, restarting: {e}")
+            self._discard(executor)
+        except Exception as e:
+            self.failures += 1
+            print(f"⚠️  Inference pool error: {e}")
+
+        self.fallbacks += 1
+        return fallback(rows)
+
+    def warm_up(self):
+        """Start every worker now instead of on the first request"""
+        executor = self._get_executor()
+        for future in [executor.submit(_worker_predict, [(0, 0, 0, 0, 0)]) for _ in range(self.size)]:
+            future.result()
+
+    def shutdown(self):
+        """Stop all worker processes"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self):
+        """Pool counters"""
+        return {
+            'size': self.size,
+            'timeout_seconds': self.timeout,
+            'completed': self.completed,
+            'timeouts': self.timeouts,
+            'failures': self.failures,
+            'fallbacks': self.fallbacks,
+            'restarts': self.restarts,
+            'in_flight': len(self._in_flight)
+        }
+
+    def _get_executor(self):
+        executor = self._executor
+        if executor is not None:
+            return executor
+        with self._lock:
+            if self._executor is None:
+                # Spawned workers do not inherit the parent's threads and locks
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.size,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker
+                )
+            return self._executor
+
+    def _track(self, future):
+        in_flight = self._in_flight
+        in_flight[future] = time.monotonic()
+        future.add_done_callback(lambda done: in_flight.pop(done, None))
+
+    def _saturated(self):
+        """True if every worker is held by a call that has been running for longer than restart_after"""
+        cutoff = time.monotonic() - self.restart_after
+        stuck = [future for future, submitted in list(self._in_flight.items())
+                 if future.running() and submitted < cutoff]
+        return len(stuck) >= self.size
+
+    def _discard(self, executor, terminate=False):
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self._in_flight = {}
+            self.restarts += 1
+        if terminate:
+            # shutdown() would wait for the stuck calls to finish in their workers
+            for process in list((getattr(executor, '_processes', None) or {}).values()):
+                process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
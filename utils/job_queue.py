@@ -0,0 +1,342 @@
+"""
+Advanced Diagnosis Job Queue
+Runs advanced diagnoses in a bounded pool of background workers instead of
+inside the Flask request, with job state and results kept in MongoDB.
+
+- Submitting returns a job ID at once; identical requests from the same user
+  that are still queued or running share one job
+- Workers claim jobs from the collection with a time-limited lease, renewed
+  while the job runs, so jobs left running by a crashed or restarted process
+  are picked up again; jobs that already used all their attempts are failed
+- Callers poll the job, or wait for it to finish with a timeout
+
+Configuration (environment):
+    DIAGNOSIS_JOB_WORKERS        worker threads per process, default 4 (0 only accepts jobs)
+    DIAGNOSIS_JOB_LEASE_SECONDS  how long a claimed job may run before it is requeued, default 300
+    DIAGNOSIS_JOB_MAX_ATTEMPTS   runs before a job is marked failed, default 3
+"""
+
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+JOB_STATES = ("queued", "running", "done", "failed")
+
+
+def dedup_key(username: str, payload: Dict) -> str:
+    """Hash of the user and the request payload; equal requests get the same key"""
+    canonical = json.dumps({"username": username, "payload": payload}, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def job_summary(job: Dict) -> Dict:
+    """JSON-friendly view of a job document for the status endpoint"""
+    summary = {
+        "job_id": str(job["_id"]),
+        "status": job["status"],
+        "attempts": job.get("attempts", 0),
+        "error": job.get("error")
+    }
+    for field in ("created_at", "started_at", "finished_at"):
+        summary[field] = job[field].isoformat() if job.get(field) else None
+    if job["status"] == "done":
+        summary["result"] = job.get("result")
+    return summary
+
+
+class DiagnosisJobQueue:
+    """
+    MongoDB-backed job queue with a bounded pool of worker threads
+
+    The handler receives the job document and returns the result dict that
+    is stored on the job; an exception marks the attempt as failed, and the
+    job is retried until max_attempts is reached.
+    """
+
+    def __init__(self, collection, handler: Callable[[Dict], Dict], workers: Optional[int] = None,
+                 lease_seconds: Optional[float] = None, max_attempts: Optional[int] = None,
+                 poll_interval: float = 1.0, write_retries: int = 5):
+        """
+        Args:
+            collection: MongoDB collection holding the jobs (db.diagnosis_jobs)
+            handler: Callable running one job
+            workers: Worker threads (default DIAGNOSIS_JOB_WORKERS)
+            lease_seconds: Seconds a claimed job may run before it is requeued
+            max_attempts: Runs before a job is marked failed
+            poll_interval: Seconds idle workers wait before looking for jobs again
+            write_retries: Attempts at storing a job's outcome before leaving it to lease expiry
+        """
+        if workers is None:
+            workers = int(os.getenv("DIAGNOSIS_JOB_WORKERS", "4"))
+        if lease_seconds is None:
+            lease_seconds = float(os.getenv("DIAGNOSIS_JOB_LEASE_SECONDS", "300"))
+        if max_attempts is None:
+            max_attempts = int(os.getenv("DIAGNOSIS_JOB_MAX_ATTEMPTS", "3"))
+        self.collection = collection
+        self.handler = handler
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.write_retries = max(1, write_retries)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.submitted = 0
+        self.deduplicated = 0
+        self.completed = 0
+        self.failed = 0
+        self.lost_leases = 0
+        self._threads = []
+        self._stopping = threading.Event()
+        self._wakeup = threading.Condition()
+        self._finished = threading.Condition()
+        self._ensure_indexes()
+
+    def start(self):
+        """Start the worker threads (jobs left by a previous run are picked up as their leases expire)"""
+        if self._threads:
+            return
+        self._stopping.clear()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"diagnosis-job-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self.workers:
+            print(f"✓ Diagnosis job queue started with {self.workers} workers")
+
+    def stop(self, timeout: float = 5.0):
+        """Ask the workers to exit after their current job"""
+        self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, username: str, payload: Dict) -> tuple:
+        """
+        Queue a job, or return the matching job that is still queued or running
+
+        Args:
+            username: User submitting the job
+            payload: Job parameters handed to the handler
+
+        Returns:
+            Tuple of (job ID string, True if an existing job was reused)
+        """
+        key = dedup_key(username, payload)
+        now = datetime.now()
+        job = {
+            "username": username,
+            "payload": payload,
+            "status": "queued",
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now
+        }
+        try:
+            result = self.collection.update_one(
+                {"dedup_key": key, "active": True},
+                {"$setOnInsert": job},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # Another request inserted the same job between our query and insert
+            result = None
+
+        if result is not None and result.upserted_id is not None:
+            self.submitted += 1
+            with self._wakeup:
+                self._wakeup.notify()
+            return str(result.upserted_id), False
+
+        existing = self.collection.find_one({"dedup_key": key, "active": True}, {"_id": 1})
+        if existing is None:
+            # The matching job finished in the meantime; queue a fresh one
+            return self.submit(username, payload)
+        self.deduplicated += 1
+        return str(existing["_id"]), True
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """The job document, or None for an unknown or malformed ID"""
+        try:
+            return self.collection.find_one({"_id": ObjectId(job_id)})
+        except InvalidId:
+            return None
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict]:
+        """
+        Wait until a job is done or failed
+
+        Args:
+            job_id: Job ID string
+            timeout: Maximum seconds to wait
+
+        Returns:
+            The job document as of the end of the wait, or None if it does not exist
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in ("done", "failed") or remaining <= 0:
+                return job
+            # Woken early by jobs finishing in this process; polling covers other processes
+            with self._finished:
+                self._finished.wait(min(remaining, 0.5))
+
+    def stats(self) -> Dict:
+        """Counters for this process and job counts by state"""
+        counts = {state: self.collection.count_documents({"status": state}) for state in JOB_STATES}
+        return {
+            "workers": self.workers,
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "completed": self.completed,
+            "failed": self.failed,
+            "lost_leases": self.lost_leases,
+            "jobs": counts
+        }
+
+    def _ensure_indexes(self):
+        try:
+            self.collection.create_index([("status", ASCENDING), ("created_at", ASCENDING)])
+            # Only one queued or running job per dedup key
+            self.collection.create_index(
+                [("dedup_key", ASCENDING)], unique=True,
+                partialFilterExpression={"active": True}
+            )
+        except Exception as e:
+            print(f"⚠️  Could not create diagnosis job indexes: {e}")
+
+    def _claim(self) -> Optional[Dict]:
+        """Atomically take the oldest queued job, or a running job whose lease expired"""
+        now = datetime.now()
+        return self.collection.find_one_and_update(
+            {"active": True, "$or": [
+                {"status": "queued"},
+                # A job that still held its lease after its last attempt is failed by _expire instead
+                {"status": "running", "lease_until": {"$lt": now}, "attempts": {"$lt": self.max_attempts}}
+            ]},
+            {
+                "$set": {
+                    "status": "running",
+                    "worker": self.worker_id,
+                    "lease_token": str(ObjectId()),
+                    "started_at": now,
+                    "updated_at": now,
+                    "lease_until": now + timedelta(seconds=self.lease_seconds)
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("created_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _expire(self):
+        """Fail running jobs whose lease expired on their last attempt (the worker died each time)"""
+        now = datetime.now()
+        result = self.collection.update_many(
+            {"active": True, "status": "running", "lease_until": {"$lt": now},
+             "attempts": {"$gte": self.max_attempts}},
+            {"$set": {"status": "failed", "active": False, "error": "lease expired on the last attempt",
+                      "finished_at": now, "updated_at": now}}
+        )
+        if result.modified_count:
+            print(f"❌ {result.modified_count} diagnosis jobs failed: lease expired on the last attempt")
+            with self._finished:
+                self._finished.notify_all()
+
+    def _work(self):
+        while not self._stopping.is_set():
+            try:
+                job = self._claim()
+                if job is None:
+                    self._expire()
+            except Exception as e:
+                print(f"⚠️  Diagnosis job claim failed: {e}")
+                job = None
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
+                continue
+            try:
+                self._run(job)
+            except Exception as e:
+                # Keep the worker alive; the job is picked up again when its lease expires
+                print(f"❌ Diagnosis job {job['_id']} could not be completed: {e}")
+
+    def _renew_lease(self, job: Dict, done: threading.Event):
+        """Extend the job's lease every third of the lease time until done is set"""
+        interval = max(self.lease_seconds / 3, 0.05)
+        while not done.wait(interval):
+            try:
+                result = self.collection.update_one(
+                    {"_id": job["_id"], "lease_token": job["lease_token"]},
+                    {"$set": {"lease_until": datetime.now() + timedelta(seconds=self.lease_seconds)}}
+                )
+            except Exception as e:
+                print(f"⚠️  Could not renew the lease of diagnosis job {job['_id']}: {e}")
+                continue
+            if result.matched_count == 0:
+                # Another worker took the job over; its outcome wins
+                self.lost_leases += 1
+                print(f"⚠️  Diagnosis job {job['_id']} lost its lease")
+                return
+
+    def _run(self, job: Dict):
+        done = threading.Event()
+        renewer = threading.Thread(target=self._renew_lease, args=(job, done),
+                                   name=f"lease-{job['_id']}", daemon=True)
+        renewer.start()
+        try:
+            update = {"updated_at": datetime.now()}
+            try:
+                update.update({
+                    "status": "done",
+                    "active": False,
+                    "result": self.handler(job),
+                    "error": None,
+                    "finished_at": datetime.now()
+                })
+                self.completed += 1
+            except Exception as e:
+                print(f"❌ Diagnosis job {job['_id']} failed (attempt {job['attempts']}): {e}")
+                update["error"] = str(e)
+                if job["attempts"] >= self.max_attempts:
+                    update.update({"status": "failed", "active": False, "finished_at": datetime.now()})
+                    self.failed += 1
+                else:
+                    update["status"] = "queued"
+            # The lease is still renewed while the outcome is being stored
+            self._complete(job, update)
+        finally:
+            done.set()
+        with self._finished:
+            self._finished.notify_all()
+
+    def _complete(self, job: Dict, update: Dict):
+        """Store a job's outcome, retrying while MongoDB is unavailable"""
+        delay = 0.5
+        for attempt in range(1, self.write_retries + 1):
+            try:
+                # Only the holder of the current lease may record the outcome
+                self.collection.update_one({"_id": job["_id"], "lease_token": job["lease_token"]},
+                                           {"$set": update})
+                return
+            except Exception as e:
+                if attempt == self.write_retries:
+                    raise
+                print(f"⚠️  Could not store the outcome of diagnosis job {job['_id']}, retrying: {e}")
+                if self._stopping.wait(delay):
+                    raise
+                delay = min(delay * 2, 5.0)
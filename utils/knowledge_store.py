@@ -0,0 +1,312 @@
+"""
+Medical Knowledge Store
+Local copy of the web search, Wikipedia and PubMed material for every
+condition the diagnostic model can predict. It is filled in the background
+when the app starts (and refreshed on a schedule from the command line), so
+the advanced diagnosis reads the sources for a predicted class from disk
+instead of waiting on the network.
+
+Sources that timed out or failed during a refresh are recorded in the
+entry's "missing" list; readers fetch just those online, and the entry
+counts as stale so the next refresh retries them.
+
+Usage:
+    python -m utils.knowledge_store refresh                  # fetch missing or stale classes
+    python -m utils.knowledge_store refresh --force          # refetch every class
+    python -m utils.knowledge_store refresh --every 21600    # keep refreshing every 6 hours
+    python -m utils.knowledge_store status
+
+Configuration (environment):
+    KNOWLEDGE_STORE_PATH      JSON file, default data/knowledge_store.json
+    KNOWLEDGE_STORE_MAX_AGE   seconds before a class is refetched, default 86400
+    KNOWLEDGE_PREWARM         0 disables the background pre-warm at app startup
+    KNOWLEDGE_PREWARM_WORKERS classes fetched concurrently, default 4
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from utils.source_cache import normalize_condition
+
+DEFAULT_STORE_PATH = os.path.join("data", "knowledge_store.json")
+
+SOURCES = ("web_search", "wikipedia", "pubmed_articles")
+
+
+class KnowledgeStore:
+    """
+    Thread-safe JSON-file store of medical sources keyed by normalized condition
+
+    The file is rewritten atomically after every update and re-read when
+    another process (such as the scheduled refresh) replaces it; the
+    (mtime, size) signature is checked at most once per check_interval seconds.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_age: Optional[float] = None,
+                 check_interval: float = 1.0):
+        self.path = path or os.getenv("KNOWLEDGE_STORE_PATH", DEFAULT_STORE_PATH)
+        if max_age is None:
+            max_age = float(os.getenv("KNOWLEDGE_STORE_MAX_AGE", str(24 * 3600)))
+        self.max_age = max_age
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._signature = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._load()
+
+    def get(self, condition: str) -> Optional[Dict]:
+        """
+        Stored sources for a condition
+
+        Args:
+            condition: Condition name (normalized for the lookup)
+
+        Returns:
+            Dict with web_search, wikipedia, pubmed_articles, refreshed_at and
+            missing (sources that could not be fetched), or None
+        """
+        self._maybe_reload()
+        entry = self._entries.get(normalize_condition(condition))
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, condition: str, sources: Dict):
+        """
+        Store freshly fetched sources for a condition and save the file
+
+        Sources that came back empty keep their previously stored value, so a
+        failed lookup during a refresh does not wipe good material. Sources
+        whose source_status is not "ok" and that have no stored value are
+        recorded as missing.
+
+        Args:
+            condition: Condition name
+            sources: Dict with the SOURCES and optionally source_status
+        """
+        key = normalize_condition(condition)
+        status = sources.get("source_status", {})
+        with self._lock:
+            previous = self._entries.get(key, {})
+            entry = {"condition": condition, "refreshed_at": time.time(), "missing": []}
+            for source in SOURCES:
+                entry[source] = sources.get(source) or previous.get(source)
+                if not entry[source] and status.get(source, "ok") != "ok":
+                    entry["missing"].append(source)
+            entries = dict(self._entries)
+            entries[key] = entry
+            self._save(entries)
+            self._entries = entries
+
+    def fill_missing(self, condition: str, results: Dict, status: Dict):
+        """
+        Store sources that were missing from a condition's entry once they have been fetched
+
+        The entry keeps its refreshed_at; nothing is written unless a missing source was filled.
+
+        Args:
+            condition: Condition name
+            results: Fetched sources by name
+            status: Fetch status by source name ("ok", "timeout" or "error")
+        """
+        key = normalize_condition(condition)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            filled = [source for source in entry.get("missing", [])
+                      if status.get(source) == "ok" and results.get(source)]
+            if not filled:
+                return
+            entry = dict(entry)
+            for source in filled:
+                entry[source] = results[source]
+            entry["missing"] = [source for source in entry["missing"] if source not in filled]
+            entries = dict(self._entries)
+            entries[key] = entry
+            self._save(entries)
+            self._entries = entries
+
+    def is_stale(self, condition: str) -> bool:
+        """True if the condition is not stored, has missing sources or is older than max_age"""
+        self._maybe_reload()
+        entry = self._entries.get(normalize_condition(condition))
+        return (entry is None or bool(entry.get("missing"))
+                or time.time() - entry["refreshed_at"] >= self.max_age)
+
+    def entries(self) -> List[Dict]:
+        """All stored entries"""
+        self._maybe_reload()
+        return list(self._entries.values())
+
+    def stats(self) -> Dict:
+        """Store contents and lookup counters"""
+        refreshed = [entry["refreshed_at"] for entry in self._entries.values()]
+        return {
+            "path": self.path,
+            "conditions": len(self._entries),
+            "incomplete": sum(1 for entry in self._entries.values() if entry.get("missing")),
+            "hits": self.hits,
+            "misses": self.misses,
+            "oldest_refresh": datetime.fromtimestamp(min(refreshed)).isoformat() if refreshed else None,
+            "max_age_seconds": self.max_age
+        }
+
+    def _signature_of_file(self):
+        try:
+            stat = os.stat(self.path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        if self._signature_of_file() != self._signature:
+            self._load()
+
+    def _load(self):
+        with self._lock:
+            signature = self._signature_of_file()
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f).get("conditions", {})
+            except FileNotFoundError:
+                self._entries = {}
+            except ValueError as e:
+                print(f"⚠️  Knowledge store {self.path} is unreadable, starting empty: {e}")
+                self._entries = {}
+            self._signature = signature
+
+    def _save(self, entries: Dict):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"updated_at": datetime.now().isoformat(), "conditions": entries}, f)
+        os.replace(tmp_path, self.path)
+        self._signature = self._signature_of_file()
+
+
+knowledge_store = KnowledgeStore()
+
+
+def model_classes() -> List[str]:
+    """Every condition the currently loaded diagnostic model can predict"""
+    from utils.model_registry import get_model_registry
+
+    loaded = get_model_registry().get()
+    classes = loaded.model.classes_ if loaded.model is not None else loaded.compiled().classes
+    return [str(c) for c in classes]
+
+
+def fetch_sources(condition: str) -> Dict:
+    """Look a condition up online with the advanced diagnosis source lookups"""
+    from utils.langchain_diagnosis import search_medical_condition
+
+    return search_medical_condition(condition, use_store=False)
+
+
+def prewarm(classes: Optional[List[str]] = None, store: Optional[KnowledgeStore] = None,
+            fetch: Optional[Callable] = None, max_workers: Optional[int] = None,
+            force: bool = False) -> Dict:
+    """
+    Fetch and store the sources for every model class that is missing or stale
+
+    Args:
+        classes: Conditions to fetch (default: the model's classes)
+        store: Target store (default: the shared knowledge_store)
+        fetch: Callable returning the sources dict for one condition
+        max_workers: Conditions fetched concurrently (default KNOWLEDGE_PREWARM_WORKERS)
+        force: Refetch conditions that are still fresh
+
+    Returns:
+        Summary with the refreshed, partial (stored with missing sources),
+        skipped and failed conditions
+    """
+    store = store or knowledge_store
+    fetch = fetch or fetch_sources
+    if classes is None:
+        classes = model_classes()
+    if max_workers is None:
+        max_workers = int(os.getenv("KNOWLEDGE_PREWARM_WORKERS", "4"))
+
+    todo = [condition for condition in classes if force or store.is_stale(condition)]
+    summary = {"refreshed": [], "partial": [], "skipped": [c for c in classes if c not in todo], "failed": []}
+
+    def refresh(condition):
+        try:
+            sources = fetch(condition)
+            if not any(sources.get(source) for source in SOURCES):
+                raise ValueError("every source came back empty")
+            store.put(condition, sources)
+            summary["refreshed"].append(condition)
+            # Just stored, so only missing sources make it stale
+            if store.is_stale(condition):
+                summary["partial"].append(condition)
+        except Exception as e:
+            print(f"⚠️  Knowledge store refresh failed for {condition}: {e}")
+            summary["failed"].append(condition)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="knowledge-prewarm") as executor:
+        list(executor.map(refresh, todo))
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+    return summary
+
+
+def start_background_prewarm() -> Optional[threading.Thread]:
+    """Pre-warm the store in a daemon thread unless KNOWLEDGE_PREWARM=0"""
+    if os.getenv("KNOWLEDGE_PREWARM", "1") == "0":
+        return None
+
+    def run():
+        try:
+            summary = prewarm()
+            if summary["refreshed"] or summary["failed"]:
+                print(f"✓ Knowledge store pre-warmed {len(summary['refreshed'])} conditions "
+                      f"in {summary['seconds']}s ({len(summary['partial'])} partial, "
+                      f"{len(summary['failed'])} failed)")
+        except Exception as e:
+            print(f"⚠️  Knowledge store pre-warm failed: {e}")
+
+    thread = threading.Thread(target=run, name="knowledge-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the local medical knowledge store")
+    parser.add_argument("command", choices=["refresh", "status"])
+    parser.add_argument("--force", action="store_true", help="Refetch conditions that are still fresh")
+    parser.add_argument("--every", type=float, help="Repeat the refresh every N seconds")
+    parser.add_argument("--workers", type=int, help="Conditions fetched concurrently")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        print(json.dumps(knowledge_store.stats(), indent=2))
+        for entry in sorted(knowledge_store.entries(), key=lambda e: e["condition"]):
+            age_hours = (time.time() - entry["refreshed_at"]) / 3600
+            missing = f", missing {', '.join(entry['missing'])}" if entry.get("missing") else ""
+            print(f"  {entry['condition']:20s} refreshed {age_hours:6.1f} h ago{missing}")
+    else:
+        while True:
+            summary = prewarm(max_workers=args.workers, force=args.force)
+            print(f"✓ Refreshed {len(summary['refreshed'])} ({len(summary['partial'])} partial), "
+                  f"skipped {len(summary['skipped'])}, "
+                  f"failed {len(summary['failed'])} in {summary['seconds']}s")
+            if not args.every:
+                break
+            time.sleep(args.every)
@@ -5,18 +5,125 @@ Supports Groq (fast & free), Google Gemini, and OpenAI
 """
 
 import os
+import time
+import hashlib
+import threading
+import queue
 import requests
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Callable, Iterator, List, Dict, Optional
 from datetime import datetime
 from langchain_core.prompts import PromptTemplate
 from langchain_community.tools import DuckDuckGoSearchRun
 from langchain_community.utilities import WikipediaAPIWrapper
+from utils.pubmed_client import get_pubmed_client
+from utils.source_cache import source_cache
+from utils.knowledge_store import knowledge_store, SOURCES
+from utils.analysis_cache import analysis_cache, analysis_key
+from utils.llm_router import API_KEY_ENV, build_router
+from utils.fake_backends import FakeSearchTool, FakeWikipedia, use_fake_backends
 import json
 
-# Note: Users need to set their API keys as environment variables
-# For Groq: GROQ_API_KEY (Recommended - Fast & Free)
-# For Google: GOOGLE_API_KEY
-# For OpenAI: OPENAI_API_KEY
+# Per-source deadlines (seconds) for the concurrent fan-out in get_comprehensive_diagnosis.
+# A source that misses its deadline is left out of the report and marked as timed out.
+SOURCE_DEADLINES = {
+    "ai_analysis": float(os.getenv("LLM_DEADLINE_SECONDS", "30")),
+    "web_search": float(os.getenv("SOURCE_DEADLINE_SECONDS", "10")),
+    "wikipedia": float(os.getenv("SOURCE_DEADLINE_SECONDS", "10")),
+    "pubmed_articles": float(os.getenv("SOURCE_DEADLINE_SECONDS", "10")),
+}
+
+# Timeout of every blocking HTTP call made by a source client, so a source that
+# missed its deadline does not hold a fan-out worker for longer than this
+SOURCE_CLIENT_TIMEOUT = float(os.getenv("SOURCE_CLIENT_TIMEOUT_SECONDS", os.getenv("SOURCE_DEADLINE_SECONDS", "10")))
+
+# Shared by all requests; late lookups that have not started are cancelled, and
+# running ones end within SOURCE_CLIENT_TIMEOUT
+_source_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SOURCE_FANOUT_WORKERS", "16")),
+    thread_name_prefix="diagnosis-source"
+)
+
+# The LLM analysis gets its own workers, so it never waits behind source
+# lookups (or they behind it) and queueing does not eat into either deadline
+_analysis_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("ANALYSIS_FANOUT_WORKERS", "8")),
+    thread_name_prefix="diagnosis-analysis"
+)
+
+
+def _executor_for(name: str) -> ThreadPoolExecutor:
+    """Executor that runs the fan-out task with this source name"""
+    return _analysis_executor if name == "ai_analysis" else _source_executor
+
+
+def fan_out(tasks: Dict[str, tuple], deadlines: Optional[Dict[str, float]] = None) -> tuple:
+    """
+    Run independent lookups concurrently, each with its own deadline
+    
+    Args:
+        tasks: Mapping of source name to (callable, args tuple, value used on timeout or error)
+        deadlines: Seconds allowed per source name (defaults to SOURCE_DEADLINES)
+        
+    Returns:
+        Tuple of (results by source name, status by source name: "ok", "timeout" or "error")
+    """
+    deadlines = deadlines or SOURCE_DEADLINES
+    started = time.monotonic()
+    futures = {name: _executor_for(name).submit(func, *args) for name, (func, args, _) in tasks.items()}
+    
+    results, status = {}, {}
+    # Wait for the tightest deadlines first so each source gets its full allowance
+    for name in sorted(futures, key=lambda n: deadlines.get(n, SOURCE_DEADLINES["web_search"])):
+        remaining = started + deadlines.get(name, SOURCE_DEADLINES["web_search"]) - time.monotonic()
+        try:
+            results[name] = futures[name].result(timeout=max(0.0, remaining))
+            status[name] = "ok"
+        except TimeoutError:
+            print(f"⏱️  {name} missed its {deadlines.get(name)}s deadline")
+            results[name] = tasks[name][2]
+            status[name] = "timeout"
+        except Exception as e:
+            print(f"{name} error: {e}")
+            results[name] = tasks[name][2]
+            status[name] = "error"
+    
+    # Late lookups still waiting for a worker would only delay other requests
+    for name, future in futures.items():
+        if status[name] == "timeout":
+            future.cancel()
+    
+    return results, {name: status[name] for name in tasks}
+
+
+class _TimeoutRequests:
+    """requests stand-in for the wikipedia package, whose API calls have no timeout"""
+    
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+    
+    def get(self, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return requests.get(url, **kwargs)
+    
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+
+def build_source_tools() -> tuple:
+    """
+    Create the web search and Wikipedia tools
+    
+    Returns:
+        Tuple of (search tool, Wikipedia wrapper); local stand-ins with DIAGNOSIS_BACKENDS=fake
+    """
+    if use_fake_backends():
+        return FakeSearchTool(), FakeWikipedia()
+    # The DuckDuckGo client has its own request timeout (5 seconds); Wikipedia gets SOURCE_CLIENT_TIMEOUT
+    import wikipedia.wikipedia as wikipedia_module
+    if not isinstance(wikipedia_module.requests, _TimeoutRequests):
+        wikipedia_module.requests = _TimeoutRequests(SOURCE_CLIENT_TIMEOUT)
+    return DuckDuckGoSearchRun(), WikipediaAPIWrapper()
 
 
 class AdvancedDiagnosisSystem:
@@ -24,58 +131,33 @@ class AdvancedDiagnosisSystem:
     Advanced diagnosis system using LangChain and online medical sources
     """
     
-    def __init__(self, llm_provider="groq"):
+    def __init__(self, llm_provider="groq", search_tool=None, wikipedia=None):
         """
         Initialize the diagnosis system
         
         Args:
             llm_provider: "groq" (fast & free, recommended), "google" (free with Gemini), or "openai" (paid)
+            search_tool: Optional DuckDuckGoSearchRun to share between systems
+            wikipedia: Optional WikipediaAPIWrapper to share between systems
         """
         self.llm_provider = llm_provider
         self.llm = self._initialize_llm()
-        self.search_tool = DuckDuckGoSearchRun()
-        self.wikipedia = WikipediaAPIWrapper()
+        if search_tool is None or wikipedia is None:
+            default_search, default_wikipedia = build_source_tools()
+            search_tool = search_tool or default_search
+            wikipedia = wikipedia or default_wikipedia
+        self.search_tool = search_tool
+        self.wikipedia = wikipedia
+        self.llm_failures = 0
         
     def _initialize_llm(self):
-        """Initialize the Language Model based on provider"""
-        try:
-            if self.llm_provider == "groq":
-                from langchain_groq import ChatGroq
-                api_key = os.getenv("GROQ_API_KEY")
-                if not api_key:
-                    print("⚠️  GROQ_API_KEY not found. Please set it for advanced diagnosis.")
-                    return None
-                return ChatGroq(
-                    model="llama-3.3-70b-versatile",  # Fast and powerful model
-                    groq_api_key=api_key,
-                    temperature=0.3,
-                    max_tokens=2048
-                )
-            elif self.llm_provider == "google":
-                from langchain_google_genai import ChatGoogleGenerativeAI
-                api_key = os.getenv("GOOGLE_API_KEY")
-                if not api_key:
-                    print("⚠️  GOOGLE_API_KEY not found. Please set it for advanced diagnosis.")
-                    return None
-                return ChatGoogleGenerativeAI(
-                    model="gemini-pro",
-                    google_api_key=api_key,
-                    temperature=0.3
-                )
-            elif self.llm_provider == "openai":
-                from langchain_openai import ChatOpenAI
-                api_key = os.getenv("OPENAI_API_KEY")
-                if not api_key:
-                    print("⚠️  OPENAI_API_KEY not found. Please set it for advanced diagnosis.")
-                    return None
-                return ChatOpenAI(
-                    model="gpt-3.5-turbo",
-                    temperature=0.3,
-                    openai_api_key=api_key
-                )
-        except Exception as e:
-            print(f"⚠️  Error initializing LLM: {e}")
-            return None
+        """
+        Initialize the Language Model based on provider
+        
+        The model is a ProviderRouter (utils/llm_router.py) with this provider
+        first and the configured alternates after it for hedged requests.
+        """
+        return build_router(self.llm_provider)
     
     def search_medical_info(self, query: str, num_results: int = 3) -> List[Dict]:
         """
@@ -88,17 +170,17 @@ class AdvancedDiagnosisSystem:
         Returns:
             List of search results
         """
-        try:
-            search_query = f"medical condition {query} symptoms treatment"
-            results = self.search_tool.run(search_query)
-            return [{
-                "source": "DuckDuckGo Medical Search",
-                "content": results[:500],  # Limit content length
-                "timestamp": datetime.now().isoformat()
-            }]
-        except Exception as e:
-            print(f"Search error: {e}")
-            return []
+        return source_cache.get_or_fetch("web_search", query, lambda: self._fetch_medical_info(query))
+    
+    def _fetch_medical_info(self, query: str) -> List[Dict]:
+        """Uncached DuckDuckGo lookup behind search_medical_info; errors propagate to the caller"""
+        search_query = f"medical condition {query} symptoms treatment"
+        results = self.search_tool.run(search_query)
+        return [{
+            "source": "DuckDuckGo Medical Search",
+            "content": results[:500],  # Limit content length
+            "timestamp": datetime.now().isoformat()
+        }]
     
     def get_wikipedia_summary(self, condition: str) -> Optional[Dict]:
         """
@@ -110,16 +192,16 @@ class AdvancedDiagnosisSystem:
         Returns:
             Wikipedia summary
         """
-        try:
-            summary = self.wikipedia.run(f"{condition} medical condition")
-            return {
-                "source": "Wikipedia",
-                "content": summary[:800],  # Limit content length
-                "timestamp": datetime.now().isoformat()
-            }
-        except Exception as e:
-            print(f"Wikipedia error: {e}")
-            return None
+        return source_cache.get_or_fetch("wikipedia", condition, lambda: self._fetch_wikipedia_summary(condition))
+    
+    def _fetch_wikipedia_summary(self, condition: str) -> Optional[Dict]:
+        """Uncached Wikipedia lookup behind get_wikipedia_summary; errors propagate to the caller"""
+        summary = self.wikipedia.run(f"{condition} medical condition")
+        return {
+            "source": "Wikipedia",
+            "content": summary[:800],  # Limit content length
+            "timestamp": datetime.now().isoformat()
+        }
     
     def get_pubmed_articles(self, condition: str, max_results: int = 3) -> List[Dict]:
         """
@@ -132,80 +214,32 @@ class AdvancedDiagnosisSystem:
         Returns:
             List of PubMed articles
         """
-        try:
-            base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
-            
-            # Search for article IDs
-            search_url = f"{base_url}esearch.fcgi"
-            search_params = {
-                "db": "pubmed",
-                "term": f"{condition}[Title/Abstract]",
-                "retmax": max_results,
-                "retmode": "json"
-            }
-            
-            response = requests.get(search_url, params=search_params, timeout=10)
-            search_data = response.json()
-            
-            if "esearchresult" not in search_data or "idlist" not in search_data["esearchresult"]:
-                return []
-            
-            article_ids = search_data["esearchresult"]["idlist"]
-            
-            if not article_ids:
-                return []
-            
-            # Fetch article summaries
-            summary_url = f"{base_url}esummary.fcgi"
-            summary_params = {
-                "db": "pubmed",
-                "id": ",".join(article_ids),
-                "retmode": "json"
-            }
-            
-            response = requests.get(summary_url, params=summary_params, timeout=10)
-            summary_data = response.json()
-            
-            articles = []
-            if "result" in summary_data:
-                for article_id in article_ids:
-                    if article_id in summary_data["result"]:
-                        article = summary_data["result"][article_id]
-                        articles.append({
-                            "source": "PubMed",
-                            "title": article.get("title", ""),
-                            "authors": ", ".join([author.get("name", "") for author in article.get("authors", [])[:3]]),
-                            "journal": article.get("source", ""),
-                            "pub_date": article.get("pubdate", ""),
-                            "pmid": article_id,
-                            "url": f"https://pubmed.ncbi.nlm.nih.gov/{article_id}/"
-                        })
-            
-            return articles
-            
-        except Exception as e:
-            print(f"PubMed error: {e}")
-            return []
+        return source_cache.get_or_fetch(
+            "pubmed_articles", condition,
+            lambda: self._fetch_pubmed_articles(condition, max_results),
+            variant=max_results if max_results != 3 else None
+        )
     
-    def analyze_symptoms(self, symptoms: List[str], patient_data: Dict) -> Dict:
+    def _fetch_pubmed_articles(self, condition: str, max_results: int) -> List[Dict]:
+        """Uncached PubMed lookup behind get_pubmed_articles; errors propagate to the caller"""
+        # Pooled, retrying client that uses NCBI's history server
+        return get_pubmed_client().search_articles(condition, max_results)
+    
+    def build_prompt(self, symptoms: List[str], patient_data: Dict) -> str:
         """
-        Analyze symptoms and provide differential diagnosis using LangChain
+        Format the differential-diagnosis prompt for one patient
         
         Args:
             symptoms: List of symptoms
             patient_data: Patient information (age, gender, vitals)
             
         Returns:
-            Analysis results with differential diagnoses
+            Prompt text
         """
-        if not self.llm:
-            return self._get_fallback_analysis(symptoms, patient_data)
-        
-        try:
-            # Create prompt template for medical diagnosis
-            diagnosis_prompt = PromptTemplate(
-                input_variables=["symptoms", "age", "gender", "bp", "glucose", "heart_rate"],
-                template="""You are an expert medical AI assistant. Based on the following patient information, provide a detailed medical analysis:
+        # Create prompt template for medical diagnosis
+        diagnosis_prompt = PromptTemplate(
+            input_variables=["symptoms", "age", "gender", "bp", "glucose", "heart_rate"],
+            template="""You are an expert medical AI assistant. Based on the following patient information, provide a detailed medical analysis:
 
 Patient Information:
 - Age: {age} years
@@ -226,36 +260,142 @@ Please provide:
 Important: This is for educational purposes only. Always consult a qualified healthcare professional for medical advice.
 
 Analysis:"""
-            )
+        )
+        
+        # Use the new LangChain API (invoke instead of LLMChain)
+        # Format the prompt with parameters
+        return diagnosis_prompt.format(
+            symptoms=", ".join(symptoms),
+            age=patient_data.get("age", "Unknown"),
+            gender=patient_data.get("gender", "Unknown"),
+            bp=patient_data.get("bp", "Unknown"),
+            glucose=patient_data.get("glucose", "Unknown"),
+            heart_rate=patient_data.get("heart_rate", "Unknown")
+        )
+    
+    def analyze_symptoms(self, symptoms: List[str], patient_data: Dict, use_cache: bool = True,
+                         on_token: Optional[Callable[[str], None]] = None) -> Dict:
+        """
+        Analyze symptoms and provide differential diagnosis using LangChain
+        
+        Successful analyses are cached per provider, symptom set and vitals bands
+        (see utils/analysis_cache.py); a cached analysis carries "cached": True.
+        
+        Args:
+            symptoms: List of symptoms
+            patient_data: Patient information (age, gender, vitals)
+            use_cache: False to always ask the LLM (the fresh result is still cached)
+            on_token: Optional callback receiving the analysis text as the provider streams it
             
-            # Use the new LangChain API (invoke instead of LLMChain)
-            # Format the prompt with parameters
-            formatted_prompt = diagnosis_prompt.format(
-                symptoms=", ".join(symptoms),
-                age=patient_data.get("age", "Unknown"),
-                gender=patient_data.get("gender", "Unknown"),
-                bp=patient_data.get("bp", "Unknown"),
-                glucose=patient_data.get("glucose", "Unknown"),
-                heart_rate=patient_data.get("heart_rate", "Unknown")
-            )
+        Returns:
+            Analysis results with differential diagnoses
+        """
+        if not self.llm:
+            return self._get_fallback_analysis(symptoms, patient_data)
+        
+        key = analysis_key(self.llm_provider, symptoms, patient_data)
+        if use_cache:
+            cached = analysis_cache.get(key)
+            if cached is not None:
+                if on_token is not None:
+                    on_token(cached["analysis"])
+                return cached
+        else:
+            analysis_cache.record_bypass()
+        
+        try:
+            started = time.monotonic()
             
-            # Run the analysis using invoke
-            result = self.llm.invoke(formatted_prompt)
+            formatted_prompt = self.build_prompt(symptoms, patient_data)
             
-            # Extract content from the result
-            analysis_text = result.content if hasattr(result, 'content') else str(result)
+            if on_token is None:
+                # Run the analysis, hedged across providers if the first one is slow
+                result, answered_by = self.llm.route(formatted_prompt)
+                
+                # Extract content from the result
+                analysis_text = result.content if hasattr(result, 'content') else str(result)
+            else:
+                # Relay text from the provider's streaming API as it arrives
+                parts = []
+                answered_by, chunks = self.llm.route_stream(formatted_prompt)
+                for chunk in chunks:
+                    text = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                    if text:
+                        parts.append(text)
+                        on_token(text)
+                analysis_text = "".join(parts)
+            self.llm_failures = 0
             
-            return {
+            analysis = {
                 "success": True,
                 "analysis": analysis_text,
                 "timestamp": datetime.now().isoformat(),
-                "provider": self.llm_provider
+                "provider": answered_by
             }
+            analysis_cache.put(key, analysis, time.monotonic() - started)
+            return analysis
             
         except Exception as e:
             print(f"LLM analysis error: {e}")
+            self.llm_failures += 1
             return self._get_fallback_analysis(symptoms, patient_data)
     
+    def analyze_symptoms_batch(self, symptom_lists: List[List[str]], patients: List[Dict],
+                               max_concurrency: int = 4, use_cache: bool = True) -> List[Dict]:
+        """
+        Analyze many patients with one call to the LLM's batch interface
+        
+        Cached analyses are reused, and patients sharing a cache key (same
+        symptoms and vitals bands) share one LLM request.
+        
+        Args:
+            symptom_lists: Symptoms per patient
+            patients: Patient information per patient
+            max_concurrency: LLM requests in flight at once
+            use_cache: False to ask the LLM for every distinct patient
+            
+        Returns:
+            One analysis dict per patient, in input order
+        """
+        if not self.llm:
+            return [self._get_fallback_analysis(s, p) for s, p in zip(symptom_lists, patients)]
+        
+        analyses = [None] * len(patients)
+        to_run = {}
+        for index, (symptoms, patient_data) in enumerate(zip(symptom_lists, patients)):
+            key = analysis_key(self.llm_provider, symptoms, patient_data)
+            cached = analysis_cache.get(key) if use_cache else None
+            if cached is not None:
+                analyses[index] = cached
+            else:
+                to_run.setdefault(key, []).append(index)
+        if not to_run:
+            return analyses
+        
+        prompts = [self.build_prompt(symptom_lists[indexes[0]], patients[indexes[0]]) for indexes in to_run.values()]
+        started = time.monotonic()
+        responses = self.llm.batch(prompts, config={"max_concurrency": max_concurrency}, return_exceptions=True)
+        # Approximate per-request latency for the cache's saved-time counter
+        latency = (time.monotonic() - started) * min(max_concurrency, len(prompts)) / len(prompts)
+        
+        for (key, indexes), response in zip(to_run.items(), responses):
+            if isinstance(response, Exception):
+                print(f"LLM analysis error: {response}")
+                self.llm_failures += 1
+                for index in indexes:
+                    analyses[index] = self._get_fallback_analysis(symptom_lists[index], patients[index])
+                continue
+            analysis = {
+                "success": True,
+                "analysis": response.content if hasattr(response, 'content') else str(response),
+                "timestamp": datetime.now().isoformat(),
+                "provider": self.llm_provider
+            }
+            analysis_cache.put(key, analysis, latency)
+            for index in indexes:
+                analyses[index] = analysis
+        return analyses
+    
     def _get_fallback_analysis(self, symptoms: List[str], patient_data: Dict) -> Dict:
         """Fallback analysis when LLM is not available"""
         return {
@@ -293,36 +433,173 @@ Please configure an API key to get detailed AI-powered diagnosis with differenti
             "provider": "fallback"
         }
     
+    def _get_timeout_analysis(self) -> Dict:
+        """Placeholder analysis when the LLM misses its deadline"""
+        return {
+            "success": False,
+            "timed_out": True,
+            "analysis": "The AI analysis did not finish in time. The medical sources below are still available; please try again for the full analysis.",
+            "timestamp": datetime.now().isoformat(),
+            "provider": self.llm_provider
+        }
+    
     def get_comprehensive_diagnosis(self, symptoms: List[str], patient_data: Dict, 
-                                   ml_prediction: str) -> Dict:
+                                   ml_prediction: str,
+                                   deadlines: Optional[Dict[str, float]] = None,
+                                   use_cache: bool = True) -> Dict:
         """
         Get comprehensive diagnosis combining ML model, LangChain analysis, and online sources
         
+        The LLM analysis and the three source lookups run concurrently, so the
+        latency is that of the slowest source rather than their sum. Sources for
+        a class already in the knowledge store are read locally instead; only the
+        sources its entry is missing are fetched.
+        
         Args:
             symptoms: List of symptoms
             patient_data: Patient information
             ml_prediction: Prediction from the ML model
+            deadlines: Optional per-source deadlines in seconds (see SOURCE_DEADLINES)
+            use_cache: False to bypass the LLM analysis cache
             
         Returns:
-            Comprehensive diagnosis report
+            Comprehensive diagnosis report; "partial" is True if any source timed out
+        """
+        tasks = {"ai_analysis": (self.analyze_symptoms, (symptoms, patient_data, use_cache),
+                                 self._get_timeout_analysis())}
+        stored = knowledge_store.get(ml_prediction)
+        tasks.update(self.source_tasks(ml_prediction, stored))
+        results, status = fan_out(tasks, deadlines)
+        if stored is not None:
+            for source in SOURCES:
+                if source not in tasks:
+                    results[source] = stored[source]
+                    status[source] = "stored"
+            knowledge_store.fill_missing(ml_prediction, results, status)
+        return self.build_report(symptoms, patient_data, ml_prediction, results, status)
+    
+    def stream_comprehensive_diagnosis(self, symptoms: List[str], patient_data: Dict,
+                                       ml_prediction: str,
+                                       deadlines: Optional[Dict[str, float]] = None,
+                                       use_cache: bool = True) -> Iterator[tuple]:
+        """
+        Produce the comprehensive diagnosis piece by piece as each part resolves
+        
+        Yields (event, payload) tuples:
+            ("source", {"name", "status", "data"})   once per medical source
+            ("token", text)                           LLM analysis text as it streams
+            ("analysis", analysis dict)               the finished (or placeholder) analysis
+            ("report", comprehensive report)          last, same shape as get_comprehensive_diagnosis
+        
+        Args:
+            symptoms: List of symptoms
+            patient_data: Patient information
+            ml_prediction: Prediction from the ML model
+            deadlines: Optional per-source deadlines in seconds (see SOURCE_DEADLINES)
+            use_cache: False to bypass the LLM analysis cache
+        """
+        deadlines = deadlines or SOURCE_DEADLINES
+        started = time.monotonic()
+        events = queue.Queue()
+        results, status = {}, {}
+        
+        stored = knowledge_store.get(ml_prediction)
+        tasks = self.source_tasks(ml_prediction, stored)
+        if stored is not None:
+            for source in SOURCES:
+                if source not in tasks:
+                    results[source], status[source] = stored[source], "stored"
+                    yield "source", {"name": source, "status": "stored", "data": stored[source]}
+        tasks["ai_analysis"] = (self.analyze_symptoms,
+                                (symptoms, patient_data, use_cache, lambda text: events.put(("token", text))),
+                                self._get_timeout_analysis())
+        
+        futures = {}
+        for name, (func, args, _) in tasks.items():
+            futures[name] = _executor_for(name).submit(func, *args)
+            futures[name].add_done_callback(lambda f, name=name: events.put(("done", (name, f))))
+        
+        pending = set(tasks)
+        while pending:
+            next_deadline = min(started + deadlines.get(name, SOURCE_DEADLINES["web_search"]) for name in pending)
+            try:
+                kind, payload = events.get(timeout=max(0.0, next_deadline - time.monotonic()))
+            except queue.Empty:
+                now = time.monotonic()
+                expired = [name for name in pending
+                           if started + deadlines.get(name, SOURCE_DEADLINES["web_search"]) <= now]
+                for name in expired:
+                    print(f"⏱️  {name} missed its {deadlines.get(name)}s deadline")
+                    futures[name].cancel()
+                    pending.discard(name)
+                    results[name], status[name] = tasks[name][2], "timeout"
+                    yield self._stream_event(name, results[name], "timeout")
+                continue
+            
+            if kind == "token":
+                if "ai_analysis" in pending:
+                    yield "token", payload
+                continue
+            
+            name, future = payload
+            if name not in pending:
+                continue
+            pending.discard(name)
+            try:
+                results[name], status[name] = future.result(), "ok"
+            except Exception as e:
+                print(f"{name} error: {e}")
+                results[name], status[name] = tasks[name][2], "error"
+            yield self._stream_event(name, results[name], status[name])
+        
+        if stored is not None:
+            knowledge_store.fill_missing(ml_prediction, results, status)
+        yield "report", self.build_report(symptoms, patient_data, ml_prediction, results, status)
+    
+    def source_tasks(self, condition: str, stored: Optional[Dict] = None) -> Dict[str, tuple]:
         """
-        # Get AI analysis
-        ai_analysis = self.analyze_symptoms(symptoms, patient_data)
+        fan_out tasks for the medical sources that have to be fetched online
         
-        # Get medical information from online sources
-        medical_info = self.search_medical_info(ml_prediction)
-        wiki_info = self.get_wikipedia_summary(ml_prediction)
-        pubmed_articles = self.get_pubmed_articles(ml_prediction)
+        Args:
+            condition: Condition to look up
+            stored: The condition's knowledge store entry, if any
+            
+        Returns:
+            Tasks for every source, or only for those the stored entry is missing
+        """
+        tasks = {
+            "web_search": (self.search_medical_info, (condition,), []),
+            "wikipedia": (self.get_wikipedia_summary, (condition,), None),
+            "pubmed_articles": (self.get_pubmed_articles, (condition,), [])
+        }
+        if stored is None:
+            return tasks
+        return {name: task for name, task in tasks.items() if name in stored.get("missing", [])}
+    
+    @staticmethod
+    def _stream_event(name: str, value, state: str) -> tuple:
+        if name == "ai_analysis":
+            return "analysis", value
+        return "source", {"name": name, "status": state, "data": value}
+    
+    def build_report(self, symptoms: List[str], patient_data: Dict, ml_prediction: str,
+                      results: Dict, status: Dict) -> Dict:
+        """Combine the ML prediction, the analysis and the sources into the report"""
+        status = {name: status[name] for name in ("ai_analysis",) + SOURCES}
+        timed_out = [name for name, state in status.items() if state == "timeout"]
         
         # Combine all information
         comprehensive_report = {
             "ml_prediction": ml_prediction,
-            "ai_analysis": ai_analysis,
+            "ai_analysis": results["ai_analysis"],
             "medical_sources": {
-                "web_search": medical_info,
-                "wikipedia": wiki_info,
-                "pubmed_articles": pubmed_articles
+                "web_search": results["web_search"],
+                "wikipedia": results["wikipedia"],
+                "pubmed_articles": results["pubmed_articles"]
             },
+            "source_status": status,
+            "partial": bool(timed_out),
+            "timed_out_sources": timed_out,
             "patient_summary": {
                 "age": patient_data.get("age"),
                 "gender": patient_data.get("gender"),
@@ -340,10 +617,109 @@ Please configure an API key to get detailed AI-powered diagnosis with differenti
         return comprehensive_report
 
 
+def _api_key_fingerprint(llm_provider: str) -> Optional[str]:
+    """Short hash of the provider's current API key, so key rotation is noticed without storing the key"""
+    api_key = os.getenv(API_KEY_ENV.get(llm_provider, ""), "")
+    return hashlib.sha256(api_key.encode()).hexdigest()[:12] if api_key else None
+
+
+class DiagnosisSystemRegistry:
+    """
+    Thread-safe registry of long-lived AdvancedDiagnosisSystem instances, one per LLM provider
+    
+    Systems are created lazily on first use and share one DuckDuckGo search tool
+    and one Wikipedia wrapper, so warm requests reuse the same LLM client and
+    HTTP connections. A system is rebuilt when its provider's API key changes or
+    when a health check finds it unusable (no LLM although a key is set, or
+    repeated LLM failures).
+    """
+    
+    def __init__(self, health_check_interval: Optional[float] = None, max_llm_failures: int = 3):
+        if health_check_interval is None:
+            health_check_interval = float(os.getenv("DIAGNOSIS_HEALTH_CHECK_SECONDS", "60"))
+        self.health_check_interval = health_check_interval
+        self.max_llm_failures = max_llm_failures
+        self.created = 0
+        self.recreated = 0
+        self._systems = {}
+        self._shared_tools = None
+        self._lock = threading.Lock()
+    
+    def get(self, llm_provider: str = "groq") -> AdvancedDiagnosisSystem:
+        """
+        Get the system for a provider, creating or rebuilding it if needed
+        
+        Args:
+            llm_provider: "groq", "google" or "openai"
+            
+        Returns:
+            Shared AdvancedDiagnosisSystem
+        """
+        fingerprint = _api_key_fingerprint(llm_provider)
+        entry = self._systems.get(llm_provider)
+        if entry is not None and entry["fingerprint"] == fingerprint and not self._health_check_due(entry):
+            return entry["system"]
+        
+        with self._lock:
+            entry = self._systems.get(llm_provider)
+            if entry is not None and entry["fingerprint"] == fingerprint:
+                if not self._health_check_due(entry):
+                    return entry["system"]
+                if self._is_healthy(entry["system"], fingerprint):
+                    entry["checked_at"] = time.monotonic()
+                    return entry["system"]
+            
+            if entry is not None:
+                print(f"♻️  Rebuilding {llm_provider} diagnosis system")
+                self.recreated += 1
+            search_tool, wikipedia = self._get_shared_tools()
+            system = AdvancedDiagnosisSystem(llm_provider, search_tool=search_tool, wikipedia=wikipedia)
+            self.created += 1
+            self._systems[llm_provider] = {
+                "system": system,
+                "fingerprint": fingerprint,
+                "checked_at": time.monotonic()
+            }
+            return system
+    
+    def invalidate(self, llm_provider: Optional[str] = None):
+        """Drop one provider's system (or all of them) so the next request rebuilds it"""
+        with self._lock:
+            if llm_provider is None:
+                self._systems.clear()
+            else:
+                self._systems.pop(llm_provider, None)
+    
+    def stats(self) -> Dict:
+        """Which providers are warm and how often systems were built"""
+        return {
+            "providers": sorted(self._systems),
+            "created": self.created,
+            "recreated": self.recreated
+        }
+    
+    def _health_check_due(self, entry: Dict) -> bool:
+        return time.monotonic() - entry["checked_at"] >= self.health_check_interval
+    
+    def _is_healthy(self, system: AdvancedDiagnosisSystem, fingerprint: Optional[str]) -> bool:
+        if fingerprint is not None and system.llm is None:
+            return False
+        return system.llm_failures < self.max_llm_failures
+    
+    def _get_shared_tools(self):
+        if self._shared_tools is None:
+            self._shared_tools = build_source_tools()
+        return self._shared_tools
+
+
+diagnosis_systems = DiagnosisSystemRegistry()
+
+
 # Utility functions for easy integration
 
 def get_advanced_diagnosis(symptoms: List[str], patient_data: Dict, 
-                          ml_prediction: str, llm_provider: str = "google") -> Dict:
+                          ml_prediction: str, llm_provider: str = "google",
+                          use_cache: bool = True) -> Dict:
     """
     Main function to get advanced diagnosis
     
@@ -352,30 +728,58 @@ def get_advanced_diagnosis(symptoms: List[str], patient_data: Dict,
         patient_data: Dictionary with age, gender, bp, glucose, heart_rate
         ml_prediction: Prediction from the ML model
         llm_provider: "google" or "openai"
+        use_cache: False to bypass the LLM analysis cache
         
     Returns:
         Comprehensive diagnosis report
     """
-    system = AdvancedDiagnosisSystem(llm_provider=llm_provider)
-    return system.get_comprehensive_diagnosis(symptoms, patient_data, ml_prediction)
+    system = diagnosis_systems.get(llm_provider)
+    return system.get_comprehensive_diagnosis(symptoms, patient_data, ml_prediction, use_cache=use_cache)
 
 
-def search_medical_condition(condition: str) -> Dict:
+def search_medical_condition(condition: str, use_store: bool = True) -> Dict:
     """
     Search for information about a medical condition
     
     Args:
         condition: Medical condition name
+        use_store: Answer from the local knowledge store when it has the condition
         
     Returns:
         Medical information from various sources
     """
-    system = AdvancedDiagnosisSystem()
+    stored = knowledge_store.get(condition) if use_store else None
+    if stored is not None and not stored.get("missing"):
+        return {
+            "condition": condition,
+            "web_search": stored["web_search"],
+            "wikipedia": stored["wikipedia"],
+            "pubmed_articles": stored["pubmed_articles"],
+            "source_status": {source: "stored" for source in SOURCES},
+            "partial": False,
+            "timed_out_sources": [],
+            "timestamp": datetime.fromtimestamp(stored["refreshed_at"]).isoformat()
+        }
+    
+    system = diagnosis_systems.get("groq")
+    
+    # Only the sources a stored entry is missing are fetched
+    results, status = fan_out(system.source_tasks(condition, stored))
+    if stored is not None:
+        for source in SOURCES:
+            if source not in status:
+                results[source], status[source] = stored[source], "stored"
+        knowledge_store.fill_missing(condition, results, status)
+        status = {source: status[source] for source in SOURCES}
+    timed_out = [name for name, state in status.items() if state == "timeout"]
     
     return {
         "condition": condition,
-        "web_search": system.search_medical_info(condition),
-        "wikipedia": system.get_wikipedia_summary(condition),
-        "pubmed_articles": system.get_pubmed_articles(condition),
+        "web_search": results["web_search"],
+        "wikipedia": results["wikipedia"],
+        "pubmed_articles": results["pubmed_articles"],
+        "source_status": status,
+        "partial": bool(timed_out),
+        "timed_out_sources": timed_out,
         "timestamp": datetime.now().isoformat()
     }
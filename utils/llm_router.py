@@ -0,0 +1,547 @@
+"""
+LLM Provider Router
+Sends the diagnosis prompt to the preferred LLM provider and, when it has
+not answered within a latency threshold, sends a hedged second request to
+an alternate configured provider; whichever answers first is used.
+
+Every provider has a latency history (p50/p95/p99) and a circuit breaker:
+after repeated failures or timeouts the provider is skipped until a cool-down
+has passed, then a single trial call decides whether it is used again.
+Breakers and latency histories are shared by all routers in the process.
+
+Try it offline against fake providers:
+    python -m utils.llm_router
+
+Configuration (environment):
+    LLM_HEDGE_PROVIDERS        comma-separated alternates (default: every other provider with an API key)
+    LLM_HEDGE_AFTER_SECONDS    latency before the hedged request is sent, default 5
+    LLM_DEADLINE_SECONDS       overall deadline of one routed call, default 30
+    LLM_BREAKER_FAILURES       consecutive failures that open a breaker, default 3
+    LLM_BREAKER_RESET_SECONDS  seconds a breaker stays open, default 30
+    LLM_RATE_LIMITS            requests per second per provider, e.g. "groq=0.5,google=1" (default unlimited)
+"""
+
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional
+
+# Note: Users need to set their API keys as environment variables
+# For Groq: GROQ_API_KEY (Recommended - Fast & Free)
+# For Google: GOOGLE_API_KEY
+# For OpenAI: OPENAI_API_KEY
+API_KEY_ENV = {
+    "groq": "GROQ_API_KEY",
+    "google": "GOOGLE_API_KEY",
+    "openai": "OPENAI_API_KEY",
+}
+
+# Threads left behind by the slower of two hedged calls finish in the background
+_router_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-router")
+
+
+class ProviderUnavailableError(Exception):
+    """Raised when no provider could answer (none configured, breakers open, or all failed)"""
+
+
+class RateLimitedError(Exception):
+    """A call gave up while waiting for the local rate limiter; not a provider failure"""
+
+
+def build_llm(llm_provider: str):
+    """
+    Create the chat model for a provider
+
+    Args:
+        llm_provider: "groq", "google", "openai" or "fake" (see utils/fake_backends.py);
+            with DIAGNOSIS_BACKENDS=fake every provider is answered by the fake model
+
+    Returns:
+        LangChain chat model, or None if the provider is not configured
+    """
+    try:
+        from utils.fake_backends import FakeLLM, use_fake_backends
+        if llm_provider == "fake" or use_fake_backends():
+            return FakeLLM(name=llm_provider)
+        if llm_provider == "groq":
+            from langchain_groq import ChatGroq
+            api_key = os.getenv("GROQ_API_KEY")
+            if not api_key:
+                print("⚠️  GROQ_API_KEY not found. Please set it for advanced diagnosis.")
+                return None
+            return ChatGroq(
+                model="llama-3.3-70b-versatile",  # Fast and powerful model
+                groq_api_key=api_key,
+                temperature=0.3,
+                max_tokens=2048
+            )
+        elif llm_provider == "google":
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            api_key = os.getenv("GOOGLE_API_KEY")
+            if not api_key:
+                print("⚠️  GOOGLE_API_KEY not found. Please set it for advanced diagnosis.")
+                return None
+            return ChatGoogleGenerativeAI(
+                model="gemini-pro",
+                google_api_key=api_key,
+                temperature=0.3
+            )
+        elif llm_provider == "openai":
+            from langchain_openai import ChatOpenAI
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                print("⚠️  OPENAI_API_KEY not found. Please set it for advanced diagnosis.")
+                return None
+            return ChatOpenAI(
+                model="gpt-3.5-turbo",
+                temperature=0.3,
+                openai_api_key=api_key
+            )
+    except Exception as e:
+        print(f"⚠️  Error initializing LLM: {e}")
+        return None
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` calls per second with bursts of up to `burst` calls"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.waited_seconds = 0.0
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a call may be made"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+                self.waited_seconds += delay
+            time.sleep(delay)
+
+
+def _configured_rate_limits() -> Dict[str, float]:
+    limits = {}
+    for item in os.getenv("LLM_RATE_LIMITS", "").split(","):
+        name, _, rate = item.partition("=")
+        if name.strip() and rate.strip():
+            limits[name.strip()] = float(rate)
+    return limits
+
+
+_rate_limiters = {name: RateLimiter(rate) for name, rate in _configured_rate_limits().items()}
+
+
+def acquire_rate_limit(llm_provider: str):
+    """Wait for the provider's rate limiter (if LLM_RATE_LIMITS sets one)"""
+    limiter = _rate_limiters.get(llm_provider)
+    if limiter is not None:
+        limiter.acquire()
+
+
+class ProviderHealth:
+    """Latency history and circuit breaker of one provider"""
+
+    def __init__(self, failure_threshold: Optional[int] = None, reset_timeout: Optional[float] = None,
+                 window: int = 200, trial_timeout: Optional[float] = None):
+        if failure_threshold is None:
+            failure_threshold = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+        if reset_timeout is None:
+            reset_timeout = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+        if trial_timeout is None:
+            # A trial call cannot legitimately outlive the router deadline
+            trial_timeout = float(os.getenv("LLM_DEADLINE_SECONDS", "30"))
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.trial_timeout = trial_timeout
+        self.latencies = deque(maxlen=window)
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._trial_running = False
+        self._trial_started = 0.0
+        self._trial_id = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def _trial_busy(self) -> bool:
+        # A trial whose caller never reported back expires after trial_timeout
+        return self._trial_running and time.monotonic() - self._trial_started < self.trial_timeout
+
+    def available(self) -> bool:
+        """True if a call could be sent now (does not reserve the half-open trial)"""
+        with self._lock:
+            state = self.state
+            return state == "closed" or (state == "half_open" and not self._trial_busy())
+
+    def allow(self) -> Optional[int]:
+        """
+        Reserve a call; in half-open state only one trial call at a time
+
+        Returns:
+            None if the call may not be sent, else a ticket for release():
+            0 for a normal call, the trial number for the half-open trial
+        """
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return 0
+            if state == "half_open" and not self._trial_busy():
+                self._trial_id += 1
+                self._trial_running = True
+                self._trial_started = time.monotonic()
+                return self._trial_id
+            return None
+
+    def release(self, ticket: Optional[int]):
+        """Free the trial slot of a call that ended without recording an outcome"""
+        if not ticket:
+            return
+        with self._lock:
+            if self._trial_running and self._trial_id == ticket:
+                self._trial_running = False
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self.latencies.append(latency)
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self, latency: Optional[float] = None):
+        with self._lock:
+            if latency is not None:
+                self.latencies.append(latency)
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self._trial_running or self.consecutive_failures >= self.failure_threshold:
+                if self.opened_at is None or self._trial_running:
+                    self.times_opened += 1
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+    def percentiles(self) -> Dict:
+        """p50/p95/p99 of the recent latencies in seconds"""
+        samples = sorted(self.latencies)
+        if not samples:
+            return {"p50": None, "p95": None, "p99": None}
+
+        def pick(fraction):
+            return round(samples[min(len(samples) - 1, int(len(samples) * fraction))], 3)
+
+        return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+    def stats(self) -> Dict:
+        return dict(self.percentiles(), state=self.state, successes=self.successes,
+                    failures=self.failures, times_opened=self.times_opened)
+
+
+_provider_health = {}
+_provider_health_lock = threading.Lock()
+
+
+def get_provider_health(llm_provider: str) -> ProviderHealth:
+    """The process-wide health record of a provider"""
+    health = _provider_health.get(llm_provider)
+    if health is None:
+        with _provider_health_lock:
+            health = _provider_health.setdefault(llm_provider, ProviderHealth())
+    return health
+
+
+def hedge_providers(llm_provider: str) -> List[str]:
+    """Alternates for a provider: LLM_HEDGE_PROVIDERS, or every other provider with an API key"""
+    configured = os.getenv("LLM_HEDGE_PROVIDERS")
+    if configured is not None:
+        names = [name.strip() for name in configured.split(",") if name.strip()]
+    else:
+        names = [name for name, env in API_KEY_ENV.items() if os.getenv(env)]
+    return [name for name in names if name != llm_provider]
+
+
+class ProviderRouter:
+    """
+    Chat-model front end that routes each call across providers
+
+    Providers are tried in order: the first one allowed by its breaker gets
+    the request, and if it has not answered after hedge_after seconds the
+    next allowed one gets the same request. A call slower than the deadline
+    counts as a failure even if it answers eventually.
+    """
+
+    def __init__(self, providers: List[str], llms: Optional[Dict] = None,
+                 hedge_after: Optional[float] = None, timeout: Optional[float] = None):
+        """
+        Args:
+            providers: Provider names in order of preference
+            llms: Optional ready-made chat models by name (default: build_llm for each)
+            hedge_after: Seconds before the hedged request is sent
+            timeout: Overall deadline in seconds
+        """
+        if hedge_after is None:
+            hedge_after = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "5"))
+        if timeout is None:
+            timeout = float(os.getenv("LLM_DEADLINE_SECONDS", "30"))
+        if llms is None:
+            llms = {name: build_llm(name) for name in providers}
+        self.providers = [name for name in providers if llms.get(name) is not None]
+        self.llms = llms
+        self.hedge_after = hedge_after
+        self.timeout = timeout
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def route(self, prompt) -> tuple:
+        """
+        Send a prompt, hedging to an alternate provider if the first one is slow
+
+        Returns:
+            Tuple of (chat model response, name of the provider that answered)
+        """
+        candidates = self._candidates()
+        started = deadline = None
+        futures = {}
+        sent = []
+        primary = candidates[0] if candidates else None
+        last_error = None
+
+        def launch() -> bool:
+            # The breaker slot is reserved only for the provider actually called
+            while candidates:
+                name = candidates.pop(0)
+                ticket = get_provider_health(name).allow()
+                if ticket is None:
+                    continue
+                begun = threading.Event()
+                if not sent:
+                    # Waiting for the local rate limiter is not part of the deadline
+                    try:
+                        acquire_rate_limit(name)
+                    except BaseException:
+                        get_provider_health(name).release(ticket)
+                        raise
+                    begun.set()
+                sent.append(name)
+                abandoned = threading.Event()
+                futures[_router_executor.submit(self._call, name, prompt, abandoned, ticket, begun)] = (
+                    name, abandoned, begun)
+                return True
+            return False
+
+        if not launch():
+            raise ProviderUnavailableError("No LLM provider is available (not configured or circuit open)")
+        started = time.monotonic()
+        deadline = started + self.timeout
+        while futures:
+            now = time.monotonic()
+            wait_for = deadline - now
+            if candidates:
+                # The n-th alternate is sent n * hedge_after seconds after the first request
+                wait_for = min(wait_for, started + self.hedge_after * len(sent) - now)
+            done, _ = wait(futures, timeout=max(0.0, wait_for), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                name, _, _ = futures.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                if name != primary:
+                    self.hedge_wins += 1
+                return response, name
+
+            if time.monotonic() >= deadline:
+                break
+            if candidates and (not done or not futures):
+                if done:
+                    print(f"⚠️  LLM provider failed, trying {candidates[0]}: {last_error}")
+                else:
+                    # The providers asked so far are slow: hedge with the next one
+                    self.hedged += 1
+                launch()
+
+        for name, abandoned, begun in futures.values():
+            abandoned.set()
+            if not begun.is_set():
+                # Still waiting for a rate-limit token; the provider was never asked
+                continue
+            get_provider_health(name).record_failure(self.timeout)
+            print(f"⏱️  LLM provider {name} missed the {self.timeout}s deadline")
+        raise ProviderUnavailableError(f"No LLM provider answered: {last_error or 'deadline exceeded'}")
+
+    def invoke(self, prompt, config: Optional[Dict] = None):
+        """Chat-model compatible invoke"""
+        return self.route(prompt)[0]
+
+    def route_stream(self, prompt) -> tuple:
+        """
+        Stream a prompt from the first provider that starts answering
+
+        Providers are tried one after another until one yields its first
+        chunk; hedging does not apply once text has been relayed.
+
+        Returns:
+            Tuple of (name of the provider, iterator of response chunks)
+        """
+        last_error = None
+        for name in self._candidates():
+            health = get_provider_health(name)
+            ticket = health.allow()
+            if ticket is None:
+                continue
+            try:
+                acquire_rate_limit(name)
+                started = time.monotonic()
+                try:
+                    chunks = iter(self.llms[name].stream(prompt))
+                    first = next(chunks, None)
+                except Exception as e:
+                    health.record_failure(time.monotonic() - started)
+                    print(f"⚠️  LLM provider {name} failed to stream: {e}")
+                    last_error = e
+                    continue
+                health.record_success(time.monotonic() - started)
+                return name, itertools.chain([first] if first is not None else [], chunks)
+            finally:
+                health.release(ticket)
+        raise ProviderUnavailableError(f"No LLM provider could stream: {last_error or 'none available'}")
+
+    def stream(self, prompt, config: Optional[Dict] = None) -> Iterator:
+        """Chat-model compatible stream"""
+        yield from self.route_stream(prompt)[1]
+
+    def batch(self, prompts: List, config: Optional[Dict] = None, return_exceptions: bool = False) -> List:
+        """
+        Chat-model compatible batch: route every prompt, at most max_concurrency at a time
+
+        Args:
+            prompts: Prompts to send
+            config: Optional {"max_concurrency": n}
+            return_exceptions: Put errors in the result list instead of raising
+
+        Returns:
+            Responses (or exceptions) in prompt order
+        """
+        max_concurrency = (config or {}).get("max_concurrency") or 4
+
+        def run(prompt):
+            try:
+                return self.invoke(prompt)
+            except Exception as e:
+                if return_exceptions:
+                    return e
+                raise
+
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="llm-batch") as executor:
+            return list(executor.map(run, prompts))
+
+    def stats(self) -> Dict:
+        """Hedging counters and per-provider health"""
+        return {
+            "providers": self.providers,
+            "hedge_after_seconds": self.hedge_after,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "health": {name: get_provider_health(name).stats() for name in self.providers}
+        }
+
+    def _candidates(self) -> List[str]:
+        """Providers whose breaker would let a call through (nothing is reserved yet)"""
+        return [name for name in self.providers if get_provider_health(name).available()]
+
+    def _call(self, name: str, prompt, abandoned: threading.Event, ticket: Optional[int] = 0,
+              begun: Optional[threading.Event] = None):
+        health = get_provider_health(name)
+        try:
+            if begun is None or not begun.is_set():
+                acquire_rate_limit(name)
+                if abandoned.is_set():
+                    raise RateLimitedError(f"{name} was rate limited until the deadline passed")
+                if begun is not None:
+                    begun.set()
+            started = time.monotonic()
+            try:
+                response = self.llms[name].invoke(prompt)
+            except Exception:
+                if not abandoned.is_set():
+                    health.record_failure(time.monotonic() - started)
+                raise
+            latency = time.monotonic() - started
+            if abandoned.is_set():
+                # Already counted as a timeout when the deadline passed
+                pass
+            elif latency > self.timeout:
+                health.record_failure(latency)
+            else:
+                health.record_success(latency)
+            return response
+        finally:
+            health.release(ticket)
+
+
+def build_router(llm_provider: str) -> Optional[ProviderRouter]:
+    """
+    Router with the provider first and its configured alternates after it
+
+    Returns:
+        ProviderRouter, or None if neither the provider nor any alternate is available
+    """
+    router = ProviderRouter([llm_provider] + hedge_providers(llm_provider))
+    return router if router.providers else None
+
+
+def provider_stats() -> Dict:
+    """Health of every provider used in this process"""
+    stats = {name: health.stats() for name, health in sorted(_provider_health.items())}
+    for name, limiter in _rate_limiters.items():
+        stats.setdefault(name, {})["rate_limit_waited_seconds"] = round(limiter.waited_seconds, 2)
+    return stats
+
+
+def run_self_check():
+    """Show hedging and circuit breaking against fake providers"""
+    from utils.fake_backends import FakeLLM
+
+    slow, fast = FakeLLM(latency=2.0, name="slow"), FakeLLM(latency=0.1, name="fast")
+    router = ProviderRouter(["slow", "fast"], llms={"slow": slow, "fast": fast}, hedge_after=0.3, timeout=1.0)
+
+    def timed_call():
+        started = time.perf_counter()
+        _, name = router.route("Symptoms: cough")
+        print(f"✓ Answered by {name} in {(time.perf_counter() - started) * 1000:.0f} ms "
+              f"(slow provider circuit {get_provider_health('slow').state})")
+
+    for _ in range(3):
+        timed_call()
+    # Let the abandoned slow calls finish; each one counts as a timeout
+    time.sleep(2.0)
+    for _ in range(2):
+        timed_call()
+    print(f"  Hedged {router.hedged} calls, {router.hedge_wins} won by the alternate")
+    print(f"  Provider health: {provider_stats()}")
+
+
+if __name__ == "__main__":
+    run_self_check()
@@ -0,0 +1,178 @@
+"""
+Micro-batching Scheduler
+Coalesces single-row predictions from concurrent request threads into one
+vectorized model call per time window.
+
+Configuration (environment):
+    PREDICT_BATCH_WINDOW_MS   batching window, default 2
+    PREDICT_BATCH_MAX_ROWS    rows per batch, default 64
+    PREDICT_BATCH_TIMEOUT     seconds a caller waits for its batch, default 1.0
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+# Queued by stop() to wake the worker thread
+_STOP = object()
+
+
+class BatcherStoppedError(RuntimeError):
+    """Raised when a row is submitted to a stopped batcher"""
+
+
+class MicroBatcher:
+    """
+    Groups rows submitted by many threads into batches.
+
+    A background thread takes the first waiting row, keeps collecting rows
+    until window_ms has elapsed or max_rows are queued, then calls
+    predict_fn once for the whole batch and hands every caller its own
+    result through a Future. Callers that give up on their row cancel it,
+    and stop() ends the thread once the rows queued before it are answered.
+    """
+
+    def __init__(self, predict_fn, window_ms=None, max_rows=None, timeout=None):
+        """
+        Args:
+            predict_fn: Callable taking a list of feature rows and returning
+                        (sequence of predictions, model version)
+            window_ms (float): How long to wait for more rows after the first one
+            max_rows (int): Largest batch handed to predict_fn
+            timeout (float): Default seconds predict() waits for a result
+        """
+        if window_ms is None:
+            window_ms = float(os.getenv('PREDICT_BATCH_WINDOW_MS', '2'))
+        if max_rows is None:
+            max_rows = int(os.getenv('PREDICT_BATCH_MAX_ROWS', '64'))
+        if timeout is None:
+            timeout = float(os.getenv('PREDICT_BATCH_TIMEOUT', '1.0'))
+        self.predict_fn = predict_fn
+        self.window = window_ms / 1000.0
+        self.max_rows = max_rows
+        self.timeout = timeout
+        self.timeouts = 0
+        self.batches = 0
+        self.rows = 0
+        self.largest_batch = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stopped = False
+        self._start_lock = threading.Lock()
+
+    def submit(self, features):
+        """
+        Queue one feature row for the next batch.
+
+        Args:
+            features (tuple): Encoded feature row
+
+        Returns:
+            Future: Resolves to (prediction, model version)
+
+        Raises:
+            BatcherStoppedError: If the batcher has been stopped
+        """
+        if self._stopped:
+            raise BatcherStoppedError('Micro-batcher has been stopped')
+        self._ensure_started()
+        future = Future()
+        self._queue.put((features, future))
+        return future
+
+    def predict(self, features, timeout=None):
+        """
+        Predict one row through the batcher and wait for its result.
+
+        Args:
+            features (tuple): Encoded feature row
+            timeout (float): Seconds to wait before giving up (default self.timeout)
+
+        Returns:
+            tuple: (prediction, model version)
+
+        Raises:
+            TimeoutError: If the batch did not answer in time; the row is withdrawn if it
+                          has not been picked up yet
+        """
+        future = self.submit(features)
+        try:
+            return future.result(timeout=self.timeout if timeout is None else timeout)
+        except TimeoutError:
+            self.timeouts += 1
+            future.cancel()
+            raise
+
+    def stop(self, timeout=5.0):
+        """Answer the rows already queued, then end the worker thread"""
+        with self._start_lock:
+            self._stopped = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put((_STOP, None))
+            thread.join(timeout)
+
+    def stats(self):
+        """Batching counters"""
+        return {
+            'window_ms': self.window * 1000.0,
+            'max_rows': self.max_rows,
+            'batches': self.batches,
+            'rows': self.rows,
+            'average_batch_size': round(self.rows / self.batches, 2) if self.batches else None,
+            'largest_batch': self.largest_batch,
+            'timeouts': self.timeouts,
+            'queued': self._queue.qsize()
+        }
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        """Next batch, and whether stop() was reached"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_rows and batch[-1][0] is not _STOP:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        stopping = batch[-1][0] is _STOP
+        if stopping:
+            batch.pop()
+        # Rows whose caller already gave up are dropped
+        return [(features, future) for features, future in batch if future.set_running_or_notify_cancel()], stopping
+
+    def _run(self):
+        while True:
+            batch, stopping = self._collect()
+            if not batch:
+                if stopping:
+                    return
+                continue
+            try:
+                predictions, version = self.predict_fn([features for features, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                if stopping:
+                    return
+                continue
+
+            self.batches += 1
+            self.rows += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            for (_, future), prediction in zip(batch, predictions):
+                future.set_result((prediction, version))
+            if stopping:
+                return
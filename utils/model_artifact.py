@@ -0,0 +1,242 @@
+"""
+Compact Model Artifact
+Stores the compiled forest (utils/tree_engine.py) as one binary file of
+aligned arrays plus a small JSON header, so workers can memory-map it
+instead of unpickling the scikit-learn model. Pages of the mapped file are
+shared between all processes that load it.
+
+Each export writes its binary under a new name (the checksum is part of
+it) and then atomically replaces the header, so a reader sees either the
+old header and binary or the new ones, never a mix. Loading verifies the
+binary against the checksum in the header.
+
+Export from the current pickle and compare start-up times:
+
+    python -m utils.model_artifact
+"""
+
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+from utils.tree_engine import CompiledForest
+
+ARTIFACT_FORMAT = 'diagnostic-forest'
+ARTIFACT_FORMAT_VERSION = 1
+DEFAULT_ARTIFACT_PATH = os.path.join('model', 'diagnostic_model.json')
+
+# Arrays written to the binary file, with the dtype they are stored as
+_ARRAYS = [
+    ('feature', '<i4'),
+    ('threshold', '<f8'),
+    ('children', '<i4'),
+    ('leaf_proba', '<f8'),
+    ('roots', '<i4'),
+]
+_ALIGNMENT = 64
+
+
+def binary_path_for(header_path, digest):
+    """Path of the binary array file with this SHA-256 digest, next to a JSON header"""
+    return f"{os.path.splitext(header_path)[0]}.{digest[:16]}.bin"
+
+
+def export_artifact(forest, source_version, header_path=None):
+    """
+    Write a compiled forest as a versioned, memory-mappable artifact.
+
+    Args:
+        forest (CompiledForest): Forest to export
+        source_version (str): Version of the pickle the forest was compiled from
+        header_path (str): Where to write the JSON header (the .bin goes next to it)
+
+    Returns:
+        str: Path of the JSON header
+    """
+    header_path = header_path or DEFAULT_ARTIFACT_PATH
+
+    arrays = {}
+    offset = 0
+    chunks = []
+    for name, dtype in _ARRAYS:
+        data = np.ascontiguousarray(getattr(forest, name), dtype=dtype)
+        padding = -offset % _ALIGNMENT
+        chunks.append(b'\0' * padding)
+        offset += padding
+        arrays[name] = {'dtype': dtype, 'shape': list(data.shape), 'offset': offset}
+        chunks.append(data.tobytes())
+        offset += data.nbytes
+    payload = b''.join(chunks)
+    digest = hashlib.sha256(payload).hexdigest()
+    bin_path = binary_path_for(header_path, digest)
+
+    header = {
+        'format': ARTIFACT_FORMAT,
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'source_version': source_version,
+        'created_at': datetime.now().isoformat(),
+        'feature_names': list(forest.feature_names),
+        'n_features': int(forest.n_features),
+        'classes': [str(c) for c in forest.classes],
+        'max_depth': int(forest.max_depth),
+        'binary_file': os.path.basename(bin_path),
+        'binary_sha256': digest,
+        'arrays': arrays
+    }
+
+    # The binary goes to a file no header points to yet; replacing the header
+    # publishes it. Processes still serving the previous version keep their
+    # mapping of the previous binary, which is left in place.
+    previous = _current_binary(header_path)
+    _atomic_write(bin_path, payload)
+    _atomic_write(header_path, json.dumps(header, indent=2).encode('utf-8'))
+    _remove_old_binaries(header_path, keep={os.path.basename(bin_path), previous})
+    return header_path
+
+
+def _current_binary(header_path):
+    """File name of the binary the existing header points to, if any"""
+    try:
+        return read_header(header_path)['binary_file']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _remove_old_binaries(header_path, keep):
+    """Delete binaries of earlier exports except the ones in keep"""
+    directory = os.path.dirname(header_path) or '.'
+    stem = os.path.basename(os.path.splitext(header_path)[0])
+    for name in os.listdir(directory):
+        if name.startswith(stem + '.') and name.endswith('.bin') and name not in keep:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                # Still mapped by a running process (Windows); removed by a later export
+                pass
+
+
+def read_header(header_path=None):
+    """
+    Read and validate an artifact header.
+
+    Args:
+        header_path (str): Path of the JSON header
+
+    Returns:
+        dict: Parsed header
+
+    Raises:
+        ValueError: If the file is not a supported artifact
+    """
+    with open(header_path or DEFAULT_ARTIFACT_PATH, 'r', encoding='utf-8') as f:
+        header = json.load(f)
+    if header.get('format') != ARTIFACT_FORMAT:
+        raise ValueError(f"Not a {ARTIFACT_FORMAT} artifact")
+    if header.get('format_version') != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format version {header.get('format_version')}")
+    return header
+
+
+def load_artifact(header_path=None):
+    """
+    Memory-map an artifact into a CompiledForest without copying the arrays.
+
+    Args:
+        header_path (str): Path of the JSON header
+
+    Returns:
+        tuple: (CompiledForest, header dict)
+
+    Raises:
+        ValueError: If the binary does not match the checksum in the header
+    """
+    header_path = header_path or DEFAULT_ARTIFACT_PATH
+    header = read_header(header_path)
+    bin_path = os.path.join(os.path.dirname(header_path), header['binary_file'])
+
+    mapped = np.memmap(bin_path, dtype=np.uint8, mode='r')
+    digest = hashlib.sha256(mapped).hexdigest()
+    if digest != header.get('binary_sha256'):
+        raise ValueError(f"{header['binary_file']} does not match the artifact header "
+                         f"(sha256 {digest[:16]}, expected {str(header.get('binary_sha256'))[:16]})")
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape']))
+        start = spec['offset']
+        view = mapped[start:start + count * dtype.itemsize].view(dtype)
+        arrays[name] = view.reshape(spec['shape'])
+
+    forest = CompiledForest(
+        feature=arrays['feature'],
+        threshold=arrays['threshold'],
+        children=arrays['children'],
+        leaf_proba=arrays['leaf_proba'],
+        roots=arrays['roots'],
+        classes=np.asarray(header['classes'], dtype=object),
+        feature_names=header['feature_names'],
+        n_features=header['n_features'],
+        max_depth=header['max_depth']
+    )
+    return forest, header
+
+
+def _atomic_write(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def compare_startup(model_path, header_path=None, repeats=5):
+    """
+    Time a cold load of the pickle against a cold load of the artifact.
+
+    Args:
+        model_path (str): Path of the joblib pickle
+        header_path (str): Path of the artifact header
+        repeats (int): Loads per format; the best time is reported
+
+    Returns:
+        dict: Best load time in milliseconds for each format
+    """
+    import joblib
+
+    row = np.zeros((1, 5))
+
+    def best_of(load):
+        times = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            load()
+            times.append((time.perf_counter() - started) * 1000)
+        return round(min(times), 3)
+
+    return {
+        'pickle_load_ms': best_of(lambda: joblib.load(model_path)),
+        'artifact_load_ms': best_of(lambda: load_artifact(header_path)),
+        'artifact_load_and_predict_ms': best_of(lambda: load_artifact(header_path)[0].predict(row))
+    }
+
+
+if __name__ == "__main__":
+    from utils.model_registry import ModelRegistry
+
+    registry = ModelRegistry(model_format='pickle')
+    loaded = registry.get()
+    path = export_artifact(loaded.compiled(), loaded.version)
+    print(f"✓ Exported model version {loaded.version} to {path} and {read_header(path)['binary_file']}")
+
+    forest, _ = load_artifact(path)
+    X = np.asarray(np.meshgrid(*[[30, 60], [0, 1], [120, 160], [90, 200], [70, 110]])).reshape(5, -1).T
+    same = bool(np.array_equal(forest.predict(X), loaded.compiled().predict(X)))
+    print(f"{'✓' if same else '✗'} Artifact predictions match the pickle")
+
+    timings = compare_startup(registry.model_path, path)
+    print(f"  pickle load:               {timings['pickle_load_ms']:8.2f} ms")
+    print(f"  artifact load:             {timings['artifact_load_ms']:8.2f} ms")
+    print(f"  artifact load + predict:   {timings['artifact_load_and_predict_ms']:8.2f} ms")
@@ -0,0 +1,186 @@
+"""
+Model Registry
+Loads the trained diagnostic model once per process and hot-reloads it
+when train_model.py writes a new artifact to disk.
+"""
+
+import hashlib
+import io
+import os
+import threading
+import time
+from datetime import datetime
+
+import joblib
+
+from utils.model_artifact import DEFAULT_ARTIFACT_PATH, load_artifact
+
+DEFAULT_MODEL_PATH = os.path.join('model', 'diagnostic_model.pkl')
+
+# "pickle" loads the scikit-learn model; "artifact" memory-maps the compact
+# forest written by utils/model_artifact.py and serves it with the compiled engine
+MODEL_FORMATS = ('pickle', 'artifact')
+
+
+class LoadedModel:
+    """
+    Snapshot of a loaded model together with the version that identifies it.
+    A reload builds a new snapshot and swaps it in; only the lazily compiled
+    forest is filled in after construction. Snapshots loaded from a compact
+    artifact have no scikit-learn model, only the compiled forest.
+    """
+
+    def __init__(self, model, version, path, signature, compiled=None):
+        self.model = model
+        self.version = version
+        self.path = path
+        self.signature = signature
+        self.loaded_at = datetime.now()
+        self._compiled = compiled
+
+    def compiled(self):
+        """
+        Get the array-backed copy of the forest, exporting it on first use.
+
+        Returns:
+            CompiledForest: Forest evaluator equivalent to self.model
+        """
+        if self._compiled is None:
+            from utils.tree_engine import CompiledForest
+            self._compiled = CompiledForest.from_sklearn(self.model)
+        return self._compiled
+
+
+class ModelRegistry:
+    """
+    Process-wide holder for the diagnostic model.
+
+    The watched file's (mtime, size) signature is checked at most once per
+    check_interval seconds. When it changes the file is read, hashed and
+    unpickled (or the artifact is re-mapped), and the new snapshot replaces
+    the old one in a single reference assignment, so concurrent readers
+    always see a complete model.
+    """
+
+    def __init__(self, model_path=None, check_interval=None, model_format=None, artifact_path=None):
+        self.model_path = model_path or os.getenv('MODEL_PATH', DEFAULT_MODEL_PATH)
+        self.artifact_path = artifact_path or os.getenv('MODEL_ARTIFACT_PATH', DEFAULT_ARTIFACT_PATH)
+        self.model_format = model_format or os.getenv('MODEL_FORMAT', 'pickle')
+        if self.model_format not in MODEL_FORMATS:
+            raise ValueError(f"Unknown model format '{self.model_format}'. Choose from: {', '.join(MODEL_FORMATS)}")
+        if check_interval is None:
+            check_interval = float(os.getenv('MODEL_CHECK_INTERVAL', '1.0'))
+        self.check_interval = check_interval
+        self.reload_count = 0
+        self._current = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def watch_path(self):
+        """File whose changes trigger a reload"""
+        return self.artifact_path if self.model_format == 'artifact' else self.model_path
+
+    def get(self):
+        """
+        Get the current model snapshot, reloading it if the file changed.
+
+        Returns:
+            LoadedModel: Current model and its version
+
+        Raises:
+            FileNotFoundError: If no model has been trained yet
+        """
+        current = self._current
+        if current is not None and time.monotonic() - self._last_check < self.check_interval:
+            return current
+        return self._refresh()
+
+    def reload(self):
+        """Force a reload from disk regardless of the file signature"""
+        with self._lock:
+            self._current = self._load(self._stat_signature())
+            self._last_check = time.monotonic()
+            return self._current
+
+    def info(self):
+        """Describe the model currently being served"""
+        current = self._current
+        return {
+            'path': self.watch_path,
+            'format': self.model_format,
+            'version': current.version if current else None,
+            'loaded_at': current.loaded_at.isoformat() if current else None,
+            'reload_count': self.reload_count
+        }
+
+    def _stat_signature(self):
+        stat = os.stat(self.watch_path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _refresh(self):
+        with self._lock:
+            current = self._current
+            # Another thread may have refreshed while we waited for the lock
+            if current is not None and time.monotonic() - self._last_check < self.check_interval:
+                return current
+
+            try:
+                signature = self._stat_signature()
+            except FileNotFoundError:
+                if current is None:
+                    raise
+                # Keep serving the last good model while the file is being replaced
+                return current
+
+            if current is None or signature != current.signature:
+                try:
+                    self._current = self._load(signature)
+                except Exception as e:
+                    if current is None:
+                        raise
+                    print(f"⚠️  Model reload failed, keeping version {current.version}: {e}")
+
+            self._last_check = time.monotonic()
+            return self._current
+
+    def _load(self, signature):
+        if self.model_format == 'artifact':
+            forest, header = load_artifact(self.artifact_path)
+            self.reload_count += 1
+            print(f"✓ Mapped diagnostic model version {header['source_version']} from {self.artifact_path}")
+            return LoadedModel(None, header['source_version'], self.artifact_path, signature, forest)
+
+        # Read the bytes once so the hash always describes what was unpickled
+        with open(self.model_path, 'rb') as f:
+            payload = f.read()
+        version = hashlib.sha256(payload).hexdigest()[:12]
+
+        current = self._current
+        if current is not None and current.version == version:
+            # Same content with a new mtime (e.g. touched or copied): no unpickling needed
+            return LoadedModel(current.model, version, self.model_path, signature, current._compiled)
+
+        model = joblib.load(io.BytesIO(payload))
+        self.reload_count += 1
+        print(f"✓ Loaded diagnostic model version {version} from {self.model_path}")
+        return LoadedModel(model, version, self.model_path, signature)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry():
+    """
+    Get the process-wide model registry, creating it on first use.
+
+    Returns:
+        ModelRegistry: Shared registry instance
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry()
+    return _registry
@@ -0,0 +1,159 @@
+"""
+Patient Queries
+Keyset-paginated, projected reads of db.patients for the dashboard.
+
+Pages are ordered newest first on (date, _id) and continue after the last
+row of the previous page, so every page costs the same however deep it is.
+Only the fields the dashboard renders are read; advanced diagnoses carry
+large comprehensive_report documents that are never loaded here.
+
+Configuration (environment):
+    DASHBOARD_PAGE_SIZE     rows per page, default 50 (at most 200)
+    DASHBOARD_COUNT_LIMIT   filtered counts stop here and show "N+", default 10000
+"""
+
+import base64
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import DESCENDING
+
+MAX_PAGE_SIZE = 200
+
+# Fields rendered by dashboard.html
+DASHBOARD_PROJECTION = {
+    "name": 1, "age": 1, "gender": 1, "bp": 1, "glucose": 1, "heart_rate": 1, "symptoms": 1,
+    "diagnosis": 1, "ml_diagnosis": 1, "date": 1, "diagnosed_by": 1, "diagnosis_type": 1
+}
+
+SORT_ORDER = [("date", DESCENDING), ("_id", DESCENDING)]
+
+
+class InvalidQueryError(ValueError):
+    """A filter or cursor from the query string could not be parsed"""
+
+
+def parse_day(value: Optional[str]) -> Optional[datetime]:
+    """YYYY-MM-DD to a datetime at midnight (None for an empty value)"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise InvalidQueryError(f"Invalid date '{value}', expected YYYY-MM-DD")
+
+
+def build_patient_filter(diagnosed_by: Optional[str] = None, diagnosis: Optional[str] = None,
+                         date_from: Optional[str] = None, date_to: Optional[str] = None) -> Dict:
+    """
+    MongoDB filter for the dashboard filters
+
+    Args:
+        diagnosed_by: Username that made the diagnosis
+        diagnosis: Diagnosis of a standard (diagnosis) or advanced (ml_diagnosis) record
+        date_from: First day to include (YYYY-MM-DD)
+        date_to: Last day to include (YYYY-MM-DD)
+
+    Returns:
+        Filter document ({} when nothing is filtered)
+    """
+    clauses = []
+    if diagnosed_by:
+        clauses.append({"diagnosed_by": diagnosed_by})
+    if diagnosis:
+        clauses.append({"$or": [{"diagnosis": diagnosis}, {"ml_diagnosis": diagnosis}]})
+    start, end = parse_day(date_from), parse_day(date_to)
+    if start or end:
+        date_range = {}
+        if start:
+            date_range["$gte"] = start
+        if end:
+            date_range["$lt"] = end + timedelta(days=1)
+        clauses.append({"date": date_range})
+    if not clauses:
+        return {}
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def encode_cursor(row: Dict) -> str:
+    """Opaque cursor pointing after a row"""
+    date = row.get("date")
+    raw = f"{date.isoformat() if date else ''}|{row['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], ObjectId]:
+    """Inverse of encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        date, _, object_id = raw.partition("|")
+        return (datetime.fromisoformat(date) if date else None), ObjectId(object_id)
+    except (ValueError, InvalidId, UnicodeDecodeError):
+        raise InvalidQueryError("Invalid page cursor")
+
+
+def _after(cursor: str) -> Dict:
+    """Filter for the rows that follow the cursor in SORT_ORDER"""
+    date, object_id = decode_cursor(cursor)
+    if date is None:
+        # Records without a date sort last; only the _id tie-breaker remains
+        return {"date": None, "_id": {"$lt": object_id}}
+    return {"$or": [
+        {"date": {"$lt": date}},
+        {"date": date, "_id": {"$lt": object_id}},
+        {"date": None}
+    ]}
+
+
+def fetch_patient_page(collection, query: Dict, cursor: Optional[str] = None,
+                       page_size: Optional[int] = None) -> Tuple[List[Dict], Optional[str]]:
+    """
+    One dashboard page of patient records, newest first
+
+    Args:
+        collection: db.patients
+        query: Filter from build_patient_filter
+        cursor: Cursor of the previous page (None for the first page)
+        page_size: Rows per page (default DASHBOARD_PAGE_SIZE)
+
+    Returns:
+        Tuple of (rows, cursor of the next page or None on the last page)
+    """
+    if page_size is None:
+        page_size = int(os.getenv("DASHBOARD_PAGE_SIZE", "50"))
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    if cursor:
+        query = {"$and": [query, _after(cursor)]} if query else _after(cursor)
+
+    # One extra row tells whether another page follows
+    rows = list(collection.find(query, DASHBOARD_PROJECTION).sort(SORT_ORDER).limit(page_size + 1))
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(rows[-1])
+
+
+def count_patients(collection, query: Dict, limit: Optional[int] = None) -> Dict:
+    """
+    Cheap total for the dashboard
+
+    Unfiltered totals come from the collection metadata; filtered counts stop
+    at the limit instead of scanning every match.
+
+    Args:
+        collection: db.patients
+        query: Filter from build_patient_filter
+        limit: Maximum filtered count (default DASHBOARD_COUNT_LIMIT)
+
+    Returns:
+        Dict with "count", "estimated" (metadata count) and "capped" (at least count)
+    """
+    if not query:
+        return {"count": collection.estimated_document_count(), "estimated": True, "capped": False}
+    if limit is None:
+        limit = int(os.getenv("DASHBOARD_COUNT_LIMIT", "10000"))
+    count = collection.count_documents(query, limit=limit)
+    return {"count": count, "estimated": False, "capped": count >= limit}
@@ -0,0 +1,252 @@
+"""
+Patient Statistics
+Dashboard statistics of db.patients kept in one materialized summary
+document (patient_stats, _id "summary"), so showing them is a single read
+whatever the size of the collection.
+
+- backfill() rebuilds the summary with an aggregation pipeline over every
+  patient record; it runs at startup until a backfill has completed
+- record_flush() is registered with the record writer and adds each batch
+  of new diagnoses to the summary with one $inc update; it never creates
+  the summary, so a partial one cannot pass for a backfilled one
+
+Records written while a backfill is running may be missed by it; run the
+backfill again to resynchronize at any time:
+
+    python -m utils.patient_stats backfill
+    python -m utils.patient_stats show
+
+Configuration (environment):
+    PATIENT_STATS_BACKFILL   0 skips the startup backfill of a missing summary
+"""
+
+import argparse
+import json
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+STATS_COLLECTION = "patient_stats"
+SUMMARY_ID = "summary"
+
+VITALS = ("age", "bp", "glucose", "heart_rate")
+
+# MongoDB field names cannot contain "." or start with "$"; use look-alike characters
+_KEY_ESCAPES = {".": "．", "$": "＄"}
+
+
+def stat_key(value) -> str:
+    """Summary field name for a diagnosis, clinician or diagnosis type"""
+    key = str(value).strip() if value is not None else ""
+    if not key:
+        return "unknown"
+    for character, escaped in _KEY_ESCAPES.items():
+        key = key.replace(character, escaped)
+    return key
+
+
+def display_key(key: str) -> str:
+    """Inverse of stat_key"""
+    for character, escaped in _KEY_ESCAPES.items():
+        key = key.replace(escaped, character)
+    return key
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def increments(documents: List[Dict]) -> Dict[str, float]:
+    """
+    $inc update adding patient records to the summary
+
+    Args:
+        documents: db.patients records (standard or advanced)
+
+    Returns:
+        Dict of summary field path -> increment
+    """
+    inc = defaultdict(int)
+    for document in documents:
+        inc["total"] += 1
+        diagnosis = stat_key(document.get("diagnosis") or document.get("ml_diagnosis"))
+        inc[f"by_diagnosis.{diagnosis}.count"] += 1
+        for field in VITALS:
+            if _is_number(document.get(field)):
+                inc[f"by_diagnosis.{diagnosis}.sums.{field}"] += document[field]
+                inc[f"by_diagnosis.{diagnosis}.counts.{field}"] += 1
+        date = document.get("date")
+        inc[f"by_day.{date.strftime('%Y-%m-%d') if isinstance(date, datetime) else 'unknown'}"] += 1
+        inc[f"by_clinician.{stat_key(document.get('diagnosed_by'))}"] += 1
+        inc[f"by_type.{stat_key(document.get('diagnosis_type') or 'standard')}"] += 1
+    return dict(inc)
+
+
+def record_flush(database, collection: str, documents: List[Dict]):
+    """
+    Add newly written patient records to the summary (record writer hook)
+
+    Args:
+        database: MongoDB database
+        collection: Collection the documents were written to
+        documents: The written documents
+    """
+    if collection != "patients" or not documents:
+        return
+    # No upsert: until the backfill has created the summary it counts these records itself
+    database[STATS_COLLECTION].update_one(
+        {"_id": SUMMARY_ID},
+        {"$inc": increments(documents), "$set": {"updated_at": datetime.now()}}
+    )
+
+
+BACKFILL_PIPELINE = [
+    {"$project": {
+        "diagnosis": {"$ifNull": ["$diagnosis", "$ml_diagnosis"]},
+        "diagnosed_by": 1,
+        "diagnosis_type": {"$ifNull": ["$diagnosis_type", "standard"]},
+        "date": 1,
+        **{field: 1 for field in VITALS},
+        **{f"{field}_numeric": {"$cond": [{"$isNumber": f"${field}"}, 1, 0]} for field in VITALS}
+    }},
+    {"$facet": {
+        "by_diagnosis": [{"$group": {
+            "_id": "$diagnosis",
+            "count": {"$sum": 1},
+            # $sum skips values that are not numbers
+            **{f"{field}_sum": {"$sum": f"${field}"} for field in VITALS},
+            **{f"{field}_count": {"$sum": f"${field}_numeric"} for field in VITALS}
+        }}],
+        "by_day": [
+            {"$match": {"date": {"$type": "date"}}},
+            {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$date"}}, "count": {"$sum": 1}}}
+        ],
+        "by_clinician": [{"$group": {"_id": "$diagnosed_by", "count": {"$sum": 1}}}],
+        "by_type": [{"$group": {"_id": "$diagnosis_type", "count": {"$sum": 1}}}]
+    }}
+]
+
+
+def backfill(database) -> Dict:
+    """
+    Rebuild the summary from every patient record
+
+    Args:
+        database: MongoDB database
+
+    Returns:
+        The new summary document
+    """
+    facets = next(database.patients.aggregate(BACKFILL_PIPELINE, allowDiskUse=True))
+
+    summary = {"_id": SUMMARY_ID, "total": 0, "by_diagnosis": {}, "by_day": {},
+               "by_clinician": {}, "by_type": {}}
+    for group in facets["by_diagnosis"]:
+        entry = summary["by_diagnosis"].setdefault(stat_key(group["_id"]),
+                                                   {"count": 0, "sums": {}, "counts": {}})
+        # Different raw values (e.g. None and "") can share a key
+        entry["count"] += group["count"]
+        for field in VITALS:
+            entry["sums"][field] = entry["sums"].get(field, 0) + group[f"{field}_sum"]
+            entry["counts"][field] = entry["counts"].get(field, 0) + group[f"{field}_count"]
+        summary["total"] += group["count"]
+    for section in ("by_day", "by_clinician", "by_type"):
+        for group in facets[section]:
+            key = stat_key(group["_id"])
+            summary[section][key] = summary[section].get(key, 0) + group["count"]
+    undated = summary["total"] - sum(summary["by_day"].values())
+    if undated:
+        summary["by_day"]["unknown"] = undated
+
+    summary["updated_at"] = summary["backfilled_at"] = datetime.now()
+    database[STATS_COLLECTION].replace_one({"_id": SUMMARY_ID}, summary, upsert=True)
+    return summary
+
+
+def ensure_summary(database, background: bool = True):
+    """Backfill the summary unless a backfill has completed (app startup)"""
+    if database[STATS_COLLECTION].find_one({"_id": SUMMARY_ID, "backfilled_at": {"$exists": True}},
+                                           {"_id": 1}) is not None:
+        return
+
+    def run():
+        try:
+            summary = backfill(database)
+            print(f"✓ Patient statistics backfilled from {summary['total']} records")
+        except Exception as e:
+            print(f"⚠️  Patient statistics backfill failed: {e}")
+
+    if background:
+        threading.Thread(target=run, name="patient-stats-backfill", daemon=True).start()
+    else:
+        run()
+
+
+def load_summary(database, days: int = 14, top_clinicians: int = 10) -> Optional[Dict]:
+    """
+    Dashboard view of the summary (one read)
+
+    Args:
+        database: MongoDB database
+        days: Days of daily volume to return, ending today
+        top_clinicians: Clinicians to list, busiest first
+
+    Returns:
+        Dict with total, diagnoses (count, share, average vitals), daily volume,
+        clinicians and diagnosis types, or None if there is no summary yet
+    """
+    summary = database[STATS_COLLECTION].find_one({"_id": SUMMARY_ID})
+    if summary is None:
+        return None
+    total = summary.get("total", 0)
+
+    diagnoses = []
+    for key, entry in summary.get("by_diagnosis", {}).items():
+        sums, counts = entry.get("sums", {}), entry.get("counts", {})
+        diagnoses.append({
+            "diagnosis": display_key(key),
+            "count": entry.get("count", 0),
+            "share": round(entry.get("count", 0) / total * 100, 1) if total else 0.0,
+            "averages": {field: round(sums[field] / counts[field], 1) if counts.get(field) else None
+                         for field in VITALS}
+        })
+    diagnoses.sort(key=lambda item: item["count"], reverse=True)
+
+    by_day = summary.get("by_day", {})
+    today = datetime.now().date()
+    daily = [{"day": day, "count": by_day.get(day, 0)}
+             for day in ((today - timedelta(days=offset)).strftime("%Y-%m-%d") for offset in range(days - 1, -1, -1))]
+
+    clinicians = sorted(({"clinician": display_key(key), "count": count}
+                         for key, count in summary.get("by_clinician", {}).items()),
+                        key=lambda item: item["count"], reverse=True)
+
+    return {
+        "total": total,
+        "diagnoses": diagnoses,
+        "daily": daily,
+        "daily_max": max((item["count"] for item in daily), default=0),
+        "clinicians": clinicians[:top_clinicians],
+        "types": {display_key(key): count for key, count in summary.get("by_type", {}).items()},
+        "updated_at": summary.get("updated_at")
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild or show the dashboard patient statistics")
+    parser.add_argument("command", choices=["backfill", "show"])
+    args = parser.parse_args()
+
+    from utils.db_connection import get_db_connection
+
+    db = get_db_connection()
+    if db is None:
+        raise SystemExit("✗ MongoDB is not reachable")
+
+    if args.command == "backfill":
+        result = backfill(db)
+        print(f"✓ Summary rebuilt from {result['total']} patient records "
+              f"({len(result['by_diagnosis'])} diagnoses, {len(result['by_clinician'])} clinicians)")
+    else:
+        print(json.dumps(load_summary(db), indent=2, default=str))
@@ -1,50 +1,252 @@
-import joblib
-import pandas as pd
-from utils.preprocess import preprocess_input
 import os
+from concurrent.futures import TimeoutError
+import pandas as pd
+from utils.preprocess import FEATURE_SCHEMA
+from utils.model_registry import get_model_registry
+from utils.prediction_cache import prediction_cache
+from utils.micro_batcher import BatcherStoppedError, MicroBatcher
+from utils.inference_pool import InferencePool
 
-def predict_disease(patient_data):
+# Rows scored per model.predict call in batch mode
+BATCH_CHUNK_SIZE = int(os.getenv('PREDICT_BATCH_CHUNK_SIZE', '1000'))
+
+# Inference engines: "sklearn" (the fitted model) or "compiled" (utils/tree_engine.py)
+PREDICT_ENGINES = ('sklearn', 'compiled')
+_engine = os.getenv('PREDICT_ENGINE', 'sklearn')
+
+
+def set_predict_engine(engine):
     """
-    Predicts disease based on patient data using the trained model.
-    
+    Selects the inference engine used for all subsequent predictions.
+
+    Args:
+        engine (str): "sklearn" or "compiled"
+    """
+    global _engine
+    if engine not in PREDICT_ENGINES:
+        raise ValueError(f"Unknown prediction engine '{engine}'. Choose from: {', '.join(PREDICT_ENGINES)}")
+    _engine = engine
+
+
+def get_predict_engine():
+    """Returns the name of the active inference engine"""
+    return _engine
+
+
+def predict_matrix(features, engine=None):
+    """
+    Runs the current model on an already encoded feature matrix.
+
+    Args:
+        features: Array-like of shape (rows, 5) in FEATURE_SCHEMA order
+        engine (str): Inference engine to use (default: the active engine)
+
+    Returns:
+        tuple: (array of predicted disease names, model version)
+    """
+    loaded = get_model_registry().get()
+    engine = engine or _engine
+
+    # Artifact-loaded snapshots only carry the compiled forest
+    if engine == 'compiled' or loaded.model is None:
+        return loaded.compiled().predict(features), loaded.version
+
+    # Wrap once per call with the training column names so scikit-learn
+    # does not warn about missing feature names
+    return loaded.model.predict(FEATURE_SCHEMA.to_frame(features)), loaded.version
+
+
+# Run predictions in preloaded worker processes (PREDICT_POOL=1); created on first use
+_inference_pool = None
+_use_pool = os.getenv('PREDICT_POOL', '0') == '1'
+
+
+def set_inference_pool(enabled, size=None, timeout=None):
+    """
+    Turns the process-pool inference mode on or off.
+
+    Args:
+        enabled (bool): Whether predictions should run in worker processes
+        size (int): Number of workers (default PREDICT_POOL_SIZE or CPU count)
+        timeout (float): Seconds to wait for a worker before predicting in-process
+    """
+    global _inference_pool, _use_pool
+    if _inference_pool is not None:
+        _inference_pool.shutdown()
+    _inference_pool = InferencePool(size, timeout) if enabled else None
+    _use_pool = enabled
+
+
+def get_inference_pool():
+    """Returns the active InferencePool, or None when predictions run in-process"""
+    global _inference_pool
+    if _use_pool and _inference_pool is None:
+        _inference_pool = InferencePool()
+    return _inference_pool
+
+
+def predict_rows(rows):
+    """
+    Predicts encoded rows in the worker pool when enabled, in-process otherwise.
+
+    Args:
+        rows: Encoded feature rows in FEATURE_SCHEMA order
+
+    Returns:
+        tuple: (sequence of predicted disease names, model version)
+    """
+    pool = get_inference_pool()
+    if pool is not None:
+        # Workers are separate processes; they use the engine selected here
+        return pool.predict(rows, fallback=predict_matrix, engine=_engine)
+    return predict_matrix(rows)
+
+
+# Coalesce concurrent single-row predictions into batches (PREDICT_MICROBATCH=1)
+_micro_batcher = MicroBatcher(predict_rows) if os.getenv('PREDICT_MICROBATCH', '0') == '1' else None
+
+
+def set_micro_batching(enabled, window_ms=None, max_rows=None):
+    """
+    Turns micro-batching of single-row predictions on or off.
+
+    Args:
+        enabled (bool): Whether predict_disease should go through the batcher
+        window_ms (float): Batching window (default PREDICT_BATCH_WINDOW_MS)
+        max_rows (int): Maximum rows per batch (default PREDICT_BATCH_MAX_ROWS)
+    """
+    global _micro_batcher
+    previous = _micro_batcher
+    _micro_batcher = MicroBatcher(predict_rows, window_ms, max_rows) if enabled else None
+    if previous is not None:
+        # Its thread answers the rows already queued, then exits
+        previous.stop()
+
+
+def get_micro_batcher():
+    """Returns the active MicroBatcher, or None when batching is off"""
+    return _micro_batcher
+
+
+def predict_disease_with_version(patient_data):
+    """
+    Predicts disease based on patient data and reports which model served it.
+
     Args:
         patient_data (dict): Dictionary containing patient information:
                            - age, gender, bp, glucose, heart_rate, symptoms
-    
+
     Returns:
-        str: Predicted disease name
+        tuple: (predicted disease name, model version or None on error)
     """
     try:
-        # Get the model path
-        model_path = os.path.join('model', 'diagnostic_model.pkl')
-        
-        # Load the saved model
-        model = joblib.load(model_path)
-        
-        # Preprocess the input data
-        processed_data = preprocess_input(patient_data)
-        
-        # Prepare features for prediction
-        # The model was trained with: age, gender_numeric, bp, glucose, heart_rate
-        features = [[
-            processed_data.get('age', 0),
-            processed_data.get('gender', 0),  # This is already converted to numeric by preprocess_input
-            processed_data.get('bp', 0),
-            processed_data.get('glucose', 0),
-            processed_data.get('heart_rate', 0)
-        ]]
-        
-        # Convert to DataFrame with proper column names (must match training)
-        feature_names = ['age', 'gender_numeric', 'bp', 'glucose', 'heart_rate']
-        features_df = pd.DataFrame(features, columns=feature_names)
-        
-        # Make prediction
-        prediction = model.predict(features_df)
-        
+        # Encode the features the model was trained with:
+        # age, gender_numeric, bp, glucose, heart_rate
+        features = FEATURE_SCHEMA.encode_row(patient_data)
+
+        # Repeated feature vectors are answered from the cache of the current model version
+        if prediction_cache.enabled:
+            current_version = get_model_registry().get().version
+            cached = prediction_cache.get(features, current_version)
+            if cached is not None:
+                return cached, current_version
+
+        # Make prediction with the model loaded once per process
+        batcher = _micro_batcher
+        if batcher is not None:
+            try:
+                diagnosis, version = batcher.predict(features)
+            except (TimeoutError, BatcherStoppedError) as e:
+                # Batch too slow, or the batcher was replaced meanwhile: predict directly
+                print(f"⚠️  Micro-batched prediction unavailable, predicting directly: {str(e) or 'timed out'}")
+                batcher = None
+        if batcher is None:
+            prediction, version = predict_rows([features])
+            diagnosis = prediction[0]
+
+        if prediction_cache.enabled:
+            prediction_cache.put(features, version, diagnosis)
+
         # Return the predicted disease
-        return prediction[0]
-        
+        return diagnosis, version
+
     except FileNotFoundError:
-        return "Model not found. Please train the model first."
+        return "Model not found. Please train the model first.", None
     except Exception as e:
-        return f"Error during prediction: {str(e)}"
+        return f"Error during prediction: {str(e)}", None
+
+
+def predict_disease(patient_data):
+    """
+    Predicts disease based on patient data using the trained model.
+
+    Args:
+        patient_data (dict): Dictionary containing patient information:
+                           - age, gender, bp, glucose, heart_rate, symptoms
+
+    Returns:
+        str: Predicted disease name
+    """
+    diagnosis, _ = predict_disease_with_version(patient_data)
+    return diagnosis
+
+
+def iter_frames(source, chunk_size=None):
+    """
+    Splits a batch source into DataFrame chunks.
+
+    Args:
+        source: List of patient dicts, a DataFrame, or an iterable of
+                DataFrames (e.g. pd.read_csv(..., chunksize=n))
+        chunk_size (int): Maximum rows per chunk
+
+    Yields:
+        DataFrame: Consecutive chunks of at most chunk_size rows
+    """
+    chunk_size = chunk_size or BATCH_CHUNK_SIZE
+
+    if isinstance(source, list):
+        for start in range(0, len(source), chunk_size):
+            yield pd.DataFrame.from_records(source[start:start + chunk_size])
+    elif isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), chunk_size):
+            yield source.iloc[start:start + chunk_size]
+    else:
+        for frame in source:
+            for start in range(0, len(frame), chunk_size):
+                yield frame.iloc[start:start + chunk_size]
+
+
+def predict_batch(source, chunk_size=None):
+    """
+    Predicts diseases for many patients with one model call per chunk.
+
+    Args:
+        source: List of patient dicts, a DataFrame, or an iterable of DataFrames
+        chunk_size (int): Rows per model.predict call (default PREDICT_BATCH_CHUNK_SIZE)
+
+    Yields:
+        tuple: (chunk DataFrame, array of predicted disease names, model version)
+
+    Raises:
+        ValueError: If a chunk is missing columns or has non-numeric vitals
+    """
+    for frame in iter_frames(source, chunk_size):
+        if len(frame) == 0:
+            continue
+        predictions, version = predict_rows(FEATURE_SCHEMA.encode_frame(frame))
+        yield frame, predictions, version
+
+
+def read_csv_batches(file, chunk_size=None):
+    """
+    Reads a patient CSV (shaped like data/sample_patient_data.csv) lazily in chunks.
+
+    Args:
+        file: Path or file-like object
+        chunk_size (int): Rows per chunk
+
+    Returns:
+        Iterator of DataFrames
+    """
+    return pd.read_csv(file, chunksize=chunk_size or BATCH_CHUNK_SIZE)
@@ -0,0 +1,108 @@
+"""
+Prediction Cache
+Bounded LRU cache of model predictions keyed on the encoded feature tuple.
+Entries belong to one model version and are dropped when the version changes.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache mapping encoded feature tuples to predictions.
+
+    Every lookup carries the version of the model that would serve it; when
+    it differs from the version the cached entries were computed with, the
+    cache is cleared before the lookup, so a retrained model never serves
+    stale answers.
+    """
+
+    def __init__(self, max_size=None):
+        if max_size is None:
+            max_size = int(os.getenv('PREDICTION_CACHE_SIZE', '4096'))
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def get(self, key, version):
+        """
+        Look up a cached prediction.
+
+        Args:
+            key (tuple): Encoded feature tuple
+            version (str): Version of the model currently being served
+
+        Returns:
+            Cached prediction, or None on a miss
+        """
+        with self._lock:
+            self._check_version(version)
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, version, value):
+        """
+        Store a prediction made by the given model version.
+
+        Args:
+            key (tuple): Encoded feature tuple
+            version (str): Version of the model that made the prediction
+            value: Prediction to cache
+        """
+        if not self.enabled or version is None:
+            return
+        with self._lock:
+            # Results from a model that has since been replaced are not kept
+            if version != self._version:
+                return
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all cached predictions"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Counters used to size the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'model_version': self._version
+            }
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+                self._entries.clear()
+            self._version = version
+
+
+prediction_cache = PredictionCache()
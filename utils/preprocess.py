@@ -1,7 +1,110 @@
+import numpy as np
+import pandas as pd
+
+
+class FeatureSchema:
+    """
+    Single definition of the model's input features, shared by training
+    (train_model.py) and serving (utils/predict.py).
+    
+    Gender is encoded as 1 for 'Female' (any case) and 0 otherwise, the
+    rule preprocess_input has always applied at serving time. Vitals are
+    passed through as numbers; missing fields in a single row default to 0.
+    """
+    
+    def __init__(self, fields, model_feature_names, categorical_field='gender'):
+        self.fields = list(fields)
+        self.model_feature_names = list(model_feature_names)
+        self.categorical_field = categorical_field
+        self._categorical_index = self.fields.index(categorical_field)
+    
+    def encode_row(self, data):
+        """
+        Encodes one patient without copying the input dict.
+        
+        Args:
+            data (dict): Patient data with age, gender, bp, glucose, heart_rate
+        
+        Returns:
+            tuple: Feature values in model column order
+        """
+        row = [data.get(field, 0) for field in self.fields]
+        gender = row[self._categorical_index]
+        if isinstance(gender, str):
+            row[self._categorical_index] = 1 if gender.lower() == 'female' else 0
+        return tuple(row)
+    
+    def encode_rows(self, records):
+        """
+        Encodes a list of patient dicts.
+        
+        Args:
+            records (list): Patient dicts
+        
+        Returns:
+            ndarray: Float matrix of shape (rows, features)
+        """
+        return self.encode_frame(pd.DataFrame.from_records(records, columns=self.fields))
+    
+    def encode_frame(self, df):
+        """
+        Encodes a batch of patients column-wise into the model's feature matrix,
+        using NumPy string operations for gender instead of a per-row loop.
+        
+        Args:
+            df (DataFrame): Patient rows with age, gender, bp, glucose, heart_rate columns
+        
+        Returns:
+            ndarray: Float matrix of shape (rows, features) in model column order
+        
+        Raises:
+            ValueError: If a column is missing or a vital is not numeric
+        """
+        missing = [field for field in self.fields if field not in df.columns]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+        
+        matrix = np.empty((len(df), len(self.fields)), dtype=np.float64)
+        for i, field in enumerate(self.fields):
+            if field == self.categorical_field:
+                values = np.char.lower(df[field].to_numpy(dtype=str))
+                matrix[:, i] = values == 'female'
+            else:
+                matrix[:, i] = pd.to_numeric(df[field], errors='raise').to_numpy(dtype=np.float64)
+        
+        return matrix
+    
+    def to_frame(self, matrix):
+        """
+        Wraps an encoded matrix with the column names the model was trained with.
+        
+        Args:
+            matrix: Encoded features of shape (rows, features)
+        
+        Returns:
+            DataFrame: Features labelled with model_feature_names
+        """
+        return pd.DataFrame(matrix, columns=self.model_feature_names)
+
+
+FEATURE_SCHEMA = FeatureSchema(
+    fields=['age', 'gender', 'bp', 'glucose', 'heart_rate'],
+    model_feature_names=['age', 'gender_numeric', 'bp', 'glucose', 'heart_rate']
+)
+
+# Raw patient fields used by the model, in the order the model expects them
+FEATURE_FIELDS = FEATURE_SCHEMA.fields
+
+# Column names the model was trained with
+MODEL_FEATURE_NAMES = FEATURE_SCHEMA.model_feature_names
+
+
 def preprocess_input(data):
     """
     Preprocesses input data for the diagnostic model.
     Converts gender text to numeric values.
+    Kept for compatibility; the prediction path uses FEATURE_SCHEMA.encode_row,
+    which produces the same values without copying the dict.
     
     Args:
         data (dict): Dictionary containing patient data with keys:
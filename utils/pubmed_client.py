@@ -0,0 +1,273 @@
+"""
+PubMed Client
+Pooled HTTP client for the NCBI E-utilities used by the advanced diagnosis.
+
+- One requests.Session per process, so connections are kept alive and reused
+- Bounded retries with full-jitter exponential backoff on timeouts, 429 and 5xx
+- The history server (usehistory/WebEnv): search results stay on NCBI's side,
+  repeated lookups of the same term skip esearch, and batched lookups fetch all
+  summaries in a single esummary call
+
+Set NCBI_EUTILS_URL to point the client at another server (for example the
+local stub in utils/pubmed_stub.py, which DIAGNOSIS_BACKENDS=fake starts
+automatically) and NCBI_API_KEY to raise NCBI's rate limit.
+
+Configuration (environment):
+    PUBMED_TIMEOUT_SECONDS   timeout of each HTTP request, default 5
+    PUBMED_SEARCH_CACHE_SIZE search results kept for reuse (LRU), default 1024
+    SOURCE_DEADLINE_SECONDS  no retry is started after this many seconds, default 10
+"""
+
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.fake_backends import fake_pubmed_url, use_fake_backends
+
+DEFAULT_EUTILS_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class PubMedError(Exception):
+    """Raised when an E-utilities request keeps failing after all retries"""
+
+
+class PubMedClient:
+    """
+    Thread-safe NCBI E-utilities client with connection pooling and retries
+    """
+
+    def __init__(self, base_url: Optional[str] = None, timeout: float = 10.0,
+                 max_retries: int = 3, backoff: float = 0.5, pool_size: int = 10,
+                 history_ttl: float = 3600.0, retry_budget: Optional[float] = None,
+                 max_searches: int = 1024):
+        """
+        Args:
+            base_url: E-utilities base URL (default NCBI_EUTILS_URL or NCBI's server)
+            timeout: Seconds per HTTP request
+            max_retries: Retries after the first attempt
+            backoff: Base delay in seconds; attempt n sleeps up to backoff * 2**n
+            pool_size: Keep-alive connections held per host
+            history_ttl: Seconds a term's search result is reused from the history server
+            retry_budget: Seconds after which a request is not retried and later attempts
+                get only the remaining time (default: no limit)
+            max_searches: Search results kept for reuse; the least recently used are evicted
+        """
+        self.base_url = (base_url or os.getenv("NCBI_EUTILS_URL", DEFAULT_EUTILS_URL)).rstrip("/") + "/"
+        self.api_key = os.getenv("NCBI_API_KEY")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.history_ttl = history_ttl
+        self.retry_budget = retry_budget
+        self.max_searches = max_searches
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.requests_sent = 0
+        self.retries = 0
+        self.failures = 0
+        self.history_hits = 0
+        self.search_evictions = 0
+        self._webenv = None
+        self._searches = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, endpoint: str, params: Dict) -> Dict:
+        """GET an E-utility and decode its JSON, retrying transient failures"""
+        params = dict(params, retmode="json")
+        if self.api_key:
+            params["api_key"] = self.api_key
+
+        give_up_at = time.monotonic() + self.retry_budget if self.retry_budget is not None else None
+        last_error = None
+        attempts = 0
+        for attempt in range(self.max_retries + 1):
+            timeout = self.timeout
+            if attempt:
+                delay = random.uniform(0, self.backoff * (2 ** (attempt - 1)))
+                if give_up_at is not None:
+                    timeout = min(timeout, give_up_at - time.monotonic() - delay)
+                    if timeout <= 0:
+                        break
+                self.retries += 1
+                time.sleep(delay)
+            try:
+                self.requests_sent += 1
+                attempts += 1
+                response = self.session.get(self.base_url + endpoint, params=params, timeout=timeout)
+                if response.status_code in RETRY_STATUS_CODES:
+                    last_error = PubMedError(f"{endpoint} returned HTTP {response.status_code}")
+                    continue
+                response.raise_for_status()
+                return response.json()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = e
+            except (requests.RequestException, ValueError) as e:
+                # A 4xx or an undecodable body will not improve on retry
+                self.failures += 1
+                raise PubMedError(f"{endpoint} failed: {e}") from e
+
+        self.failures += 1
+        raise PubMedError(f"{endpoint} failed after {attempts} attempts: {last_error}")
+
+    def search(self, term: str, max_results: int = 3) -> Dict:
+        """
+        Run esearch on the history server, reusing a recent result for the same term
+
+        Args:
+            term: Entrez query
+            max_results: Number of IDs to return
+
+        Returns:
+            Dict with "ids", "webenv" and "query_key"
+        """
+        key = (term, max_results)
+        with self._lock:
+            cached = self._searches.get(key)
+            if cached and time.monotonic() - cached["searched_at"] < self.history_ttl:
+                self.history_hits += 1
+                self._searches.move_to_end(key)
+                return cached
+            if cached:
+                del self._searches[key]
+            webenv = self._webenv
+
+        params = {"db": "pubmed", "term": term, "retmax": max_results, "usehistory": "y"}
+        if webenv:
+            # Append to the same history session instead of opening a new one
+            params["WebEnv"] = webenv
+        result = self._get("esearch.fcgi", params).get("esearchresult", {})
+        if webenv and "ERROR" in result:
+            # The history session expired; start a new one
+            with self._lock:
+                self._webenv = None
+            params.pop("WebEnv")
+            result = self._get("esearch.fcgi", params).get("esearchresult", {})
+
+        entry = {
+            "ids": result.get("idlist", []),
+            "webenv": result.get("webenv"),
+            "query_key": result.get("querykey"),
+            "searched_at": time.monotonic()
+        }
+        with self._lock:
+            if entry["webenv"]:
+                self._webenv = entry["webenv"]
+            if self.max_searches > 0:
+                self._searches[key] = entry
+                self._searches.move_to_end(key)
+                while len(self._searches) > self.max_searches:
+                    self._searches.popitem(last=False)
+                    self.search_evictions += 1
+        return entry
+
+    def summaries(self, ids: List[str] = None, webenv: str = None, query_key: str = None,
+                  max_results: int = 3) -> Dict:
+        """
+        Fetch esummary records by ID list or by a history-server query key
+
+        Returns:
+            Mapping of PMID to its summary record
+        """
+        params = {"db": "pubmed"}
+        if webenv and query_key:
+            params.update({"WebEnv": webenv, "query_key": query_key, "retmax": max_results})
+        else:
+            params["id"] = ",".join(ids or [])
+        result = self._get("esummary.fcgi", params).get("result", {})
+        return {uid: result[uid] for uid in result.get("uids", []) if uid in result}
+
+    def search_articles(self, condition: str, max_results: int = 3) -> List[Dict]:
+        """
+        Find articles about one condition
+
+        Args:
+            condition: Medical condition to search
+            max_results: Maximum number of articles
+
+        Returns:
+            List of article dicts in the report format
+        """
+        found = self.search(f"{condition}[Title/Abstract]", max_results)
+        if not found["ids"]:
+            return []
+        records = self.summaries(found["ids"], found["webenv"], found["query_key"], max_results)
+        if not records:
+            # The history entry may have expired; ask by ID instead
+            records = self.summaries(found["ids"])
+        return [format_article(pmid, records[pmid]) for pmid in found["ids"] if pmid in records]
+
+    def search_many(self, conditions: List[str], max_results: int = 3) -> Dict[str, List[Dict]]:
+        """
+        Find articles for several conditions with one shared esummary call
+
+        Args:
+            conditions: Medical conditions to search
+            max_results: Maximum number of articles per condition
+
+        Returns:
+            Mapping of condition to its list of article dicts
+        """
+        found = {condition: self.search(f"{condition}[Title/Abstract]", max_results) for condition in conditions}
+        all_ids = sorted({pmid for entry in found.values() for pmid in entry["ids"]})
+        records = self.summaries(all_ids) if all_ids else {}
+        return {
+            condition: [format_article(pmid, records[pmid]) for pmid in entry["ids"] if pmid in records]
+            for condition, entry in found.items()
+        }
+
+    def stats(self) -> Dict:
+        """Request counters"""
+        return {
+            "base_url": self.base_url,
+            "requests": self.requests_sent,
+            "retries": self.retries,
+            "failures": self.failures,
+            "history_hits": self.history_hits,
+            "cached_searches": len(self._searches),
+            "search_evictions": self.search_evictions
+        }
+
+
+def format_article(pmid: str, record: Dict) -> Dict:
+    """Convert an esummary record into the report's article format"""
+    return {
+        "source": "PubMed",
+        "title": record.get("title", ""),
+        "authors": ", ".join([author.get("name", "") for author in record.get("authors", [])[:3]]),
+        "journal": record.get("source", ""),
+        "pub_date": record.get("pubdate", ""),
+        "pmid": pmid,
+        "url": f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
+    }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_pubmed_client() -> PubMedClient:
+    """Get the process-wide PubMed client, creating it on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                base_url = None
+                if use_fake_backends():
+                    base_url = fake_pubmed_url()
+                _client = PubMedClient(base_url=base_url,
+                                       timeout=float(os.getenv("PUBMED_TIMEOUT_SECONDS", "5")),
+                                       retry_budget=float(os.getenv("SOURCE_DEADLINE_SECONDS", "10")),
+                                       max_searches=int(os.getenv("PUBMED_SEARCH_CACHE_SIZE", "1024")))
+    return _client
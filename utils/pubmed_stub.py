@@ -0,0 +1,190 @@
+"""
+PubMed Stub Server
+Local stand-in for the NCBI E-utilities (esearch and esummary, JSON mode,
+with a minimal history server) so the PubMed client's latency and retry
+behaviour can be exercised offline.
+
+Run it and point the app at it:
+
+    python -m utils.pubmed_stub --port 8090 --latency 0.05 --failure-rate 0.1
+    NCBI_EUTILS_URL=http://127.0.0.1:8090/ python app.py
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StubState:
+    """Behaviour settings and counters shared by all request handlers"""
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, fail_first=0, results_per_term=5,
+                 latency_sampler=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.latency_sampler = latency_sampler
+        self.failure_rate = failure_rate
+        self.fail_first = fail_first
+        self.results_per_term = results_per_term
+        self.requests = {'esearch.fcgi': 0, 'esummary.fcgi': 0}
+        self.failures = 0
+        self.history = {}
+        self.lock = threading.Lock()
+
+    def ids_for(self, term, count):
+        """Deterministic fake PMIDs for a search term"""
+        seed = int(hashlib.sha256(term.encode()).hexdigest()[:8], 16)
+        return [str(30000000 + (seed + i * 7919) % 9000000) for i in range(count)]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        endpoint = url.path.rsplit('/', 1)[-1]
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        state = self.state
+
+        if state.latency_sampler is not None:
+            time.sleep(state.latency_sampler())
+        else:
+            time.sleep(max(0.0, state.latency + random.uniform(-state.jitter, state.jitter)))
+
+        with state.lock:
+            if endpoint in state.requests:
+                state.requests[endpoint] += 1
+            should_fail = state.fail_first > 0 or random.random() < state.failure_rate
+            if state.fail_first > 0:
+                state.fail_first -= 1
+            if should_fail:
+                state.failures += 1
+
+        if should_fail:
+            self._send(503, {'error': 'Service temporarily unavailable'})
+        elif endpoint == 'esearch.fcgi':
+            self._send(200, self._esearch(params))
+        elif endpoint == 'esummary.fcgi':
+            self._send(200, self._esummary(params))
+        else:
+            self._send(404, {'error': f'Unknown endpoint {endpoint}'})
+
+    def _esearch(self, params):
+        state = self.state
+        retmax = int(params.get('retmax', 20))
+        ids = state.ids_for(params.get('term', ''), min(retmax, state.results_per_term))
+        result = {'count': str(len(ids)), 'retmax': str(len(ids)), 'idlist': ids}
+
+        if params.get('usehistory') == 'y':
+            with state.lock:
+                webenv = params.get('WebEnv') or f"STUB_WEBENV_{len(state.history) + 1}"
+                queries = state.history.setdefault(webenv, [])
+                queries.append(ids)
+                result.update({'webenv': webenv, 'querykey': str(len(queries))})
+        return {'esearchresult': result}
+
+    def _esummary(self, params):
+        state = self.state
+        if params.get('WebEnv') and params.get('query_key'):
+            with state.lock:
+                queries = state.history.get(params['WebEnv'], [])
+                index = int(params['query_key']) - 1
+                ids = queries[index] if 0 <= index < len(queries) else []
+            ids = ids[:int(params.get('retmax', len(ids)))]
+        else:
+            ids = [pmid for pmid in params.get('id', '').split(',') if pmid]
+
+        result = {'uids': ids}
+        for pmid in ids:
+            result[pmid] = {
+                'uid': pmid,
+                'title': f'Stub article {pmid}',
+                'authors': [{'name': 'Doe J'}, {'name': 'Roe R'}],
+                'source': 'Stub J Med',
+                'pubdate': '2024 Jan'
+            }
+        return {'result': result}
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_stub_server(port=0, **settings):
+    """
+    Start the stub in a background thread.
+
+    Args:
+        port (int): Port to listen on (0 picks a free one)
+        **settings: latency, jitter, failure_rate, fail_first, results_per_term,
+            latency_sampler (callable returning seconds; replaces latency and jitter)
+
+    Returns:
+        tuple: (server, base URL, StubState)
+    """
+    state = StubState(**settings)
+    handler = type('BoundStubHandler', (StubHandler,), {'state': state})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='pubmed-stub', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/", state
+
+
+def run_self_check():
+    """Exercise the PubMed client against the stub and print latency and retry counts"""
+    from utils.pubmed_client import PubMedClient
+
+    server, url, state = start_stub_server(latency=0.02, fail_first=2)
+    try:
+        client = PubMedClient(base_url=url, backoff=0.05)
+
+        started = time.perf_counter()
+        articles = client.search_articles('Diabetes')
+        first_ms = (time.perf_counter() - started) * 1000
+        print(f"✓ First lookup: {len(articles)} articles in {first_ms:.1f} ms after {client.retries} retries")
+
+        started = time.perf_counter()
+        client.search_articles('Diabetes')
+        repeat_ms = (time.perf_counter() - started) * 1000
+        print(f"✓ Repeated lookup: {repeat_ms:.1f} ms ({client.history_hits} history hit)")
+
+        sent_before = client.requests_sent
+        batch = client.search_many(['Asthma', 'Migraine', 'Anemia'])
+        print(f"✓ Batched lookup of {len(batch)} conditions in {client.requests_sent - sent_before} requests")
+        print(f"  Stub saw {state.requests} with {state.failures} injected failures")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Local NCBI E-utilities stub')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random +/- seconds around the latency')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    parser.add_argument('--fail-first', type=int, default=0, help='Answer the first N requests with 503')
+    parser.add_argument('--self-check', action='store_true', help='Run the client against a temporary stub and exit')
+    args = parser.parse_args()
+
+    if args.self_check:
+        run_self_check()
+    else:
+        server, url, _ = start_stub_server(args.port, latency=args.latency, jitter=args.jitter,
+                                           failure_rate=args.failure_rate, fail_first=args.fail_first)
+        print(f"PubMed stub listening on {url} (Ctrl+C to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
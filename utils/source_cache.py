@@ -0,0 +1,277 @@
+"""
+Medical Source Cache
+TTL cache for the web search, Wikipedia and PubMed lookups of the advanced
+diagnosis. Keys are the normalized condition string, storage is pluggable
+(in-memory LRU, on-disk JSON files, or a MongoDB collection) and expired
+entries are served stale while a background refresh fetches a new copy.
+
+Configuration (environment):
+    SOURCE_CACHE_BACKEND          memory (default), disk, mongo or none
+    SOURCE_CACHE_DIR              directory for the disk backend
+    SOURCE_CACHE_TTL_WEB_SEARCH   seconds, default 21600 (6 hours)
+    SOURCE_CACHE_TTL_WIKIPEDIA    seconds, default 604800 (7 days)
+    SOURCE_CACHE_TTL_PUBMED       seconds, default 86400 (1 day)
+    SOURCE_CACHE_STALE_SECONDS    how long past its TTL an entry may still be served
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+DEFAULT_TTLS = {
+    "web_search": float(os.getenv("SOURCE_CACHE_TTL_WEB_SEARCH", str(6 * 3600))),
+    "wikipedia": float(os.getenv("SOURCE_CACHE_TTL_WIKIPEDIA", str(7 * 24 * 3600))),
+    "pubmed_articles": float(os.getenv("SOURCE_CACHE_TTL_PUBMED", str(24 * 3600))),
+}
+
+
+def normalize_condition(condition: str) -> str:
+    """Lowercase and collapse whitespace so 'Heart  Disease' and 'heart disease' share an entry"""
+    return re.sub(r"\s+", " ", str(condition)).strip().lower()
+
+
+class MemoryBackend:
+    """In-process LRU storage"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: Dict):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskBackend:
+    """One JSON file per key, written atomically; survives restarts and is shared by workers"""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or os.getenv("SOURCE_CACHE_DIR", os.path.join("data", "source_cache"))
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    def get(self, key: str) -> Optional[Dict]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def set(self, key: str, entry: Dict):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.directory, name))
+
+
+class MongoBackend:
+    """Entries stored as documents in a MongoDB collection, shared by every app instance"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def get(self, key: str) -> Optional[Dict]:
+        document = self.collection.find_one({"_id": key})
+        if document is None:
+            return None
+        return {"value": document["value"], "stored_at": document["stored_at"]}
+
+    def set(self, key: str, entry: Dict):
+        self.collection.replace_one({"_id": key}, dict(entry, _id=key), upsert=True)
+
+    def delete(self, key: str):
+        self.collection.delete_one({"_id": key})
+
+    def clear(self):
+        self.collection.delete_many({})
+
+
+class SourceCache:
+    """
+    Stale-while-revalidate cache in front of the medical source lookups
+
+    A fresh entry is returned directly. An entry past its TTL but within
+    stale_seconds is returned immediately while a background thread fetches
+    a replacement. Missing or too-old entries are fetched synchronously.
+    Empty results (which the lookups also return on errors) are not stored.
+    """
+
+    def __init__(self, backend=None, ttls: Optional[Dict[str, float]] = None,
+                 stale_seconds: Optional[float] = None):
+        self.backend = backend
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        if stale_seconds is None:
+            stale_seconds = float(os.getenv("SOURCE_CACHE_STALE_SECONDS", str(24 * 3600)))
+        self.stale_seconds = stale_seconds
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.errors = 0
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="source-refresh")
+
+    def key_for(self, source: str, condition: str, variant=None) -> str:
+        key = f"{source}:{normalize_condition(condition)}"
+        return f"{key}:{variant}" if variant is not None else key
+
+    def get_or_fetch(self, source: str, condition: str, fetch: Callable, variant=None):
+        """
+        Return the cached lookup for a condition, fetching it if needed
+
+        Args:
+            source: "web_search", "wikipedia" or "pubmed_articles"
+            condition: Condition string (normalized for the key)
+            fetch: Callable with no arguments performing the real lookup
+            variant: Extra key part for non-default lookup parameters
+
+        Returns:
+            The lookup result
+        """
+        if self.backend is None:
+            return fetch()
+
+        key = self.key_for(source, condition, variant)
+        try:
+            entry = self.backend.get(key)
+        except Exception as e:
+            print(f"Source cache read error: {e}")
+            self.errors += 1
+            entry = None
+
+        if entry is not None:
+            age = time.time() - entry["stored_at"]
+            ttl = self.ttls.get(source, DEFAULT_TTLS["web_search"])
+            if age < ttl:
+                self.hits += 1
+                return entry["value"]
+            if age < ttl + self.stale_seconds:
+                self.stale_hits += 1
+                self._refresh_in_background(key, fetch)
+                return entry["value"]
+
+        self.misses += 1
+        value = fetch()
+        self._store(key, value)
+        return value
+
+    def invalidate(self, source: str, condition: str, variant=None):
+        """Forget one cached lookup"""
+        if self.backend is not None:
+            self.backend.delete(self.key_for(source, condition, variant))
+
+    def stats(self) -> Dict:
+        """Cache counters"""
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend is not None else None,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else None,
+            "background_refreshes": self.refreshes,
+            "errors": self.errors,
+            "ttls": self.ttls
+        }
+
+    def _store(self, key: str, value):
+        if not value:
+            return
+        try:
+            self.backend.set(key, {"value": value, "stored_at": time.time()})
+        except Exception as e:
+            print(f"Source cache write error: {e}")
+            self.errors += 1
+
+    def _refresh_in_background(self, key: str, fetch: Callable):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._store(key, fetch())
+                self.refreshes += 1
+            except Exception as e:
+                # The stale copy stays in place until a refresh succeeds
+                print(f"Source cache refresh error: {e}")
+                self.errors += 1
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._refresher.submit(refresh)
+
+
+def build_backend(name: Optional[str] = None, db=None):
+    """
+    Create a storage backend by name
+
+    Args:
+        name: "memory", "disk", "mongo" or "none" (default SOURCE_CACHE_BACKEND)
+        db: MongoDB database, required for the mongo backend
+
+    Returns:
+        Backend instance, or None to disable caching
+    """
+    name = (name or os.getenv("SOURCE_CACHE_BACKEND", "memory")).lower()
+    if name == "none":
+        return None
+    if name == "disk":
+        return DiskBackend()
+    if name == "mongo":
+        if db is None:
+            print("⚠️  SOURCE_CACHE_BACKEND=mongo but no database is available; using memory")
+            return MemoryBackend()
+        return MongoBackend(db.source_cache)
+    return MemoryBackend()
+
+
+# The mongo backend needs a database; app.py calls configure_source_cache once it is connected
+source_cache = SourceCache(MemoryBackend() if os.getenv("SOURCE_CACHE_BACKEND") == "mongo" else build_backend())
+
+
+def configure_source_cache(name: Optional[str] = None, db=None):
+    """Switch the shared cache to another backend (used by app.py once the database is connected)"""
+    source_cache.backend = build_backend(name, db)
@@ -0,0 +1,216 @@
+"""
+Array-backed Tree Ensemble Evaluator
+Exports a fitted RandomForestClassifier into flat NumPy arrays and evaluates
+rows without building DataFrames or going through scikit-learn's predict
+machinery. Run this module to verify it against the scikit-learn model:
+
+    python -m utils.tree_engine
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+
+
+class CompiledForest:
+    """
+    A random forest flattened into node arrays shared by all trees.
+
+    Node i of the ensemble tests feature[i] <= threshold[i] and continues at
+    children[2 * i + 1] (left) or children[2 * i] (right). Leaves point back
+    to themselves, so every row can be advanced for max_depth steps without
+    branching. leaf_proba holds each leaf's normalized class distribution;
+    averaging them over trees reproduces scikit-learn's soft vote exactly.
+    """
+
+    def __init__(self, feature, threshold, children, leaf_proba, roots,
+                 classes, feature_names, n_features, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.leaf_proba = leaf_proba
+        self.roots = roots
+        self.classes = classes
+        self.feature_names = feature_names
+        self.n_features = n_features
+        self.max_depth = max_depth
+        self.n_trees = len(roots)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """
+        Export a fitted RandomForestClassifier.
+
+        Args:
+            model: Fitted sklearn.ensemble.RandomForestClassifier
+
+        Returns:
+            CompiledForest: Equivalent array-backed forest
+        """
+        n_classes = len(model.classes_)
+        features, thresholds, children, probas, roots = [], [], [], [], []
+        max_depth = 0
+        offset = 0
+
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(offset, offset + n_nodes)
+            is_leaf = tree.children_left == -1
+
+            left = np.where(is_leaf, node_ids, tree.children_left + offset)
+            right = np.where(is_leaf, node_ids, tree.children_right + offset)
+            pairs = np.empty(2 * n_nodes, dtype=np.intp)
+            pairs[0::2] = right
+            pairs[1::2] = left
+
+            value = tree.value[:, 0, :n_classes].astype(np.float64)
+            normalizer = value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.intp))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            children.append(pairs)
+            probas.append(np.where(is_leaf[:, None], value / normalizer, 0.0))
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n_nodes
+
+        feature_names = list(getattr(model, 'feature_names_in_', []))
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            children=np.concatenate(children),
+            leaf_proba=np.concatenate(probas),
+            roots=np.asarray(roots, dtype=np.intp),
+            classes=np.asarray(model.classes_),
+            feature_names=feature_names,
+            n_features=model.n_features_in_,
+            max_depth=max_depth
+        )
+
+    def apply(self, X):
+        """
+        Find the leaf each row lands in for every tree.
+
+        Args:
+            X (ndarray): Float32 matrix of shape (rows, features)
+
+        Returns:
+            ndarray: Leaf node ids of shape (rows, trees)
+        """
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], self.n_trees))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = self.children[2 * nodes + go_left]
+        return nodes
+
+    def predict_proba(self, X):
+        """
+        Class probabilities averaged over trees, as in scikit-learn.
+
+        Args:
+            X: Array-like of shape (rows, features)
+
+        Returns:
+            ndarray: Probabilities of shape (rows, classes)
+        """
+        X = self._validate(X)
+        return self.leaf_proba[self.apply(X)].sum(axis=1) / self.n_trees
+
+    def predict(self, X):
+        """
+        Predict class labels.
+
+        Args:
+            X: Array-like of shape (rows, features)
+
+        Returns:
+            ndarray: Predicted labels
+        """
+        X = self._validate(X)
+        if X.shape[0] == 1:
+            return self.classes[[self._predict_row_index(X[0])]]
+        proba = self.leaf_proba[self.apply(X)].sum(axis=1)
+        return self.classes[np.argmax(proba, axis=1)]
+
+    def predict_one(self, row):
+        """
+        Predict the label of a single row given as a sequence of feature values.
+
+        Args:
+            row: Sequence of feature values in training column order
+
+        Returns:
+            Predicted label
+        """
+        return self.classes[self._predict_row_index(np.asarray(row, dtype=np.float32))]
+
+    def _predict_row_index(self, x):
+        nodes = self.roots
+        for _ in range(self.max_depth):
+            nodes = self.children[2 * nodes + (x[self.feature[nodes]] <= self.threshold[nodes])]
+        return np.argmax(self.leaf_proba[nodes].sum(axis=0))
+
+    def _validate(self, X):
+        # scikit-learn evaluates trees on float32 inputs; match it exactly
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected a 2D feature matrix with {self.n_features} columns")
+        if np.isnan(X).any():
+            raise ValueError("Input contains NaN")
+        return X
+
+
+def verify_against_sklearn(model, csv_path='data/sample_patient_data.csv'):
+    """
+    Check that the compiled forest predicts exactly what scikit-learn predicts.
+
+    Args:
+        model: Fitted RandomForestClassifier
+        csv_path (str): Patient CSV to evaluate on (defaults to the training data)
+
+    Returns:
+        tuple: (number of rows checked, number of mismatching predictions)
+    """
+    from utils.preprocess import FEATURE_SCHEMA
+
+    df = pd.read_csv(csv_path)
+    X = FEATURE_SCHEMA.encode_frame(df)
+    expected = model.predict(FEATURE_SCHEMA.to_frame(X))
+
+    forest = CompiledForest.from_sklearn(model)
+    batch = forest.predict(X)
+    single = np.array([forest.predict_one(row) for row in X])
+
+    mismatches = int(np.sum((batch != expected) | (single != expected)))
+    return len(X), mismatches
+
+
+if __name__ == "__main__":
+    from utils.model_registry import ModelRegistry
+    from utils.preprocess import FEATURE_SCHEMA
+
+    model = ModelRegistry(model_format='pickle').get().model
+    rows, mismatches = verify_against_sklearn(model)
+    print(f"{'✓' if mismatches == 0 else '✗'} Compiled forest vs scikit-learn: "
+          f"{rows - mismatches}/{rows} identical predictions")
+
+    forest = CompiledForest.from_sklearn(model)
+    row = [45, 0, 140, 110, 85]
+    repeats = 200
+
+    started = time.perf_counter()
+    for _ in range(repeats):
+        model.predict(FEATURE_SCHEMA.to_frame([row]))
+    sklearn_us = (time.perf_counter() - started) / repeats * 1e6
+
+    started = time.perf_counter()
+    for _ in range(repeats):
+        forest.predict_one(row)
+    compiled_us = (time.perf_counter() - started) / repeats * 1e6
+
+    print(f"  scikit-learn single row: {sklearn_us:10.1f} µs")
+    print(f"  compiled single row:     {compiled_us:10.1f} µs")
@@ -0,0 +1,376 @@
+"""
+Write-Behind Record Writer
+Takes MongoDB inserts off the request path. Diagnosis and report records
+are queued in memory and a background thread writes them with insert_many
+once a batch is full or the oldest queued record has waited long enough.
+
+- Every record gets a client-side ObjectId, so routes can return the new
+  record's ID before it is written
+- The queue is bounded; when it is full the record is written synchronously
+  by the caller instead of being dropped
+- Flushes that fail with a connection error are retried (MongoDB may be
+  reconnecting); queued records are drained when the process exits
+- Records MongoDB rejects for good (validation errors, documents that
+  cannot be encoded) are dropped from the queue and saved with their error
+  in the write_errors collection, so one bad record never blocks the rest
+- DB_WRITE_MODE=sync writes every record before the request returns, for
+  deployments where an acknowledged write must precede the response
+- Functions registered with on_flush receive every batch that was written
+
+Configuration (environment):
+    DB_WRITE_MODE               sync (default) or async (write-behind)
+    DB_WRITE_QUEUE_SIZE         queued records before callers write synchronously, default 10000
+    DB_WRITE_BATCH_SIZE         records per insert_many, default 100
+    DB_WRITE_FLUSH_INTERVAL     seconds a record may wait before its batch is flushed, default 0.5
+"""
+
+import atexit
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo.errors import AutoReconnect, BulkWriteError, ConnectionFailure, DuplicateKeyError, NetworkTimeout
+
+WRITE_MODES = ("sync", "async")
+
+DEAD_LETTER_COLLECTION = "write_errors"
+
+# Errors after which the same write may succeed later
+TRANSIENT_ERRORS = (AutoReconnect, ConnectionFailure, NetworkTimeout)
+
+
+class WriteBehindWriter:
+    """
+    Buffered inserts into MongoDB collections
+
+    get_database is called for every write, so writes follow the connection
+    as it reconnects; while it returns None, batches are kept and retried.
+    """
+
+    def __init__(self, get_database: Callable, mode: Optional[str] = None, max_queue: Optional[int] = None,
+                 batch_size: Optional[int] = None, flush_interval: Optional[float] = None,
+                 retry_seconds: float = 1.0):
+        """
+        Args:
+            get_database: Callable returning the MongoDB database or None
+            mode: "sync" or "async" (default DB_WRITE_MODE)
+            max_queue: Queued records before callers write synchronously
+            batch_size: Records per insert_many
+            flush_interval: Seconds the oldest queued record may wait
+            retry_seconds: Wait before retrying a failed flush
+        """
+        mode = (mode or os.getenv("DB_WRITE_MODE", "sync")).lower()
+        if mode not in WRITE_MODES:
+            raise ValueError(f"Unknown DB_WRITE_MODE '{mode}'. Choose from: {', '.join(WRITE_MODES)}")
+        if max_queue is None:
+            max_queue = int(os.getenv("DB_WRITE_QUEUE_SIZE", "10000"))
+        if batch_size is None:
+            batch_size = int(os.getenv("DB_WRITE_BATCH_SIZE", "100"))
+        if flush_interval is None:
+            flush_interval = float(os.getenv("DB_WRITE_FLUSH_INTERVAL", "0.5"))
+        self.get_database = get_database
+        self.mode = mode
+        self.max_queue = max_queue
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.retry_seconds = retry_seconds
+        self.enqueued = 0
+        self.written = 0
+        self.sync_writes = 0
+        self.overflow_writes = 0
+        self.skipped = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.last_error = None
+        self._flush_latencies = deque(maxlen=512)
+        self._hooks = []
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = 0
+        self._stopping = threading.Event()
+        self._idle = threading.Condition()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def on_flush(self, hook: Callable[[object, str, List[Dict]], None]):
+        """Register a function called with (database, collection name, documents) after every write"""
+        self._hooks.append(hook)
+
+    def insert(self, collection: str, document: Dict, durable: bool = False) -> Optional[ObjectId]:
+        """
+        Insert a document now (sync mode) or queue it (async mode)
+
+        Args:
+            collection: Collection name
+            document: Document to insert; an _id is assigned if it has none
+            durable: Write before returning even in async mode
+
+        Returns:
+            The document's _id, or None if it could not be stored (sync write without a database)
+        """
+        document.setdefault("_id", ObjectId())
+        if self.mode == "sync" or durable:
+            with self._lock:
+                self.sync_writes += 1
+            return document["_id"] if self._write_now(collection, document) else None
+
+        self._ensure_started()
+        with self._idle:
+            # Counted before it is queued so flush() never misses it
+            self._pending += 1
+        try:
+            self._queue.put_nowait((collection, document, time.monotonic()))
+        except queue.Full:
+            self._done(1)
+            # Back-pressure: the caller pays for the write instead of losing it
+            with self._lock:
+                self.overflow_writes += 1
+            return document["_id"] if self._write_now(collection, document) else None
+        with self._lock:
+            self.enqueued += 1
+        return document["_id"]
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """
+        Wait until every queued record has been written
+
+        Returns:
+            True if the queue drained within the timeout
+        """
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._thread is None:
+                    return False
+                self._idle.wait(min(remaining, 0.1))
+        return True
+
+    def stop(self, timeout: float = 10.0):
+        """Write the remaining records and stop the background thread (runs at exit)"""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        self._thread = None
+        remaining = self._queue.qsize()
+        if remaining:
+            self.dropped += remaining
+            print(f"❌ {remaining} queued records could not be written before shutdown")
+
+    def stats(self) -> Dict:
+        """Queue depth, write counters and flush latency"""
+        latencies = sorted(self._flush_latencies)
+        return {
+            "mode": self.mode,
+            "queue_depth": self._queue.qsize(),
+            "unwritten": self._pending,
+            "max_queue": self.max_queue,
+            "batch_size": self.batch_size,
+            "flush_interval_seconds": self.flush_interval,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "sync_writes": self.sync_writes,
+            "overflow_writes": self.overflow_writes,
+            "skipped": self.skipped,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "flush_ms_p50": round(latencies[len(latencies) // 2] * 1000, 2) if latencies else None,
+            "flush_ms_p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 2)
+            if latencies else None,
+            "flush_ms_max": round(latencies[-1] * 1000, 2) if latencies else None,
+            "last_error": self.last_error
+        }
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._stopping.clear()
+                    self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.stop)
+
+    def _write_now(self, collection: str, document: Dict) -> bool:
+        database = self.get_database()
+        if database is None:
+            with self._lock:
+                self.skipped += 1
+            print(f"⚠️  Database not available; {collection} record not stored")
+            return False
+        database[collection].insert_one(document)
+        with self._lock:
+            self.written += 1
+        self._notify(database, collection, [document])
+        return True
+
+    def _done(self, count: int):
+        """Records that were written or given up on"""
+        with self._idle:
+            self._pending -= count
+            self._idle.notify_all()
+
+    def _next_batch(self) -> List[tuple]:
+        """Block for the first record, then collect until the batch is full or its oldest record is due"""
+        try:
+            first = self._queue.get(timeout=0.2)
+        except queue.Empty:
+            return []
+        batch = [first]
+        due = first[2] + self.flush_interval
+        while len(batch) < self.batch_size and not self._stopping.is_set():
+            remaining = due - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Take whatever is already queued without waiting
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        batch = []
+        while True:
+            if not batch:
+                if self._stopping.is_set() and self._queue.empty():
+                    return
+                batch = self._next_batch()
+                if not batch:
+                    continue
+            size = len(batch)
+            if self._flush(batch):
+                self._done(size)
+                batch = []
+            elif self._stopping.is_set():
+                # Database still down at shutdown; give up on this batch
+                self.dropped += len(batch)
+                print(f"❌ {len(batch)} queued records could not be written before shutdown")
+                self._done(size)
+                batch = []
+            else:
+                # Collections that were written are gone from the batch
+                self._done(size - len(batch))
+                self._stopping.wait(self.retry_seconds)
+
+    def _flush(self, batch: List[tuple]) -> bool:
+        """Write a batch with one insert_many per collection; False to retry it later"""
+        database = self.get_database()
+        if database is None:
+            self.last_error = "database not available"
+            self.failed_flushes += 1
+            return False
+
+        by_collection = {}
+        for collection, document, _ in batch:
+            by_collection.setdefault(collection, []).append(document)
+
+        started = time.perf_counter()
+        try:
+            for collection, documents in list(by_collection.items()):
+                written, rejected = self._insert_many(database, collection, documents)
+                # Done with this collection; a retry only repeats the others
+                del by_collection[collection]
+                with self._lock:
+                    self.written += len(written)
+                if written:
+                    self._notify(database, collection, written)
+                if rejected:
+                    self._dead_letter(database, collection, rejected)
+        except TRANSIENT_ERRORS as e:
+            self.last_error = f"{datetime.now().isoformat()}: {e}"
+            self.failed_flushes += 1
+            print(f"⚠️  Write-behind flush failed, retrying: {e}")
+            # Keep only the collections that were not written
+            batch[:] = [item for item in batch if item[0] in by_collection]
+            return False
+
+        self.flushes += 1
+        self._flush_latencies.append(time.perf_counter() - started)
+        return True
+
+    def _insert_many(self, database, collection: str, documents: List[Dict]) -> tuple:
+        """
+        Insert documents, separating the ones MongoDB rejects
+
+        Connection errors are raised so the caller retries the batch.
+
+        Returns:
+            (written documents, [(rejected document, error message), ...])
+        """
+        try:
+            database[collection].insert_many(documents, ordered=False)
+            return documents, []
+        except BulkWriteError as e:
+            # Duplicate _ids were written by an earlier attempt of this batch
+            failed = {error["index"]: error.get("errmsg", f"code {error.get('code')}")
+                      for error in e.details.get("writeErrors", []) if error.get("code") != 11000}
+            return ([document for index, document in enumerate(documents) if index not in failed],
+                    [(documents[index], message) for index, message in failed.items()])
+        except DuplicateKeyError:
+            return documents, []
+        except TRANSIENT_ERRORS:
+            raise
+        except Exception as e:
+            # e.g. a document that cannot be encoded; find it by writing one at a time
+            if len(documents) == 1:
+                return [], [(documents[0], str(e))]
+            written, rejected = [], []
+            for document in documents:
+                single_written, single_rejected = self._insert_many(database, collection, [document])
+                written.extend(single_written)
+                rejected.extend(single_rejected)
+            return written, rejected
+
+    def _dead_letter(self, database, collection: str, rejected: List[tuple]):
+        """Log rejected documents and keep them in the write_errors collection"""
+        with self._lock:
+            self.rejected += len(rejected)
+        self.last_error = f"{datetime.now().isoformat()}: {rejected[0][1]}"
+        print(f"❌ {len(rejected)} {collection} records rejected by MongoDB: {rejected[0][1]}")
+        for document, message in rejected:
+            entry = {"collection": collection, "record_id": document.get("_id"),
+                     "error": message, "failed_at": datetime.now()}
+            try:
+                database[DEAD_LETTER_COLLECTION].insert_one({**entry, "document": document})
+            except Exception:
+                try:
+                    # The document itself may be what cannot be stored
+                    database[DEAD_LETTER_COLLECTION].insert_one({**entry, "document": repr(document)})
+                except Exception as e:
+                    print(f"❌ Could not save rejected {collection} record {entry['record_id']}: {e}")
+
+    def _notify(self, database, collection: str, documents: List[Dict]):
+        for hook in self._hooks:
+            try:
+                hook(database, collection, documents)
+            except Exception as e:
+                print(f"⚠️  Write hook {getattr(hook, '__name__', hook)} failed: {e}")
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_record_writer() -> WriteBehindWriter:
+    """Process-wide writer for diagnosis and report records"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                from utils.db_connection import get_db
+                _writer = WriteBehindWriter(get_db)
+    return _writer